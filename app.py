@@ -1,7 +1,30 @@
+import hashlib
+import io
 import streamlit as st
 from pdf_processor import extract_text_from_pdf, split_text_into_chunks
 from indexer import SemanticIndexer
 from query import ResearchAssistant
+from config import ANSWER_MODE, ANSWER_MODES
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def build_indexer(file_hash: str, _pdf_bytes: bytes) -> SemanticIndexer:
+    """
+    Extract, chunk and embed a PDF once per distinct file content.
+
+    Cached across reruns and sessions by the SHA-256 of the file, so uploading the
+    same PDF again reuses the built index. The bytes are excluded from the cache key.
+    """
+    # Extract text from the uploaded file
+    text = extract_text_from_pdf(io.BytesIO(_pdf_bytes))
+    # Split text into chunks
+    chunks = split_text_into_chunks(text)
+    texts = [chunk['text'] for chunk in chunks]
+    metadatas = [{'page': chunk['page'], 'page_end': chunk['page_end'], 'chunk_id': chunk['chunk_id']} for chunk in chunks]
+    # Build the index
+    indexer = SemanticIndexer()
+    indexer.build_index(texts, metadatas)
+    return indexer
 
 st.title("AI Open Source Research Assistant")
 
@@ -10,30 +33,27 @@ st.markdown("Upload a PDF document, build a semantic index, and ask questions ab
 uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
 
 if uploaded_file is not None:
-    if 'indexer' not in st.session_state:
+    pdf_bytes = uploaded_file.getvalue()
+    file_hash = hashlib.sha256(pdf_bytes).hexdigest()
+    if st.session_state.get('index_hash') != file_hash:
         with st.spinner("Processing PDF and building semantic index..."):
-            # Extract text from the uploaded file
-            text = extract_text_from_pdf(uploaded_file)
-            # Split text into chunks
-            chunks = split_text_into_chunks(text)
-            texts = [chunk['text'] for chunk in chunks]
-            metadatas = [{'page': chunk['page'], 'chunk_id': chunk['chunk_id']} for chunk in chunks]
-            # Build the index
-            indexer = SemanticIndexer()
-            indexer.build_index(texts, metadatas)
-            st.session_state.indexer = indexer
+            st.session_state.indexer = build_indexer(file_hash, pdf_bytes)
+            st.session_state.index_hash = file_hash
         st.success("Index built successfully! You can now ask questions about the document.")
     else:
         st.info("Index already built from the uploaded PDF.")
 
     # Query input
     question = st.text_input("Ask a question about the document:")
+    mode = st.radio("Answer mode:", ANSWER_MODES, index=ANSWER_MODES.index(ANSWER_MODE), horizontal=True,
+                    help="'distilled' uses a smaller summarizer; 'extractive' quotes the best-matching sentences and is fastest.")
 
     if question:
         if 'indexer' in st.session_state:
             with st.spinner("Generating answer..."):
+                # The summarization model comes from the shared registry, so this is cheap.
                 assistant = ResearchAssistant(st.session_state.indexer)
-                result = assistant.answer_question(question)
+                result = assistant.answer_question(question, mode=mode)
             st.subheader("Answer:")
             st.write(result['answer'])
             st.subheader("Supporting Evidence:")
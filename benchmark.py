@@ -0,0 +1,482 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import zlib
+from typing import Iterator
+import numpy as np
+from chunker import WhitespaceTokenizer
+from config import (EMBEDDING_MODEL, EMBED_BATCH_SIZE, INDEX_TYPES, VECTOR_PRECISIONS, SUMMARIZATION_MODEL,
+                    DISTILLED_SUMMARIZATION_MODEL)
+
+logger = logging.getLogger(__name__)
+
+RESULTS_FORMAT = 'research-assistant-benchmark'
+RESULTS_VERSION = 1
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+DEDUP_SAMPLE = 5000
+# Corpus vectors used to compare storage precisions; enough to train a product quantizer.
+STORAGE_SAMPLE = 20000
+STORAGE_RERANK_FACTOR = 4
+
+
+class StubEmbedder:
+    """
+    Offline stand-in for a SentenceTransformer based on feature hashing.
+
+    Each word is hashed into one of `dimension` buckets and the counts are L2-normalized,
+    so texts sharing words get similar vectors and the cost grows with text length.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def encode(self, texts, convert_to_numpy: bool = True, show_progress_bar: bool = False, **kwargs):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            buckets = [zlib.crc32(word.encode('utf-8')) % self.dimension for word in text.lower().split()]
+            if buckets:
+                vectors[i] = np.bincount(buckets, minlength=self.dimension)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+class StubSummarizer:
+    """Offline stand-in for a summarization pipeline that returns the leading words of each input."""
+
+    def __call__(self, texts, max_length: int = 150, min_length: int = 40, do_sample: bool = False, **kwargs):
+        items = [texts] if isinstance(texts, str) else list(texts)
+        return [{'summary_text': ' '.join(text.split()[:max_length])} for text in items]
+
+def install_stub_models(embedding_model: str = EMBEDDING_MODEL, summarization_model: str = SUMMARIZATION_MODEL,
+                        dimension: int = 384, distilled_model: str = DISTILLED_SUMMARIZATION_MODEL):
+    """Registers the stub models in the shared model registry under the configured model names."""
+    from models import registry
+    registry.register('sentence-embedding', embedding_model, StubEmbedder(dimension))
+    registry.register('tokenizer', embedding_model, WhitespaceTokenizer())
+    registry.register('summarization', summarization_model, StubSummarizer())
+    registry.register('summarization', distilled_model, StubSummarizer())
+
+
+def synthetic_vocabulary(size: int = 20000, seed: int = 0) -> list[str]:
+    """Returns `size` distinct pronounceable pseudo-words."""
+    rng = np.random.default_rng(seed)
+    consonants, vowels = 'bcdfghklmnprstvz', 'aeiou'
+    words = set()
+    while len(words) < size:
+        syllables = rng.integers(1, 4)
+        words.add(''.join(consonants[rng.integers(len(consonants))] + vowels[rng.integers(len(vowels))]
+                          for _ in range(syllables)))
+    return sorted(words)
+
+def synthetic_chunks(num_chunks: int, words_per_chunk: int = 80, seed: int = 0,
+                     vocabulary: list[str] | None = None) -> Iterator[str]:
+    """
+    Lazily generates chunk texts with a Zipfian word distribution, like natural text.
+
+    Args:
+        num_chunks (int): Number of chunks to generate.
+        words_per_chunk (int): Words per chunk.
+        seed (int): Random seed; the same seed yields the same corpus.
+        vocabulary (list[str] | None): Words to draw from. Defaults to synthetic_vocabulary().
+
+    Yields:
+        str: Chunk text.
+    """
+    vocabulary = np.array(vocabulary or synthetic_vocabulary(seed=seed))
+    probabilities = 1.0 / np.arange(1, len(vocabulary) + 1)
+    probabilities /= probabilities.sum()
+    rng = np.random.default_rng(seed + 1)
+    block = 10000
+    for start in range(0, num_chunks, block):
+        count = min(block, num_chunks - start)
+        words = vocabulary[rng.choice(len(vocabulary), size=(count, words_per_chunk), p=probabilities)]
+        for row in words:
+            yield ' '.join(row)
+
+def write_synthetic_pdf(path: str, pages: list[str], line_width: int = 90):
+    """
+    Writes a text-only PDF with one page per entry of pages, wrapped into lines.
+
+    Args:
+        path (str): Output file.
+        pages (list[str]): Page texts. Must not contain parentheses or backslashes.
+        line_width (int): Maximum characters per line.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, text in enumerate(pages):
+        lines, line = [], ''
+        for word in text.split():
+            if line and len(line) + 1 + len(word) > line_width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>")
+        stream = "BT /F1 9 Tf 11 TL 40 760 Td " + " T* ".join(f"({line}) Tj" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    out = "%PDF-1.4\n"
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "w", encoding="latin-1") as f:
+        f.write(out)
+
+def synthetic_queries(num_queries: int, words_per_query: int = 6, seed: int = 0) -> list[str]:
+    """Returns short queries drawn from the same vocabulary and distribution as synthetic_chunks."""
+    return list(synthetic_chunks(num_queries, words_per_chunk=words_per_query, seed=seed + 7,
+                                 vocabulary=synthetic_vocabulary(seed=seed)))
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def latency_stats(samples: list[float], count: int | None = None, unit: str = 'items') -> dict:
+    """
+    Summarizes per-operation timings measured with time.perf_counter.
+
+    Args:
+        samples (list[float]): Seconds per operation.
+        count (int | None): Items processed in total, for throughput. Defaults to len(samples).
+        unit (str): What count counts, e.g. 'pages' or 'queries'.
+
+    Returns:
+        dict: Operation count, total seconds, throughput per second and latency mean/p50/p95/p99 in ms.
+    """
+    seconds = np.asarray(samples, dtype=np.float64)
+    total = float(seconds.sum())
+    count = len(samples) if count is None else count
+    stats = {'operations': len(samples), 'count': count, 'unit': unit, 'total_seconds': total,
+             'throughput_per_second': count / total if total > 0 else None}
+    if len(seconds):
+        milliseconds = seconds * 1000
+        p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+        stats.update(mean_ms=float(milliseconds.mean()), p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99))
+    return stats
+
+def _timed(iterator) -> Iterator[tuple[float, object]]:
+    """Yields (seconds spent producing the item, item) for each item of an iterator."""
+    iterator = iter(iterator)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        yield time.perf_counter() - start, item
+
+
+def run_benchmark(num_chunks: int = 10000, pdf_pages: int = 50, num_queries: int = 200, top_k: int = 5,
+                  index_type: str = 'flat', batch_size: int = EMBED_BATCH_SIZE, query_batch_size: int = 32,
+                  seed: int = 0, stub_models: bool = True, dimension: int = 384, precision: str = 'fp32') -> dict:
+    """
+    Runs every benchmark stage and returns the results.
+
+    Args:
+        num_chunks (int): Size of the synthetic corpus embedded and indexed.
+        pdf_pages (int): Pages of the synthetic PDF used for the extraction and chunking stages.
+        num_queries (int): Queries for the search, retrieval, summarization and answer stages.
+        top_k (int): Results per query.
+        index_type (str): FAISS index type to build.
+        batch_size (int): Chunks embedded and indexed per batch.
+        query_batch_size (int): Queries per call in the search_batch stage.
+        seed (int): Random seed for the corpus and queries.
+        stub_models (bool): Replace the embedding and summarization models with offline stubs.
+        dimension (int): Embedding dimension of the stub embedder.
+        precision (str): Storage precision of the index used by the search and answer stages.
+
+    Returns:
+        dict: Results with 'config', 'environment', per-stage 'stages', per-precision
+        'storage' and 'peak_rss_mb'.
+    """
+    import faiss
+    from dedup import Deduplicator
+    from index_factory import storage_report
+    from indexer import SemanticIndexer
+    from pdf_processor import iter_pdf_pages, iter_text_chunks
+    from query import ResearchAssistant
+    from query_cache import query_embedding_cache
+
+    if stub_models:
+        install_stub_models(dimension=dimension)
+    stages = {}
+    rss_after = {}
+
+    # Extraction and chunking run on a synthetic PDF rather than the whole corpus.
+    page_texts = list(synthetic_chunks(pdf_pages, words_per_chunk=400, seed=seed + 3))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, 'synthetic.pdf')
+        write_synthetic_pdf(pdf_path, page_texts)
+        cache_dir = os.path.join(tmp_dir, 'page_cache')
+        # The default backend fills the page cache, which the second run reads back;
+        # pdfplumber is the fallback backend, timed for comparison.
+        for stage, backend, stage_cache_dir in (('extraction', 'pdfium', cache_dir),
+                                                ('extraction_cached', 'pdfium', cache_dir),
+                                                ('extraction_pdfplumber', 'pdfplumber', None)):
+            timings, stage_pages = [], []
+            for seconds, page in _timed(iter_pdf_pages(pdf_path, backend=backend, cache_dir=stage_cache_dir)):
+                timings.append(seconds)
+                stage_pages.append(page)
+            stages[stage] = latency_stats(timings, unit='pages')
+            if stage == 'extraction':
+                pages = stage_pages
+                rss_after['extraction'] = peak_rss_mb()
+    timings = []
+    chunk_count = 0
+    for page in pages:
+        start = time.perf_counter()
+        chunk_count += sum(1 for _ in iter_text_chunks([page]))
+        timings.append(time.perf_counter() - start)
+    stages['chunking'] = latency_stats(timings, count=chunk_count, unit='chunks')
+    rss_after['chunking'] = peak_rss_mb()
+    # Near-duplicate detection cost per chunk, on at most DEDUP_SAMPLE chunks of the corpus.
+    dedup = Deduplicator()
+    timings = []
+    for seconds, _ in _timed(dedup.is_duplicate(text) for text in synthetic_chunks(min(num_chunks, DEDUP_SAMPLE), seed=seed)):
+        timings.append(seconds)
+    stages['dedup'] = latency_stats(timings, unit='chunks')
+
+    # Query caches are off except in the answer_cached stage, so every other stage encodes and answers each query.
+    indexer = SemanticIndexer(index_type=index_type, precision=precision)
+    indexer.query_cache = None
+    encode_timings, add_timings = [], []
+
+    def on_batch(count, encode_seconds, add_seconds):
+        encode_timings.append(encode_seconds)
+        add_timings.append(add_seconds)
+
+    items = ((text, {'page': i // 10 + 1, 'chunk_id': i}) for i, text in enumerate(synthetic_chunks(num_chunks, seed=seed)))
+    added = indexer.add_stream(items, batch_size=batch_size, on_batch=on_batch)
+    stages['embedding'] = latency_stats(encode_timings, count=added, unit='chunks')
+    # index_add includes training and rebuilding when the index type needs it.
+    stages['index_add'] = latency_stats(add_timings, count=added, unit='chunks')
+    rss_after['index'] = peak_rss_mb()
+
+    queries = synthetic_queries(num_queries, seed=seed)
+    query_embeddings = np.asarray(indexer.model.encode(queries, convert_to_numpy=True), dtype=np.float32)
+    timings = []
+    for embedding in query_embeddings:
+        start = time.perf_counter()
+        indexer.search_vectors(embedding[None, :], top_k=top_k)
+        timings.append(time.perf_counter() - start)
+    stages['search'] = latency_stats(timings, unit='queries')
+    timings = []
+    for start_index in range(0, len(queries), query_batch_size):
+        batch = query_embeddings[start_index:start_index + query_batch_size]
+        start = time.perf_counter()
+        indexer.search_vectors(batch, top_k=top_k)
+        timings.append(time.perf_counter() - start)
+    stages['search_batch'] = latency_stats(timings, count=len(queries), unit='queries')
+
+    timings, retrieved = [], []
+    for query in queries:
+        start = time.perf_counter()
+        retrieved.append(indexer.search(query, top_k=top_k))
+        timings.append(time.perf_counter() - start)
+    stages['retrieval'] = latency_stats(timings, unit='queries')
+
+    assistant = ResearchAssistant(indexer, result_cache_size=0)
+    summarizer = assistant.summarizer
+    timings = []
+    for results in retrieved:
+        combined_text = " ".join(text for _, text, _ in results)
+        start = time.perf_counter()
+        summarizer(combined_text, max_length=150, min_length=40, do_sample=False)
+        timings.append(time.perf_counter() - start)
+    stages['summarization'] = latency_stats(timings, unit='queries')
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        assistant.answer_question(query, top_k=top_k, mode='abstractive')
+        timings.append(time.perf_counter() - start)
+    stages['answer'] = latency_stats(timings, unit='queries')
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        assistant.answer_question(query, top_k=top_k, mode='extractive')
+        timings.append(time.perf_counter() - start)
+    stages['answer_extractive'] = latency_stats(timings, unit='queries')
+    # Repeated questions; the untimed first pass fills the query embedding and answer caches.
+    indexer.query_cache = query_embedding_cache(max_entries=max(1, num_queries))
+    cached_assistant = ResearchAssistant(indexer, result_cache_size=max(1, num_queries))
+    for query in queries:
+        cached_assistant.answer_question(query, top_k=top_k, mode='abstractive')
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        cached_assistant.answer_question(query, top_k=top_k, mode='abstractive')
+        timings.append(time.perf_counter() - start)
+    stages['answer_cached'] = latency_stats(timings, unit='queries')
+    indexer.query_cache = None
+    rss_after['queries'] = peak_rss_mb()
+
+    # Storage precisions are compared on the full-precision embeddings of a corpus sample.
+    sample = np.asarray(indexer.model.encode(list(synthetic_chunks(min(num_chunks, STORAGE_SAMPLE), seed=seed)),
+                                             convert_to_numpy=True), dtype=np.float32)
+    storage = storage_report(sample, query_embeddings, top_k=min(top_k, len(sample)), index_type=index_type,
+                             rerank_factor=STORAGE_RERANK_FACTOR)
+
+    return {
+        'format': RESULTS_FORMAT,
+        'version': RESULTS_VERSION,
+        'config': {
+            'chunks': num_chunks, 'pdf_pages': pdf_pages, 'queries': num_queries, 'top_k': top_k,
+            'index_type': index_type, 'batch_size': batch_size, 'query_batch_size': query_batch_size,
+            'seed': seed, 'stub_models': stub_models, 'dimension': dimension if stub_models else None,
+            'precision': precision,
+        },
+        'environment': {
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'numpy': np.__version__, 'faiss': faiss.__version__,
+        },
+        'stages': stages,
+        'storage': {row['precision']: row for row in storage},
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_mb_after': rss_after,
+    }
+
+def compare_results(results: dict, baseline: dict, threshold: float = 0.1, min_latency_ms: float = 0.5) -> list[dict]:
+    """
+    Finds metrics that regressed against a baseline run.
+
+    Latency percentiles and peak RSS regress when they grow by more than threshold,
+    throughput when it drops by more than threshold. Only stages present in both runs
+    are compared, and stages whose mean latency is below min_latency_ms in both runs
+    are skipped because timer noise dominates at that scale.
+
+    Args:
+        results (dict): Current run, as returned by run_benchmark.
+        baseline (dict): Baseline run.
+        threshold (float): Allowed relative change, e.g. 0.1 for 10%.
+        min_latency_ms (float): Mean latency below which a stage is not compared.
+
+    Returns:
+        list[dict]: One entry per regression with 'stage', 'metric', 'baseline', 'current' and 'change'.
+    """
+    if baseline.get('config') != results.get('config'):
+        logger.warning("Baseline was run with a different configuration; comparisons may not be meaningful")
+    regressions = []
+
+    def check(stage, metric, base, current, higher_is_worse=True):
+        if base is None or current is None or base <= 0:
+            return
+        change = (current - base) / base
+        if (change > threshold) if higher_is_worse else (change < -threshold):
+            regressions.append({'stage': stage, 'metric': metric, 'baseline': base, 'current': current, 'change': change})
+
+    for stage, base_stats in baseline.get('stages', {}).items():
+        stats = results.get('stages', {}).get(stage)
+        if stats is None:
+            continue
+        if max(base_stats.get('mean_ms', 0), stats.get('mean_ms', 0)) < min_latency_ms:
+            continue
+        for metric in LATENCY_METRICS:
+            check(stage, metric, base_stats.get(metric), stats.get(metric))
+        check(stage, 'throughput_per_second', base_stats.get('throughput_per_second'),
+              stats.get('throughput_per_second'), higher_is_worse=False)
+    check('process', 'peak_rss_mb', baseline.get('peak_rss_mb'), results.get('peak_rss_mb'))
+    return regressions
+
+def format_results(results: dict) -> str:
+    lines = [f"{'stage':<14} {'count':>10} {'throughput/s':>14} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}"]
+    for stage, stats in results['stages'].items():
+        throughput = stats.get('throughput_per_second')
+        lines.append(f"{stage:<14} {stats['count']:>10} {throughput if throughput is not None else float('nan'):>14.1f} "
+                     f"{stats.get('p50_ms', float('nan')):>10.3f} {stats.get('p95_ms', float('nan')):>10.3f} "
+                     f"{stats.get('p99_ms', float('nan')):>10.3f}")
+    if results.get('storage'):
+        lines.append("")
+        lines.append(f"{'precision':<10} {'factory':<16} {'bytes/vector':>13} {'recall@k':>9} {'loss':>7} {'reranked':>9}")
+        for precision, row in results['storage'].items():
+            reranked = row['reranked_recall_at_k']
+            lines.append(f"{precision:<10} {row['factory']:<16} {row['bytes_per_vector']:>13.1f} {row['recall_at_k']:>9.3f} "
+                         f"{row['recall_loss']:>7.3f} {reranked if reranked is not None else float('nan'):>9.3f}")
+    lines.append(f"Peak RSS: {results['peak_rss_mb']:.1f} MiB")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stage-level benchmark on a synthetic corpus.\n\n"
+                    "Times PDF extraction, chunking, near-duplicate detection, embedding, index building,\n"
+                    "FAISS search, retrieval, summarization, and abstractive, extractive and cached answering,\n"
+                    "reporting p50/p95/p99 latency, throughput and peak RSS per stage, plus bytes per vector\n"
+                    "and recall loss for each vector storage precision. The models are replaced with\n"
+                    "deterministic offline stubs unless --real-models is given.",
+        epilog="examples:\n"
+               "  python benchmark.py --chunks 100000 --output results.json\n"
+               "  python benchmark.py --chunks 100000 --compare baseline.json --threshold 0.1\n\n"
+               "With --compare, exits with status 1 if any metric regressed by more than the threshold.",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=10000, help='Synthetic corpus size in chunks (e.g. 10000 to 10000000)')
+    parser.add_argument('--pdf-pages', type=int, default=50, help='Pages of the synthetic PDF for extraction and chunking')
+    parser.add_argument('--queries', type=int, default=200, help='Number of queries')
+    parser.add_argument('--top-k', type=int, default=5, help='Results per query')
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default='flat', help='FAISS index type')
+    parser.add_argument('--precision', choices=VECTOR_PRECISIONS, default='fp32', help='Vector storage precision of the benchmarked index')
+    parser.add_argument('--batch-size', type=int, default=EMBED_BATCH_SIZE, help='Chunks embedded per batch')
+    parser.add_argument('--query-batch-size', type=int, default=32, help='Queries per call in the search_batch stage')
+    parser.add_argument('--dimension', type=int, default=384, help='Embedding dimension of the stub embedder')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic corpus')
+    parser.add_argument('--real-models', action='store_true', help='Use the configured models instead of offline stubs')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Allowed relative regression with --compare')
+    parser.add_argument('--min-latency-ms', type=float, default=0.5, help='Stages faster than this are not compared')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    for name in ('chunks', 'pdf_pages', 'queries', 'top_k', 'batch_size', 'query_batch_size', 'dimension'):
+        if getattr(args, name) <= 0:
+            print(f"Error: --{name.replace('_', '-')} must be a positive integer.")
+            sys.exit(1)
+    if args.threshold < 0:
+        print("Error: --threshold must be non-negative.")
+        sys.exit(1)
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading baseline {args.compare}: {e}")
+            sys.exit(1)
+
+    results = run_benchmark(num_chunks=args.chunks, pdf_pages=args.pdf_pages, num_queries=args.queries,
+                            top_k=args.top_k, index_type=args.index_type, batch_size=args.batch_size,
+                            query_batch_size=args.query_batch_size, seed=args.seed,
+                            stub_models=not args.real_models, dimension=args.dimension, precision=args.precision)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline, args.threshold, args.min_latency_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression['stage']} {regression['metric']}: {regression['baseline']:.3f} -> "
+                  f"{regression['current']:.3f} ({regression['change']:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import re
+from collections import deque
+from typing import Iterable, Iterator
+import numpy as np
+from config import CHUNK_TOKENS, CHUNK_OVERLAP
+
+# Pages tokenized per tokenizer call.
+TOKENIZE_BATCH_PAGES = 16
+
+
+class WhitespaceTokenizer:
+    """
+    Offline stand-in for a Hugging Face fast tokenizer that treats each word as one token.
+
+    Implements the subset of the tokenizer interface used by the chunker and query
+    assistant, for tests and benchmarks that run without model downloads.
+    """
+
+    _word = re.compile(r'\S+')
+
+    def __init__(self, model_max_length: int = 256):
+        self.model_max_length = model_max_length
+
+    def __call__(self, texts, add_special_tokens: bool = True, return_offsets_mapping: bool = False, **kwargs):
+        texts = [texts] if isinstance(texts, str) else texts
+        offsets = [[match.span() for match in self._word.finditer(text)] for text in texts]
+        special = self.num_special_tokens_to_add() if add_special_tokens else 0
+        encoding = {'input_ids': [list(range(len(spans) + special)) for spans in offsets]}
+        if return_offsets_mapping:
+            encoding['offset_mapping'] = offsets
+        return encoding
+
+    def num_special_tokens_to_add(self) -> int:
+        return 2
+
+
+def chunk_token_limit(tokenizer, max_tokens: int = CHUNK_TOKENS, overlap: int = CHUNK_OVERLAP) -> int:
+    """
+    Returns the number of tokens per chunk.
+
+    Args:
+        tokenizer: Tokenizer of the embedding model; its model_max_length is the sequence limit.
+        max_tokens (int): Requested chunk size; 0 fills chunks up to the sequence limit.
+        overlap (int): Tokens shared by consecutive chunks, checked against the chunk size.
+
+    Returns:
+        int: Chunk size that fits in the model's sequence limit with its special tokens.
+
+    Raises:
+        ValueError: If the overlap is not smaller than the chunk size.
+    """
+    limit = tokenizer.model_max_length - tokenizer.num_special_tokens_to_add()
+    size = min(max_tokens, limit) if max_tokens else limit
+    if overlap >= size:
+        raise ValueError(f"Chunk overlap ({overlap}) must be smaller than the chunk size ({size} tokens, "
+                         f"limited by the model's sequence length of {limit})")
+    return size
+
+def tokenize_pages(pages: Iterable[dict], tokenizer, batch_pages: int = TOKENIZE_BATCH_PAGES) -> Iterator[dict]:
+    """
+    Adds token character offsets to pages, tokenizing several pages per tokenizer call.
+
+    Args:
+        pages (Iterable[dict]): {'page': int, 'text': str} pages, e.g. from iter_pdf_pages.
+        tokenizer: Hugging Face fast tokenizer (or a stand-in) that returns offset mappings.
+        batch_pages (int): Pages per tokenizer call.
+
+    Yields:
+        dict: {'page': int, 'text': str, 'offsets': np.ndarray} with one (start, end) row per token.
+    """
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) >= batch_pages:
+            yield from _tokenize_batch(batch, tokenizer)
+            batch = []
+    if batch:
+        yield from _tokenize_batch(batch, tokenizer)
+
+def _tokenize_batch(pages: list[dict], tokenizer) -> list[dict]:
+    encoded = tokenizer([page['text'] for page in pages], add_special_tokens=False, return_offsets_mapping=True,
+                        verbose=False)
+    return [{'page': page['page'], 'text': page['text'], 'offsets': np.asarray(offsets, dtype=np.int32).reshape(-1, 2)}
+            for page, offsets in zip(pages, encoded['offset_mapping'])]
+
+def iter_token_chunks(pages: Iterable[dict], max_tokens: int, overlap: int = CHUNK_OVERLAP) -> Iterator[dict]:
+    """
+    Splits a stream of tokenized pages into chunks of max_tokens tokens.
+
+    The pages are treated as one token sequence, so chunks continue across page
+    boundaries. Consecutive chunks share `overlap` tokens. The last chunk is shifted
+    back to end at the last token, so it is full-sized instead of a short tail.
+
+    Args:
+        pages (Iterable[dict]): Pages from tokenize_pages.
+        max_tokens (int): Tokens per chunk.
+        overlap (int): Tokens shared by consecutive chunks.
+
+    Yields:
+        dict: {'page': int, 'page_end': int, 'text': str, 'chunk_id': int}, where page and
+        page_end are the first and last page the chunk's text comes from.
+    """
+    if max_tokens <= 0 or not 0 <= overlap < max_tokens:
+        raise ValueError(f"Chunk overlap ({overlap}) must be non-negative and smaller than the chunk size ({max_tokens})")
+    step = max_tokens - overlap
+    buffer = deque()  # (page, text, offsets, position of the page's first token)
+    total = 0
+    start = 0
+    end = 0
+    chunk_id = 0
+    for page in pages:
+        if not len(page['offsets']):
+            continue
+        buffer.append((page['page'], page['text'], page['offsets'], total))
+        total += len(page['offsets'])
+        while total - start >= max_tokens:
+            end = start + max_tokens
+            yield _make_chunk(buffer, start, end, chunk_id)
+            chunk_id += 1
+            start += step
+            # The final chunk may reach back up to one step before start.
+            while buffer and buffer[0][3] + len(buffer[0][2]) <= start - step:
+                buffer.popleft()
+    if total > end:
+        yield _make_chunk(buffer, max(total - max_tokens, 0), total, chunk_id)
+
+def _make_chunk(buffer: deque, start: int, end: int, chunk_id: int) -> dict:
+    parts, page_numbers = [], []
+    for page, text, offsets, first in buffer:
+        if first >= end:
+            break
+        if first + len(offsets) <= start:
+            continue
+        a, b = max(start - first, 0), min(end - first, len(offsets))
+        parts.append(text[offsets[a, 0]:offsets[b - 1, 1]])
+        page_numbers.append(page)
+    return {'page': page_numbers[0], 'page_end': page_numbers[-1], 'text': ' '.join(' '.join(parts).split()),
+            'chunk_id': chunk_id}
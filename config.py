@@ -10,13 +10,138 @@ except ImportError:
 # Configuration settings
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
 SUMMARIZATION_MODEL = os.getenv('SUMMARIZATION_MODEL', 'facebook/bart-large-cnn')
-CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '500'))
-DEFAULT_INDEX_PATH = os.getenv('DEFAULT_INDEX_PATH', 'index.pkl')
+DISTILLED_SUMMARIZATION_MODEL = os.getenv('DISTILLED_SUMMARIZATION_MODEL', 'sshleifer/distilbart-cnn-6-6')
+ANSWER_MODES = ('abstractive', 'distilled', 'extractive')
+ANSWER_MODE = os.getenv('ANSWER_MODE', 'abstractive')
+CONTEXT_MAX_TOKENS = int(os.getenv('CONTEXT_MAX_TOKENS', '0'))
+EXTRACTIVE_SENTENCES = int(os.getenv('EXTRACTIVE_SENTENCES', '3'))
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', '0'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '32'))
+DEDUP_BOILERPLATE = os.getenv('DEDUP_BOILERPLATE', 'true').lower() in ('1', 'true', 'yes')
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.9'))
+INDEX_TYPES = ('flat', 'ivf', 'hnsw', 'ivfpq')
+INDEX_TYPE = os.getenv('INDEX_TYPE', 'flat')
+IVF_NLIST = int(os.getenv('IVF_NLIST', '0'))
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '16'))
+HNSW_M = int(os.getenv('HNSW_M', '32'))
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', '64'))
+PQ_M = int(os.getenv('PQ_M', '0'))
+VECTOR_PRECISIONS = ('fp32', 'fp16', 'int8', 'pq')
+VECTOR_PRECISION = os.getenv('VECTOR_PRECISION', 'fp32')
+RERANK_FACTOR = int(os.getenv('RERANK_FACTOR', '0'))
+COMPACT_REMOVED_FRACTION = float(os.getenv('COMPACT_REMOVED_FRACTION', '0.2'))
+COMPRESS_TEXTS = os.getenv('COMPRESS_TEXTS', 'true').lower() in ('1', 'true', 'yes')
+QA_BATCH_SIZE = int(os.getenv('QA_BATCH_SIZE', '8'))
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+SENTENCE_CACHE_SIZE = int(os.getenv('SENTENCE_CACHE_SIZE', '8192'))
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '256'))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', '3600'))
+QUERY_CACHE_DIR = os.getenv('QUERY_CACHE_DIR', '')
+SERVE_HOST = os.getenv('SERVE_HOST', '127.0.0.1')
+SERVE_PORT = int(os.getenv('SERVE_PORT', '8765'))
+SERVE_MAX_BATCH_SIZE = int(os.getenv('SERVE_MAX_BATCH_SIZE', '16'))
+SERVE_MAX_WAIT_MS = float(os.getenv('SERVE_MAX_WAIT_MS', '10'))
+DEFAULT_INDEX_PATH = os.getenv('DEFAULT_INDEX_PATH', 'index')
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '1'))
+PAGES_PER_TASK = int(os.getenv('PAGES_PER_TASK', '50'))
+PDF_BACKENDS = ('pdfium', 'pdfplumber')
+PDF_BACKEND = os.getenv('PDF_BACKEND', 'pdfium')
+PDF_PAGE_TIMEOUT = float(os.getenv('PDF_PAGE_TIMEOUT', '30'))
+PAGE_CACHE_DIR = os.getenv('PAGE_CACHE_DIR', '.page_cache')
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '256'))
+EMBED_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+EMBED_BACKEND = os.getenv('EMBED_BACKEND', 'torch')
+EMBED_WORKERS = int(os.getenv('EMBED_WORKERS', '1'))
+EMBED_THREADS = int(os.getenv('EMBED_THREADS', '0'))
+EMBED_BATCH_TOKENS = int(os.getenv('EMBED_BATCH_TOKENS', '8192'))
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', '.embedding_cache')
+EMBEDDING_CACHE_MAX_MB = int(os.getenv('EMBEDDING_CACHE_MAX_MB', '1024'))
+SHARD_SEARCH_EXECUTORS = ('thread', 'process')
+SHARD_SEARCH_EXECUTOR = os.getenv('SHARD_SEARCH_EXECUTOR', 'thread')
+SHARD_SEARCH_WORKERS = int(os.getenv('SHARD_SEARCH_WORKERS', '0'))
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+TRACE_LOG = os.getenv('TRACE_LOG', '')
 
 # Validate configurations
-if CHUNK_SIZE <= 0:
-    raise ValueError("CHUNK_SIZE must be a positive integer")
+if CHUNK_TOKENS < 0 or CHUNK_OVERLAP < 0:
+    raise ValueError("CHUNK_TOKENS and CHUNK_OVERLAP must be non-negative integers (CHUNK_TOKENS=0 uses the model's limit)")
+
+if CHUNK_TOKENS and CHUNK_OVERLAP >= CHUNK_TOKENS:
+    raise ValueError(f"CHUNK_OVERLAP ({CHUNK_OVERLAP}) must be smaller than CHUNK_TOKENS ({CHUNK_TOKENS})")
+
+if not 0 <= DEDUP_THRESHOLD <= 1:
+    raise ValueError("DEDUP_THRESHOLD must be between 0 and 1 (0 disables near-duplicate removal)")
+
+if INGEST_WORKERS <= 0:
+    raise ValueError("INGEST_WORKERS must be a positive integer")
+
+if PAGES_PER_TASK <= 0:
+    raise ValueError("PAGES_PER_TASK must be a positive integer")
+
+if PDF_BACKEND not in PDF_BACKENDS:
+    raise ValueError("PDF_BACKEND must be one of: pdfium, pdfplumber")
+
+if PDF_PAGE_TIMEOUT < 0:
+    raise ValueError("PDF_PAGE_TIMEOUT must be non-negative (0 extracts in-process without a timeout)")
+
+if EMBED_BATCH_SIZE <= 0:
+    raise ValueError("EMBED_BATCH_SIZE must be a positive integer")
+
+if EMBED_BACKEND not in EMBED_BACKENDS:
+    raise ValueError("EMBED_BACKEND must be one of: torch, onnx, onnx-int8")
+
+if EMBED_WORKERS <= 0 or EMBED_THREADS < 0 or EMBED_BATCH_TOKENS <= 0:
+    raise ValueError("EMBED_WORKERS and EMBED_BATCH_TOKENS must be positive and EMBED_THREADS non-negative (0 divides the cores between workers)")
+
+if EMBEDDING_CACHE_MAX_MB < 0:
+    raise ValueError("EMBEDDING_CACHE_MAX_MB must be a non-negative integer")
+
+if SHARD_SEARCH_EXECUTOR not in SHARD_SEARCH_EXECUTORS:
+    raise ValueError("SHARD_SEARCH_EXECUTOR must be one of: thread, process")
+
+if SHARD_SEARCH_WORKERS < 0:
+    raise ValueError("SHARD_SEARCH_WORKERS must be a non-negative integer (0 uses one worker per shard)")
+
+if INDEX_TYPE not in INDEX_TYPES:
+    raise ValueError("INDEX_TYPE must be one of: flat, ivf, hnsw, ivfpq")
+
+if IVF_NLIST < 0 or PQ_M < 0:
+    raise ValueError("IVF_NLIST and PQ_M must be non-negative integers (0 chooses automatically)")
+
+if IVF_NPROBE <= 0 or HNSW_M <= 0 or HNSW_EF_SEARCH <= 0:
+    raise ValueError("IVF_NPROBE, HNSW_M and HNSW_EF_SEARCH must be positive integers")
+
+if VECTOR_PRECISION not in VECTOR_PRECISIONS:
+    raise ValueError("VECTOR_PRECISION must be one of: fp32, fp16, int8, pq")
+
+if RERANK_FACTOR < 0:
+    raise ValueError("RERANK_FACTOR must be a non-negative integer (0 disables exact re-ranking)")
+
+if not 0 <= COMPACT_REMOVED_FRACTION <= 1:
+    raise ValueError("COMPACT_REMOVED_FRACTION must be between 0 and 1 (0 compacts on every save that follows a removal)")
+
+if ANSWER_MODE not in ANSWER_MODES:
+    raise ValueError("ANSWER_MODE must be one of: abstractive, distilled, extractive")
+
+if CONTEXT_MAX_TOKENS < 0:
+    raise ValueError("CONTEXT_MAX_TOKENS must be a non-negative integer (0 uses the summarizer's input limit)")
+
+if EXTRACTIVE_SENTENCES <= 0:
+    raise ValueError("EXTRACTIVE_SENTENCES must be a positive integer")
+
+if QA_BATCH_SIZE <= 0:
+    raise ValueError("QA_BATCH_SIZE must be a positive integer")
+
+if QUERY_CACHE_SIZE < 0 or SENTENCE_CACHE_SIZE < 0 or RESULT_CACHE_SIZE < 0:
+    raise ValueError("QUERY_CACHE_SIZE, SENTENCE_CACHE_SIZE and RESULT_CACHE_SIZE must be non-negative integers "
+                     "(0 disables the cache)")
+
+if RESULT_CACHE_TTL < 0:
+    raise ValueError("RESULT_CACHE_TTL must be non-negative (0 keeps answers until they are evicted)")
+
+if SERVE_MAX_BATCH_SIZE <= 0 or SERVE_MAX_WAIT_MS < 0:
+    raise ValueError("SERVE_MAX_BATCH_SIZE must be positive and SERVE_MAX_WAIT_MS non-negative")
 
 if LOG_LEVEL not in ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']:
     raise ValueError("LOG_LEVEL must be one of: DEBUG, INFO, WARNING, ERROR, CRITICAL")
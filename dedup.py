@@ -0,0 +1,179 @@
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Iterable, Iterator
+import numpy as np
+from config import DEDUP_BOILERPLATE, DEDUP_THRESHOLD
+
+# Lines at the top and bottom of a page that can be running headers or footers.
+EDGE_LINES = 2
+# A line is boilerplate if it is on the edge of at least this many pages and this fraction of a block.
+MIN_REPEATED_PAGES = 3
+REPEATED_FRACTION = 0.5
+
+NUM_PERM = 64
+LSH_BANDS = 16
+SHINGLE_WORDS = 3
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240521)
+_PERM_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+_DIGITS = re.compile(r'\d+')
+_PAGE_NUMBER = re.compile(r'^(page )?#( (of|/) #)?$')
+
+
+def _line_key(line: str) -> str:
+    """Normalizes a line so headers that differ only in page numbers or spacing compare equal."""
+    return _DIGITS.sub('#', ' '.join(re.sub(r'[^\w/]+', ' ', line.lower()).split()))
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    Returns the MinHash signature of the word shingles of a text.
+
+    Args:
+        text (str): Chunk text.
+
+    Returns:
+        np.ndarray: NUM_PERM uint64 values; the fraction of equal values between two
+        signatures estimates the Jaccard similarity of the texts' shingle sets.
+    """
+    words = np.array([zlib.crc32(word.encode('utf-8')) for word in text.lower().split()], dtype=np.uint64)
+    count = len(words) - SHINGLE_WORDS + 1
+    if count > 0:
+        # Combine the hashes of SHINGLE_WORDS consecutive words; overflow wraps around.
+        shingles = words[:count].copy()
+        for offset in range(1, SHINGLE_WORDS):
+            shingles = shingles * np.uint64(1000003) ^ words[offset:offset + count]
+        words = shingles
+    if not len(words):
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    shingles = np.unique(words % np.uint64(_PRIME))
+    return ((_PERM_A[:, None] * shingles[None, :] + _PERM_B[:, None]) % np.uint64(_PRIME)).min(axis=1)
+
+
+class Deduplicator:
+    """
+    Removes boilerplate lines from pages and near-duplicate chunks from a document.
+
+    Running headers, footers and page numbers are detected as lines that repeat on the
+    top or bottom edge of many pages of a block, ignoring digits. Near-duplicate chunks
+    are found with MinHash signatures and LSH banding and dropped when their estimated
+    Jaccard similarity to an earlier chunk of the same document reaches the threshold.
+    Duplicates are only looked for within a document, so removing or replacing one
+    document never takes text away from another.
+    """
+
+    def __init__(self, boilerplate: bool = DEDUP_BOILERPLATE, threshold: float = DEDUP_THRESHOLD):
+        """
+        Args:
+            boilerplate (bool): Strip repeated header and footer lines.
+            threshold (float): Minimum estimated Jaccard similarity of a dropped chunk; 0 disables.
+        """
+        self.boilerplate = boilerplate
+        self.threshold = threshold
+        self.boilerplate_lines = 0
+        self.duplicate_chunks = 0
+        self.duplicate_chars = 0
+        self._signatures = []
+        self._buckets = {}
+
+    def strip_pages(self, pages: list[dict]) -> list[dict]:
+        """
+        Removes running headers, footers and page numbers from a block of pages.
+
+        A page keeps its text if every one of its lines would be removed.
+
+        Args:
+            pages (list[dict]): {'page': int, 'text': str} pages of one document.
+
+        Returns:
+            list[dict]: The pages with boilerplate lines removed.
+        """
+        if not self.boilerplate or not pages:
+            return pages
+        page_lines = [page['text'].split('\n') for page in pages]
+        edges = [set(range(min(EDGE_LINES, len(lines)))) | set(range(max(len(lines) - EDGE_LINES, 0), len(lines)))
+                 for lines in page_lines]
+        keys = [[_line_key(line) for line in lines] for lines in page_lines]
+        counts = Counter(key for page_keys, page_edges in zip(keys, edges) for key in {page_keys[i] for i in page_edges})
+        needed = max(MIN_REPEATED_PAGES, math.ceil(REPEATED_FRACTION * len(pages)))
+        repeated = {key for key, count in counts.items() if count >= needed and key}
+        stripped = []
+        for page, lines, page_keys, page_edges in zip(pages, page_lines, keys, edges):
+            drop = {i for i in page_edges if page_keys[i] in repeated or _PAGE_NUMBER.match(page_keys[i])}
+            if drop and len(drop) < len(lines):
+                self.boilerplate_lines += len(drop)
+                page = {**page, 'text': '\n'.join(line for i, line in enumerate(lines) if i not in drop)}
+            stripped.append(page)
+        return stripped
+
+    def iter_pages(self, pages: Iterable[dict], block_pages: int) -> Iterator[dict]:
+        """
+        Lazily strips boilerplate from a page stream in blocks of block_pages page numbers.
+
+        Blocks are aligned to page numbers the same way plan_tasks splits a file, so a
+        serial run strips the same lines as workers processing one task each.
+        """
+        block, block_no = [], None
+        for page in pages:
+            page_block = (page['page'] - 1) // block_pages
+            if block and page_block != block_no:
+                yield from self.strip_pages(block)
+                block = []
+            block_no = page_block
+            block.append(page)
+        if block:
+            yield from self.strip_pages(block)
+
+    def start_document(self):
+        """Forgets the chunks seen so far; duplicates are only dropped within a document."""
+        self._signatures = []
+        self._buckets = {}
+
+    def is_duplicate(self, text: str) -> bool:
+        """Returns True if text nearly duplicates a chunk seen since start_document, otherwise remembers it."""
+        signature = minhash_signature(text)
+        band_keys = [(band, band_values.tobytes()) for band, band_values in enumerate(signature.reshape(LSH_BANDS, -1))]
+        candidates = {index for key in band_keys for index in self._buckets.get(key, ())}
+        for index in candidates:
+            if np.mean(self._signatures[index] == signature) >= self.threshold:
+                return True
+        for key in band_keys:
+            self._buckets.setdefault(key, []).append(len(self._signatures))
+        self._signatures.append(signature)
+        return False
+
+    def filter_chunks(self, chunks: Iterable[dict]) -> Iterator[dict]:
+        """
+        Drops near-duplicate chunks of one document and renumbers chunk_ids consecutively.
+
+        The last chunk is always kept: iter_token_chunks shifts it back to end at the last
+        token, so it can nearly duplicate the chunk before it while holding the only copy
+        of the document's final tokens.
+
+        Args:
+            chunks (Iterable[dict]): Chunks of a single document, e.g. from iter_text_chunks.
+
+        Yields:
+            dict: The chunks that are kept.
+        """
+        self.start_document()
+        chunk_id = 0
+        pending = None
+        for chunk in chunks:
+            if pending is not None:
+                if self.threshold > 0 and self.is_duplicate(pending['text']):
+                    self.duplicate_chunks += 1
+                    self.duplicate_chars += len(pending['text'])
+                else:
+                    yield {**pending, 'chunk_id': chunk_id}
+                    chunk_id += 1
+            pending = chunk
+        if pending is not None:
+            yield {**pending, 'chunk_id': chunk_id}
+
+    def counts(self) -> dict:
+        return {'boilerplate_lines': self.boilerplate_lines, 'duplicate_chunks': self.duplicate_chunks,
+                'duplicate_chars': self.duplicate_chars}
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import re
+import numpy as np
+from config import EMBEDDING_CACHE_MAX_MB
+
+KEY_BYTES = 20
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so formatting-only differences map to the same cache entry."""
+    return ' '.join(text.split())
+
+def cache_key(model_name: str, text: str) -> bytes:
+    """
+    Returns the content address of an embedding.
+
+    Args:
+        model_name (str): Name of the embedding model.
+        text (str): Chunk text. Normalized before hashing.
+
+    Returns:
+        bytes: 20-byte SHA-1 digest of the model name and normalized text.
+    """
+    return hashlib.sha1(f"{model_name}\0{normalize_text(text)}".encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model name, normalized chunk text hash).
+
+    Each model gets its own subdirectory holding three numpy arrays: the keys, the
+    float32 vectors (memory-mapped, so only rows that are hit are read) and a
+    last-access counter used for least-recently-used eviction once the cache grows
+    past max_bytes. New entries are kept in memory until save() is called.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_bytes: int = EMBEDDING_CACHE_MAX_MB * 1024 * 1024):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.directory = os.path.join(cache_dir, re.sub(r'[^A-Za-z0-9._-]+', '_', model_name))
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._rows = {}
+        self._keys = np.empty(0, dtype=f'S{KEY_BYTES}')
+        self._vectors = None
+        self._ticks = np.empty(0, dtype=np.int64)
+        self._pending = {}
+        self._pending_ticks = {}
+        self._tick = 0
+        self._load()
+
+    def _path(self, name: str, generation: int) -> str:
+        return os.path.join(self.directory, f"{name}-{generation}.npy")
+
+    def _load(self):
+        meta_path = os.path.join(self.directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self._generation = meta['generation']
+        self._keys = np.load(self._path('keys', self._generation))
+        self._vectors = np.load(self._path('vectors', self._generation), mmap_mode='r')
+        self._ticks = np.load(self._path('ticks', self._generation))
+        self._rows = {key: row for row, key in enumerate(self._keys.tolist())}
+        self._tick = int(self._ticks.max()) if len(self._ticks) else 0
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._pending)
+
+    def get_many(self, keys: list[bytes]) -> list[np.ndarray | None]:
+        """
+        Looks up embeddings for a list of keys.
+
+        Args:
+            keys (list[bytes]): Keys from cache_key.
+
+        Returns:
+            list[np.ndarray | None]: The cached vector for each key, or None on a miss.
+        """
+        self._tick += 1
+        results = []
+        for key in keys:
+            if key in self._pending:
+                vector = self._pending[key]
+                self._pending_ticks[key] = self._tick
+            elif key in self._rows:
+                row = self._rows[key]
+                vector = np.array(self._vectors[row])
+                self._ticks[row] = self._tick
+            else:
+                vector = None
+            if vector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            results.append(vector)
+        return results
+
+    def put_many(self, keys: list[bytes], vectors: np.ndarray):
+        """
+        Adds embeddings to the cache. They are persisted by the next save().
+
+        Args:
+            keys (list[bytes]): Keys from cache_key.
+            vectors (np.ndarray): Embeddings, one row per key.
+        """
+        self._tick += 1
+        for key, vector in zip(keys, vectors):
+            if key not in self._rows:
+                self._pending[key] = np.asarray(vector, dtype=np.float32)
+                self._pending_ticks[key] = self._tick
+
+    def save(self):
+        """
+        Writes the cache to disk, evicting least recently used entries beyond max_bytes.
+
+        A new generation of files is written and then published by atomically replacing
+        meta.json, so an interrupted save leaves the previous cache intact.
+        """
+        if not self._pending and self._vectors is None:
+            return
+        keys = self._keys.tolist() + list(self._pending)
+        ticks = np.concatenate([self._ticks, np.array(list(self._pending_ticks.values()), dtype=np.int64)])
+        dim = (self._vectors.shape[1] if self._vectors is not None
+               else len(next(iter(self._pending.values()))))
+        row_bytes = dim * 4 + KEY_BYTES + 8
+        capacity = max(self.max_bytes // row_bytes, 0)
+        keep = np.argsort(-ticks, kind='stable')[:capacity]
+        keep.sort()
+
+        vectors = np.empty((len(keep), dim), dtype=np.float32)
+        num_base = len(self._keys)
+        pending_vectors = list(self._pending.values())
+        for out_row, row in enumerate(keep):
+            vectors[out_row] = self._vectors[row] if row < num_base else pending_vectors[row - num_base]
+
+        os.makedirs(self.directory, exist_ok=True)
+        old_generation = self._generation
+        generation = old_generation + 1
+        np.save(self._path('keys', generation), np.array([keys[row] for row in keep], dtype=f'S{KEY_BYTES}'))
+        np.save(self._path('vectors', generation), vectors)
+        np.save(self._path('ticks', generation), ticks[keep])
+        tmp_meta = os.path.join(self.directory, 'meta.json.tmp')
+        with open(tmp_meta, 'w') as f:
+            json.dump({'generation': generation, 'model_name': self.model_name, 'dimension': dim}, f)
+        os.replace(tmp_meta, os.path.join(self.directory, 'meta.json'))
+        for name in ('keys', 'vectors', 'ticks'):
+            old_path = self._path(name, old_generation)
+            if os.path.exists(old_path):
+                os.remove(old_path)
+
+        self._pending = {}
+        self._pending_ticks = {}
+        self._load()
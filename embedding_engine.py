@@ -0,0 +1,140 @@
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import EMBEDDING_MODEL, EMBED_BACKEND, EMBED_BACKENDS, EMBED_WORKERS, EMBED_THREADS, EMBED_BATCH_TOKENS
+from models import get_embedder, get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Upper bound of the adaptive batch size, reached by batches of very short texts.
+MAX_BATCH_SIZE = 512
+
+
+def length_batches(lengths: np.ndarray, batch_tokens: int, max_batch_size: int = MAX_BATCH_SIZE) -> list[np.ndarray]:
+    """
+    Groups texts of similar length into batches whose padded size fits a token budget.
+
+    Texts are sorted longest first, so each batch is padded to its first text and the
+    batch size adapts to the length: batch_tokens // longest texts per batch.
+
+    Args:
+        lengths (np.ndarray): Token count of each text, including special tokens.
+        batch_tokens (int): Maximum padded tokens per batch (batch size * longest text).
+        max_batch_size (int): Maximum texts per batch.
+
+    Returns:
+        list[np.ndarray]: Positions of the texts in each batch.
+    """
+    order = np.argsort(-np.asarray(lengths), kind='stable')
+    batches = []
+    start = 0
+    while start < len(order):
+        size = max(1, min(max_batch_size, batch_tokens // max(int(lengths[order[start]]), 1)))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+def _init_worker(threads: int):
+    # Set before torch is first imported in the worker; a forked worker that inherited
+    # an imported torch is limited directly.
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+
+def _encode_batch(model_name: str, backend: str, texts: list[str]) -> np.ndarray:
+    model = get_embedder(model_name, backend)
+    return np.asarray(model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False),
+                      dtype=np.float32)
+
+
+class EmbeddingEngine:
+    """
+    Encodes document texts in length-bucketed batches, optionally across worker processes.
+
+    Sorting texts by token count before batching keeps padding low when chunk lengths
+    vary, and the batch size adapts so every batch holds about the same number of
+    padded tokens. With several workers, batches are encoded in a pool of processes,
+    each with its own copy of the model and a fixed number of threads. Embeddings are
+    returned in input order. A text's embedding does not depend on the other texts in
+    its batch, so results match encoding the texts in one model call up to floating
+    point rounding.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, backend: str = EMBED_BACKEND, workers: int = EMBED_WORKERS,
+                 threads: int = EMBED_THREADS, batch_tokens: int = EMBED_BATCH_TOKENS):
+        """
+        Args:
+            model_name (str): Sentence transformer model name.
+            backend (str): 'torch', 'onnx' or 'onnx-int8' (ONNX Runtime with a quantized model).
+            workers (int): Encoding processes; 1 encodes in this process.
+            threads (int): Threads per worker process; 0 divides the CPU cores between workers.
+            batch_tokens (int): Padded tokens per batch.
+        """
+        if backend not in EMBED_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend}. Expected one of: {', '.join(EMBED_BACKENDS)}")
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.batch_tokens = batch_tokens
+        self._executor = None
+
+    @property
+    def cache_name(self) -> str:
+        """Model name used in embedding cache keys; ONNX backends get their own entries."""
+        return self.model_name if self.backend == 'torch' else f"{self.model_name}-{self.backend}"
+
+    @property
+    def model(self):
+        """The sentence transformer of this engine's backend, loaded through the shared model registry."""
+        return get_embedder(self.model_name, self.backend)
+
+    def token_lengths(self, texts: list[str]) -> np.ndarray:
+        """Returns the number of tokens the model encodes for each text, including special tokens."""
+        tokenizer = get_tokenizer(self.model_name)
+        lengths = [len(ids) for ids in tokenizer(list(texts), add_special_tokens=True, verbose=False)['input_ids']]
+        return np.minimum(np.array(lengths, dtype=np.int64), tokenizer.model_max_length)
+
+    def encode(self, texts: list[str], show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Embed texts in length-bucketed batches.
+
+        Args:
+            texts (list[str]): Texts to embed.
+            show_progress_bar (bool): Show a progress bar over the batches.
+
+        Returns:
+            np.ndarray: float32 embeddings, one row per input text, in input order.
+        """
+        batches = length_batches(self.token_lengths(texts), self.batch_tokens)
+        batch_texts = [[texts[i] for i in batch] for batch in batches]
+        if self.workers > 1 and len(batches) > 1:
+            results = self._pool().map(_encode_batch, [self.model_name] * len(batches), [self.backend] * len(batches),
+                                       batch_texts)
+        else:
+            results = (_encode_batch(self.model_name, self.backend, chunk) for chunk in batch_texts)
+        if show_progress_bar:
+            from tqdm import tqdm
+            results = tqdm(results, total=len(batches), desc='Batches')
+        embeddings = None
+        for batch, vectors in zip(batches, results):
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+        return embeddings
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            logger.info(f"Starting {self.workers} embedding workers with {self.threads} threads each")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(self.threads,))
+        return self._executor
+
+    def close(self):
+        """Stops the worker processes, if any were started."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
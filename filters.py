@@ -0,0 +1,131 @@
+import os
+import faiss
+import numpy as np
+
+# Filters selecting at most this many chunks are searched exactly over the selected vectors;
+# larger selections are pushed into the FAISS search as an ID selector.
+EXACT_SEARCH_MAX_IDS = 16384
+
+
+def validate_filter(filter: dict) -> dict:
+    """
+    Checks the shape of a metadata filter.
+
+    A filter maps metadata fields to conditions, all of which must hold:
+
+    - 'source': a document source or a list of them (the PDF paths as ingested)
+    - 'pages': a page number or an inclusive [first, last] range; chunks overlapping it match
+    - any other field: a value or a list of accepted values
+
+    Raises:
+        ValueError: If the filter is malformed.
+    """
+    if not isinstance(filter, dict):
+        raise ValueError("filter must be an object mapping metadata fields to values")
+    for key, value in filter.items():
+        if key == 'source':
+            sources = value if isinstance(value, list) else [value]
+            if not all(isinstance(source, str) for source in sources):
+                raise ValueError("filter 'source' must be a path or a list of paths")
+        elif key == 'pages':
+            pages = value if isinstance(value, (list, tuple)) else [value, value]
+            if len(pages) != 2 or not all(type(page) is int for page in pages) or pages[0] > pages[1]:
+                raise ValueError("filter 'pages' must be a page number or a [first, last] range")
+    return filter
+
+
+class MetadataIndex:
+    """
+    Resolves metadata filters to the vector ids of the chunks they select.
+
+    Documents are looked up in the document manifest, which already holds the id ranges
+    of every document. Other fields, such as page numbers, are read once into per-field
+    arrays, so a filter is evaluated with vectorized comparisons rather than a loop over
+    metadata dicts.
+    """
+
+    def __init__(self, metadata, documents: dict, removed=frozenset()):
+        """
+        Args:
+            metadata: Sequence of metadata dicts by id, e.g. a ColumnarMetadata.
+            documents (dict): Document manifest: source -> {'ids': [[start, end], ...], ...}.
+            removed: Ids of removed chunks, which never match.
+        """
+        self.metadata = metadata
+        self.documents = documents
+        self.removed = removed
+        self._columns = {}
+
+    def column(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (values, present) arrays of a metadata field, reading it on first use."""
+        if name not in self._columns:
+            if hasattr(self.metadata, 'column'):
+                self._columns[name] = self.metadata.column(name)
+            else:
+                values = np.empty(len(self.metadata), dtype=object)
+                values[:] = [row.get(name) for row in self.metadata]
+                self._columns[name] = (values, np.array([name in row for row in self.metadata], dtype=bool))
+        return self._columns[name]
+
+    def select(self, filter: dict) -> np.ndarray:
+        """
+        Returns the ids of the chunks matching every condition of a filter.
+
+        Args:
+            filter (dict): Metadata filter, see validate_filter.
+
+        Returns:
+            np.ndarray: Sorted int64 ids.
+        """
+        validate_filter(filter)
+        mask = np.ones(len(self.metadata), dtype=bool)
+        for key, value in filter.items():
+            if key == 'source':
+                mask &= self._source_mask(value if isinstance(value, list) else [value])
+            elif key == 'pages':
+                first, last = value if isinstance(value, (list, tuple)) else (value, value)
+                mask &= self._page_mask(first, last)
+            else:
+                mask &= self._field_mask(key, value if isinstance(value, list) else [value])
+        if self.removed:
+            mask[np.fromiter(self.removed, dtype=np.int64)] = False
+        return np.flatnonzero(mask).astype(np.int64)
+
+    def _source_mask(self, sources: list[str]) -> np.ndarray:
+        mask = np.zeros(len(self.metadata), dtype=bool)
+        for source in sources:
+            document = self.documents.get(source) or self.documents.get(os.path.abspath(source))
+            for start, end in (document or {}).get('ids', []):
+                mask[start:end] = True
+        return mask
+
+    def _page_mask(self, first: int, last: int) -> np.ndarray:
+        pages, present = self.column('page')
+        page_ends, has_end = self.column('page_end')
+        pages = np.where(present, pages, 0).astype(np.int64)
+        page_ends = np.where(has_end, page_ends, pages).astype(np.int64)
+        return present & (pages <= last) & (page_ends >= first)
+
+    def _field_mask(self, name: str, accepted: list) -> np.ndarray:
+        values, present = self.column(name)
+        if values.dtype != object:
+            return present & np.isin(values, [value for value in accepted if type(value) is int])
+        return present & np.fromiter((value in accepted for value in values), dtype=bool, count=len(values))
+
+
+def id_selector(ids: np.ndarray):
+    """
+    Returns a FAISS IDSelector accepting exactly the given sorted ids.
+
+    One contiguous run of ids, such as a single document, becomes a range check;
+    anything else a bitmap with one bit per id up to the largest.
+    """
+    if len(ids) and ids[-1] - ids[0] + 1 == len(ids):
+        return faiss.IDSelectorRange(int(ids[0]), int(ids[-1]) + 1)
+    mask = np.zeros(int(ids[-1]) + 1 if len(ids) else 0, dtype=bool)
+    mask[ids] = True
+    bitmap = np.packbits(mask, bitorder='little')
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    # FAISS only keeps a pointer to the bitmap.
+    selector.referenced_objects = [bitmap]
+    return selector
@@ -0,0 +1,413 @@
+import math
+import time
+import faiss
+import numpy as np
+from config import INDEX_TYPES, IVF_NLIST, IVF_NPROBE, HNSW_M, HNSW_EF_SEARCH, PQ_M, VECTOR_PRECISIONS
+
+# FAISS warns when k-means gets fewer than 39 points per centroid.
+MIN_POINTS_PER_CENTROID = 39
+# 8-bit product quantizer codebooks have 256 centroids each, trained with the same k-means.
+PQ_CODEBOOK_SIZE = 256
+# The int8 scalar quantizer learns each dimension's range from its training vectors,
+# so it waits for a sample large enough to cover the range of later vectors.
+MIN_SQ8_TRAINING_VECTORS = 1024
+# FAISS reports this distance for missing results.
+MISSING_DISTANCE = np.finfo(np.float32).max
+
+
+def auto_nlist(num_vectors: int) -> int:
+    """Returns the IVF list count for a corpus size: about 4 * sqrt(n), capped by training data."""
+    if IVF_NLIST > 0:
+        return IVF_NLIST
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // MIN_POINTS_PER_CENTROID))
+
+def auto_pq_m(dimension: int) -> int:
+    """Returns the number of PQ sub-quantizers: PQ_M, or the largest divisor of d with at least 8 dims each."""
+    if PQ_M > 0:
+        return PQ_M
+    for m in range(max(1, dimension // 8), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+def min_training_vectors(index_type: str, num_vectors: int, precision: str = 'fp32') -> int:
+    """
+    Returns how many vectors an index type needs before it can be trained.
+
+    Args:
+        index_type (str): One of INDEX_TYPES.
+        num_vectors (int): Current corpus size, used to choose nlist.
+        precision (str): Storage precision, one of VECTOR_PRECISIONS.
+
+    Returns:
+        int: Minimum number of vectors; 0 if no training is needed.
+    """
+    needed = 0
+    if index_type in ('ivf', 'ivfpq'):
+        needed = auto_nlist(num_vectors) * MIN_POINTS_PER_CENTROID
+        if IVF_NLIST <= 0:
+            # With an automatic nlist, wait for enough data to make more than a handful of lists.
+            needed = max(needed, 16 * MIN_POINTS_PER_CENTROID)
+    if index_type == 'ivfpq' or precision == 'pq':
+        needed = max(needed, PQ_CODEBOOK_SIZE * MIN_POINTS_PER_CENTROID)
+    elif precision == 'int8':
+        needed = max(needed, MIN_SQ8_TRAINING_VECTORS)
+    return needed
+
+def codec_string(precision: str, dimension: int) -> str:
+    """
+    Returns the FAISS index_factory description of how vectors of a storage precision are encoded.
+
+    Args:
+        precision (str): 'fp32' stores raw floats (4 bytes per dimension), 'fp16' half
+            floats (2 bytes), 'int8' an 8-bit scalar quantizer (1 byte) and 'pq' a product
+            quantizer (1 byte per sub-quantizer).
+        dimension (int): Embedding dimension.
+
+    Returns:
+        str: e.g. 'Flat', 'SQfp16', 'SQ8', 'PQ48'.
+    """
+    if precision == 'fp32':
+        return 'Flat'
+    if precision == 'fp16':
+        return 'SQfp16'
+    if precision == 'int8':
+        return 'SQ8'
+    if precision == 'pq':
+        return f"PQ{auto_pq_m(dimension)}"
+    raise ValueError(f"Unknown vector precision: {precision}. Expected one of: {', '.join(VECTOR_PRECISIONS)}")
+
+def factory_string(index_type: str, dimension: int, num_vectors: int, precision: str = 'fp32') -> str:
+    """
+    Returns the FAISS index_factory description for an index type.
+
+    Args:
+        index_type (str): One of INDEX_TYPES.
+        dimension (int): Embedding dimension.
+        num_vectors (int): Corpus size, used to choose nlist.
+        precision (str): Storage precision, see codec_string. 'ivfpq' indexes are always
+            product-quantized and ignore it.
+
+    Returns:
+        str: e.g. 'Flat', 'IVF256,SQ8', 'HNSW32_SQfp16', 'IVF256,PQ48'.
+    """
+    codec = codec_string(precision, dimension)
+    if index_type == 'flat':
+        return codec
+    if index_type == 'ivf':
+        return f"IVF{auto_nlist(num_vectors)},{codec}"
+    if index_type == 'hnsw':
+        return f"HNSW{HNSW_M}" if precision == 'fp32' else f"HNSW{HNSW_M}_{codec}"
+    if index_type == 'ivfpq':
+        return f"IVF{auto_nlist(num_vectors)},PQ{auto_pq_m(dimension)}"
+    raise ValueError(f"Unknown index type: {index_type}. Expected one of: {', '.join(INDEX_TYPES)}")
+
+def create_index(index_type: str, embeddings: np.ndarray, ids: np.ndarray | None = None, precision: str = 'fp32'):
+    """
+    Creates an index of the given type, trained on embeddings, and adds the embeddings to it.
+
+    Args:
+        index_type (str): One of INDEX_TYPES.
+        embeddings (np.ndarray): float32 vectors to train on and add.
+        ids (np.ndarray | None): int64 ids of the vectors. When given, the index supports
+            add_with_ids, remove_ids and reconstruction by id: IVF types store ids natively
+            and get a direct map, flat and HNSW indexes are wrapped in an IndexIDMap2.
+        precision (str): Storage precision of the vectors, see codec_string.
+
+    Returns:
+        faiss.Index: The populated index.
+    """
+    num_vectors, dimension = embeddings.shape
+    index = faiss.index_factory(dimension, factory_string(index_type, dimension, num_vectors, precision), faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(embeddings)
+    if ids is None:
+        index.add(embeddings)
+        return index
+    if faiss.try_extract_index_ivf(index) is None:
+        index = faiss.IndexIDMap2(index)
+    enable_reconstruction(index)
+    index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+    return index
+
+def enable_reconstruction(index):
+    """
+    Gives an IVF index a direct map from ids to list positions, so vectors can be
+    reconstructed by id. A hashtable map is used because ids are not contiguous after
+    removals; it is kept up to date by add_with_ids and remove_ids and saved with the index.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+def _base_index(index):
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+
+def index_type_of(index) -> str:
+    """Returns the INDEX_TYPES name of an existing FAISS index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return 'ivfpq' if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else 'ivf'
+    if isinstance(_base_index(index), faiss.IndexHNSW):
+        return 'hnsw'
+    return 'flat'
+
+def precision_of(index) -> str:
+    """Returns the VECTOR_PRECISIONS name of the vector encoding of an existing FAISS index."""
+    ivf = faiss.try_extract_index_ivf(index)
+    base = faiss.downcast_index(ivf) if ivf is not None else _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base = faiss.downcast_index(base.storage)
+    if isinstance(base, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return 'fp16' if base.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else 'int8'
+    if isinstance(base, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return 'pq'
+    return 'fp32'
+
+def bytes_per_vector(index) -> float:
+    """Returns the serialized size of an index divided by its vector count, including ids and graph links."""
+    return len(faiss.serialize_index(index)) / max(index.ntotal, 1)
+
+def has_ids(index) -> bool:
+    """Returns True if vectors in index are addressed by explicit ids (IndexIDMap2 or IVF)."""
+    return isinstance(index, faiss.IndexIDMap2) or faiss.try_extract_index_ivf(index) is not None
+
+def with_ids(index):
+    """
+    Returns an index supporting add_with_ids and remove_ids with the same contents.
+
+    Plain flat and HNSW indexes from older index directories are rebuilt inside an
+    IndexIDMap2 with ids 0..ntotal-1; other indexes are returned unchanged.
+    """
+    if has_ids(index):
+        return index
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, index.d), dtype=np.float32)
+    index.reset()
+    wrapped = faiss.IndexIDMap2(index)
+    if len(vectors):
+        wrapped.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    return wrapped
+
+def stored_vectors(index) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns every vector stored in an index together with its id.
+
+    Vectors of 'ivfpq' indexes are their lossy decoded approximations.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (int64 ids sorted ascending, float32 vectors in the same order)
+    """
+    if isinstance(index, faiss.IndexIDMap2):
+        ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+        vectors = _base_index(index).reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, index.d), dtype=np.float32)
+    else:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is None:
+            return np.arange(index.ntotal, dtype=np.int64), index.reconstruct_n(0, index.ntotal)
+        invlists = ivf.invlists
+        parts = []
+        for list_no in range(ivf.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                list_ids = invlists.get_ids(list_no)
+                parts.append(faiss.rev_swig_ptr(list_ids, size).copy())
+                invlists.release_ids(list_no, list_ids)
+        ids = np.concatenate(parts).astype(np.int64) if parts else np.empty(0, dtype=np.int64)
+        # Ids are arbitrary after removals, so reconstruction goes through a temporary hashtable direct map.
+        previous = ivf.direct_map.type
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        vectors = ivf.reconstruct_batch(ids) if len(ids) else np.empty((0, index.d), dtype=np.float32)
+        ivf.set_direct_map_type(previous)
+    order = np.argsort(ids, kind='stable')
+    return ids[order], vectors[order]
+
+def search_parameters(index, nprobe: int | None = None, ef_search: int | None = None, selector=None,
+                      selected: int | None = None):
+    """
+    Builds per-call FAISS search parameters for an index.
+
+    Parameters are passed to each search rather than set on the index, so concurrent
+    searches with different settings do not interfere.
+
+    Args:
+        index: FAISS index to be searched.
+        nprobe (int | None): IVF lists to visit. Defaults to IVF_NPROBE.
+        ef_search (int | None): HNSW candidate list size. Defaults to HNSW_EF_SEARCH.
+        selector (faiss.IDSelector | None): Restricts the search to the ids it accepts.
+        selected (int | None): Number of ids the selector accepts. IVF searches visit
+            proportionally more lists, up to all of them, so a selective filter still
+            finds as many candidates as an unfiltered search instead of returning fewer
+            than top_k results.
+
+    Returns:
+        faiss.SearchParameters | None: None for flat indexes searched without a selector.
+    """
+    kind = index_type_of(index)
+    if kind in ('ivf', 'ivfpq'):
+        nprobe = nprobe or IVF_NPROBE
+        if selector is not None and selected is not None:
+            nlist = faiss.extract_index_ivf(index).nlist
+            nprobe = min(nlist, math.ceil(nprobe * index.ntotal / max(selected, 1)))
+        return faiss.SearchParametersIVF(nprobe=nprobe, sel=selector)
+    if kind == 'hnsw':
+        return faiss.SearchParametersHNSW(efSearch=ef_search or HNSW_EF_SEARCH, sel=selector)
+    return faiss.SearchParameters(sel=selector) if selector is not None else None
+
+def can_reconstruct(index) -> bool:
+    """Returns True if vectors can be read back from an index by id; IVF indexes need a direct map."""
+    ivf = faiss.try_extract_index_ivf(index)
+    return ivf is None or ivf.direct_map.type != faiss.DirectMap.NoMap
+
+def exact_search(query_embeddings: np.ndarray, ids: np.ndarray, vectors: np.ndarray,
+                 top_k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Brute-force search over a subset of vectors.
+
+    Args:
+        query_embeddings (np.ndarray): float32 queries, shape (queries, d).
+        ids (np.ndarray): Ids of the vectors searched.
+        vectors (np.ndarray): float32 vectors in the same order as ids.
+        top_k (int): Results per query.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (squared L2 distances, ids), like Index.search,
+        padded with MISSING_DISTANCE and -1 when fewer than top_k vectors are searched.
+    """
+    distances = np.full((len(query_embeddings), top_k), MISSING_DISTANCE, dtype=np.float32)
+    result_ids = np.full((len(query_embeddings), top_k), -1, dtype=np.int64)
+    k = min(top_k, len(ids))
+    if k:
+        found, positions = faiss.knn(query_embeddings, np.ascontiguousarray(vectors, dtype=np.float32), k)
+        distances[:, :k] = found
+        result_ids[:, :k] = np.where(positions >= 0, np.asarray(ids, dtype=np.int64)[positions], -1)
+    return distances, result_ids
+
+def exact_rerank(query_embeddings: np.ndarray, candidate_ids: np.ndarray, candidate_vectors: np.ndarray,
+                 top_k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Re-scores search candidates with exact distances and keeps the best top_k per query.
+
+    Args:
+        query_embeddings (np.ndarray): float32 queries, shape (queries, d).
+        candidate_ids (np.ndarray): Candidate ids from a search, shape (queries, candidates); -1 marks none.
+        candidate_vectors (np.ndarray): Full-precision vectors of the candidates, shape (queries, candidates, d).
+        top_k (int): Results to keep per query.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (squared L2 distances, ids), like Index.search.
+    """
+    distances = ((candidate_vectors - query_embeddings[:, None, :]) ** 2).sum(axis=2, dtype=np.float32)
+    distances[candidate_ids < 0] = MISSING_DISTANCE
+    order = np.argsort(distances, axis=1, kind='stable')[:, :top_k]
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(candidate_ids, order, axis=1)
+
+def _recall(found, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f[f >= 0]) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+def storage_report(vectors: np.ndarray, queries: np.ndarray, top_k: int = 10, index_type: str = 'flat',
+                   precisions: tuple = VECTOR_PRECISIONS, rerank_factor: int = 4) -> list[dict]:
+    """
+    Measures the memory and recall cost of each storage precision for one index type.
+
+    Args:
+        vectors (np.ndarray): Corpus vectors.
+        queries (np.ndarray): Query vectors.
+        top_k (int): k for recall@k.
+        index_type (str): One of INDEX_TYPES. Approximate types use their default search parameters.
+        precisions (tuple): Precisions to measure; those needing more training vectors than given are skipped.
+        rerank_factor (int): Candidates per result re-ranked with exact distances; 0 skips re-ranking.
+
+    Returns:
+        list[dict]: One row per precision with factory, bytes_per_vector, recall_at_k,
+        recall_loss against exact fp32 search, and reranked_recall_at_k (None for fp32 or without re-ranking).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    truth = exact.search(queries, top_k)[1]
+    rows = []
+    for precision in precisions:
+        if len(vectors) < min_training_vectors(index_type, len(vectors), precision):
+            continue
+        index = create_index(index_type, vectors, precision=precision)
+        params = search_parameters(index)
+        recall = _recall(index.search(queries, top_k, params=params)[1], truth)
+        reranked = None
+        if rerank_factor > 0 and precision != 'fp32':
+            candidates = index.search(queries, top_k * rerank_factor, params=params)[1]
+            reranked = _recall(exact_rerank(queries, candidates, vectors[candidates], top_k)[1], truth)
+        rows.append({
+            'precision': precision,
+            'factory': factory_string(index_type, vectors.shape[1], len(vectors), precision),
+            'bytes_per_vector': bytes_per_vector(index),
+            'recall_at_k': recall,
+            'recall_loss': 1.0 - recall,
+            'reranked_recall_at_k': reranked,
+        })
+    return rows
+
+def recall_latency_report(vectors: np.ndarray, queries: np.ndarray, top_k: int = 10,
+                          nprobes: tuple = (1, 4, 16, 64), ef_searches: tuple = (16, 32, 64, 128)) -> list[dict]:
+    """
+    Measures recall@k and per-query latency of each index type against exact flat search.
+
+    Args:
+        vectors (np.ndarray): Corpus vectors.
+        queries (np.ndarray): Query vectors.
+        top_k (int): k for recall@k.
+        nprobes (tuple): IVF nprobe values to try.
+        ef_searches (tuple): HNSW efSearch values to try.
+
+    Returns:
+        list[dict]: One row per setting with index_type, factory, params, recall, latency and build time.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    rows = []
+
+    def measure(index, index_type, factory, build_seconds, params, label):
+        # Queries run one at a time so latency reflects interactive use.
+        latencies = []
+        found = []
+        for query in queries:
+            start = time.perf_counter()
+            _, ids = index.search(query[None, :], top_k, params=params)
+            latencies.append(time.perf_counter() - start)
+            found.append(ids[0])
+        recall = _recall(found, truth)
+        latencies_ms = np.array(latencies) * 1000
+        rows.append({
+            'index_type': index_type,
+            'factory': factory,
+            'params': label,
+            'recall_at_k': recall,
+            'mean_latency_ms': float(latencies_ms.mean()),
+            'p95_latency_ms': float(np.percentile(latencies_ms, 95)),
+            'build_seconds': build_seconds,
+        })
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    truth = exact.search(queries, top_k)[1]
+
+    for index_type in INDEX_TYPES:
+        if len(vectors) < min_training_vectors(index_type, len(vectors)):
+            continue
+        factory = factory_string(index_type, vectors.shape[1], len(vectors))
+        start = time.perf_counter()
+        index = create_index(index_type, vectors)
+        build_seconds = time.perf_counter() - start
+        if index_type in ('ivf', 'ivfpq'):
+            for nprobe in nprobes:
+                if nprobe <= faiss.extract_index_ivf(index).nlist:
+                    measure(index, index_type, factory, build_seconds,
+                            faiss.SearchParametersIVF(nprobe=nprobe), f"nprobe={nprobe}")
+        elif index_type == 'hnsw':
+            for ef_search in ef_searches:
+                measure(index, index_type, factory, build_seconds,
+                        faiss.SearchParametersHNSW(efSearch=ef_search), f"efSearch={ef_search}")
+        else:
+            measure(index, index_type, factory, build_seconds, None, '')
+    return rows
@@ -0,0 +1,451 @@
+import json
+import mmap
+import os
+import pickle
+import shutil
+import zlib
+import numpy as np
+import faiss
+from config import EMBEDDING_MODEL, COMPRESS_TEXTS
+
+FORMAT_NAME = 'research-assistant-index'
+FORMAT_VERSION = 2
+# Version 1 directories have no compressed texts or full-precision vectors and are read unchanged.
+READABLE_VERSIONS = (1, 2)
+
+MANIFEST_FILE = 'manifest.json'
+VECTORS_FILE = 'vectors.faiss'
+TEXTS_FILE = 'texts.bin'
+TEXT_OFFSETS_FILE = 'text_offsets.npy'
+METADATA_FILE = 'metadata.npz'
+TEXT_BLOCKS_FILE = 'text_blocks.npy'
+EXACT_VECTORS_FILE = 'vectors_fp32.npy'
+REMOVED_IDS_FILE = 'removed_ids.npy'
+
+# Texts compressed together; a lookup decompresses one block.
+TEXT_BLOCK_SIZE = 16
+
+
+class TextStore:
+    """
+    Read-mostly sequence of chunk texts backed by an offset-indexed UTF-8 blob.
+
+    The blob is memory-mapped and a text is only decoded when it is accessed, so
+    opening a store costs the same regardless of how many texts it holds. In a
+    compressed store the blob holds zlib blocks of block_size texts each, and the
+    most recently used block is kept decompressed. Texts appended after loading are
+    kept in memory until the index is saved again.
+    """
+
+    def __init__(self, blob_path: str, offsets_path: str, blocks_path: str | None = None,
+                 block_size: int = TEXT_BLOCK_SIZE):
+        self._offsets = np.load(offsets_path, mmap_mode='r')
+        self._blocks = np.load(blocks_path, mmap_mode='r') if blocks_path else None
+        self._block_size = block_size
+        self._cached_block = (-1, b'')
+        self._file = open(blob_path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._stored = len(self._offsets) - 1
+        self._tail = []
+
+    def __len__(self) -> int:
+        return self._stored + len(self._tail)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("text index out of range")
+        if i >= self._stored:
+            return self._tail[i - self._stored]
+        if self._blocks is None:
+            return self._blob[int(self._offsets[i]):int(self._offsets[i + 1])].decode('utf-8')
+        block_no = i // self._block_size
+        base = int(self._offsets[block_no * self._block_size])
+        data = self._block(block_no)
+        return data[int(self._offsets[i]) - base:int(self._offsets[i + 1]) - base].decode('utf-8')
+
+    def _block(self, block_no: int) -> bytes:
+        # The cache is a single tuple, so concurrent readers always see a matching pair.
+        cached_no, data = self._cached_block
+        if cached_no != block_no:
+            data = zlib.decompress(self._blob[int(self._blocks[block_no]):int(self._blocks[block_no + 1])])
+            self._cached_block = (block_no, data)
+        return data
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def append(self, text: str):
+        self._tail.append(text)
+
+    def extend(self, texts):
+        self._tail.extend(texts)
+
+
+class VectorStore:
+    """
+    Full-precision float32 vectors by id, kept beside a compressed FAISS index for exact re-ranking.
+
+    Saved vectors are a memory-mapped .npy file, so a search only reads the rows of
+    the candidates it re-ranks. Vectors added after loading are kept in memory until
+    the index is saved again.
+    """
+
+    def __init__(self, path: str | None = None):
+        self._stored = np.load(path, mmap_mode='r') if path else None
+        self._tail = []
+
+    def __len__(self) -> int:
+        return (len(self._stored) if self._stored is not None else 0) + sum(len(part) for part in self._tail)
+
+    def append(self, vectors: np.ndarray):
+        self._tail.append(np.asarray(vectors, dtype=np.float32))
+
+    def take(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Returns the vectors of ids, in the shape of ids plus the vector dimension.
+
+        Negative ids (missing search results) yield zero vectors.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self._tail) > 1:
+            self._tail = [np.concatenate(self._tail)]
+        parts = ([self._stored] if self._stored is not None else []) + self._tail
+        dimension = parts[0].shape[1] if parts else 0
+        flat = ids.reshape(-1)
+        out = np.zeros((len(flat), dimension), dtype=np.float32)
+        start = 0
+        for part in parts:
+            mask = (flat >= start) & (flat < start + len(part))
+            if mask.any():
+                # Sorted row order keeps reads from the memory-mapped file sequential.
+                rows = flat[mask] - start
+                order = np.argsort(rows, kind='stable')
+                out[np.flatnonzero(mask)[order]] = part[rows[order]]
+            start += len(part)
+        return out.reshape(ids.shape + (dimension,))
+
+    def __iter__(self):
+        if self._stored is not None:
+            yield self._stored
+        yield from self._tail
+
+
+class ColumnarMetadata:
+    """
+    Sequence of per-chunk metadata dicts stored column by column.
+
+    Integer fields are stored as int64 arrays; every other field is dictionary-encoded
+    as JSON values, which keeps repeated values such as source paths compact. Fields
+    missing from some rows carry a presence mask. Rows are rebuilt into dicts on access.
+    """
+
+    def __init__(self, path: str, columns: dict, count: int):
+        self._columns = {}
+        with np.load(path, allow_pickle=False) as data:
+            for name, kind in columns.items():
+                values = data[f'{name}.values']
+                present = data[f'{name}.present'] if f'{name}.present' in data else None
+                if kind == 'json':
+                    values = (data[f'{name}.dictionary'].tolist(), values)
+                self._columns[name] = (kind, values, present)
+        self._stored = count
+        self._tail = []
+
+    def __len__(self) -> int:
+        return self._stored + len(self._tail)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("metadata index out of range")
+        if i >= self._stored:
+            return self._tail[i - self._stored]
+        row = {}
+        for name, (kind, values, present) in self._columns.items():
+            if present is not None and not present[i]:
+                continue
+            if kind == 'int':
+                row[name] = int(values[i])
+            else:
+                dictionary, codes = values
+                row[name] = json.loads(dictionary[codes[i]])
+        return row
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def column(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns one field of every row without building row dicts.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (values, present). Integer fields are int64 with 0
+            where absent; other fields are decoded into an object array with None where absent.
+        """
+        kind, values, present = self._columns.get(name, ('json', None, None))
+        if values is None:
+            values, present = np.full(self._stored, None, dtype=object), np.zeros(self._stored, dtype=bool)
+        elif kind == 'json':
+            dictionary, codes = values
+            decoded = np.empty(len(dictionary), dtype=object)
+            decoded[:] = [json.loads(value) for value in dictionary]
+            values = decoded[codes] if len(codes) else np.empty(0, dtype=object)
+        if present is None:
+            present = np.ones(self._stored, dtype=bool)
+        if self._tail:
+            tail_present = np.array([name in row for row in self._tail], dtype=bool)
+            tail_values = np.empty(len(self._tail), dtype=object)
+            tail_values[:] = [row.get(name) for row in self._tail]
+            if values.dtype != object and all(type(value) is int for value in tail_values[tail_present]):
+                tail_values = np.where(tail_present, tail_values, 0).astype(values.dtype)
+            values = np.concatenate([values, tail_values])
+            present = np.concatenate([present, tail_present])
+        return values, present
+
+    def append(self, metadata: dict):
+        self._tail.append(metadata)
+
+    def extend(self, metadatas):
+        self._tail.extend(metadatas)
+
+
+def _write_metadata(path: str, metadatas, removed=frozenset()) -> dict:
+    if removed:
+        metadatas = [{} if i in removed else row for i, row in enumerate(metadatas)]
+    names = []
+    for row in metadatas:
+        for name in row:
+            if name not in names:
+                names.append(name)
+    count = len(metadatas)
+    arrays = {}
+    columns = {}
+    for name in names:
+        present = np.array([name in row for row in metadatas], dtype=bool)
+        raw = [row.get(name) for row in metadatas]
+        if all(type(value) is int for value, p in zip(raw, present) if p):
+            columns[name] = 'int'
+            arrays[f'{name}.values'] = np.array([value if p else 0 for value, p in zip(raw, present)], dtype=np.int64)
+        else:
+            columns[name] = 'json'
+            dictionary = {}
+            codes = np.array([dictionary.setdefault(json.dumps(value), len(dictionary)) for value in raw], dtype=np.int32)
+            arrays[f'{name}.values'] = codes
+            arrays[f'{name}.dictionary'] = np.array(list(dictionary), dtype=str)
+        if not present.all():
+            arrays[f'{name}.present'] = present
+    if count == 0:
+        arrays['_empty'] = np.empty(0)
+    np.savez(path, **arrays)
+    return columns
+
+def _write_texts(blob_path: str, offsets_path: str, texts, removed=frozenset(), blocks_path: str | None = None):
+    """Writes texts to a blob with their offsets; with blocks_path, as zlib blocks of TEXT_BLOCK_SIZE texts."""
+    offsets = np.empty(len(texts) + 1, dtype=np.int64)
+    offsets[0] = 0
+    blocks = [0]
+    block = []
+    with open(blob_path, 'wb') as f:
+        for i, text in enumerate(texts):
+            encoded = b'' if i in removed else text.encode('utf-8')
+            offsets[i + 1] = offsets[i] + len(encoded)
+            if blocks_path is None:
+                f.write(encoded)
+                continue
+            block.append(encoded)
+            if len(block) == TEXT_BLOCK_SIZE or i == len(texts) - 1:
+                blocks.append(blocks[-1] + f.write(zlib.compress(b''.join(block))))
+                block = []
+    np.save(offsets_path, offsets)
+    if blocks_path is not None:
+        np.save(blocks_path, np.array(blocks, dtype=np.int64))
+
+def _write_vectors(path: str, vectors: VectorStore, count: int, removed=frozenset()):
+    parts = list(vectors)
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(count, parts[0].shape[1]))
+    start = 0
+    for part in parts:
+        out[start:start + len(part)] = part
+        start += len(part)
+    if removed:
+        out[np.fromiter(removed, dtype=np.int64)] = 0
+    out.flush()
+    del out
+
+def write_index_dir(path: str, index, texts, metadatas, model_name: str, extra: dict | None = None,
+                    removed=frozenset(), exact_vectors: VectorStore | None = None,
+                    compress_texts: bool = COMPRESS_TEXTS):
+    """
+    Writes an index directory: native FAISS index, text blob, columnar metadata and manifest.
+
+    The directory is written next to its final location and swapped in at the end, so
+    an existing index at path (including one that is currently memory-mapped) stays
+    intact if writing fails. Anything at path other than an index is never replaced.
+
+    Args:
+        path (str): Target directory.
+        index: FAISS index.
+        texts: Sequence of chunk texts.
+        metadatas: Sequence of metadata dicts, one per text.
+        model_name (str): Name of the embedding model used for the vectors.
+        extra (dict | None): Additional manifest fields, such as the configured index type.
+        removed: Positions of chunks removed from the index. Their rows are kept so the
+            positions of other chunks do not change, but are written with empty text and
+            metadata, and the positions are saved so they are known after loading.
+        exact_vectors (VectorStore | None): Full-precision vectors by position, saved for re-ranking.
+        compress_texts (bool): Store texts as zlib-compressed blocks.
+
+    Raises:
+        ValueError: If path exists but is not an index, see check_index_path.
+    """
+    path = os.path.normpath(path)
+    check_index_path(path)
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    faiss.write_index(index, os.path.join(tmp_path, VECTORS_FILE))
+    _write_texts(os.path.join(tmp_path, TEXTS_FILE), os.path.join(tmp_path, TEXT_OFFSETS_FILE), texts, removed,
+                 os.path.join(tmp_path, TEXT_BLOCKS_FILE) if compress_texts else None)
+    columns = _write_metadata(os.path.join(tmp_path, METADATA_FILE), metadatas, removed)
+    if exact_vectors is not None and len(exact_vectors):
+        _write_vectors(os.path.join(tmp_path, EXACT_VECTORS_FILE), exact_vectors, len(texts), removed)
+    if removed:
+        np.save(os.path.join(tmp_path, REMOVED_IDS_FILE), np.sort(np.fromiter(removed, dtype=np.int64)))
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'count': len(texts),
+        'dimension': index.d,
+        'model_name': model_name,
+        'metadata_columns': columns,
+        'text_compression': 'zlib' if compress_texts else None,
+        'text_block_size': TEXT_BLOCK_SIZE,
+        'exact_vectors': exact_vectors is not None and len(exact_vectors) > 0,
+        'removed': len(removed),
+        **(extra or {}),
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    old_path = path + '.old'
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+    if os.path.isdir(path):
+        os.rename(path, old_path)
+    elif os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+
+def check_index_path(path: str):
+    """
+    Checks that saving an index to path cannot destroy unrelated files.
+
+    path may be missing, an empty directory, an index directory or a legacy pickle index.
+
+    Raises:
+        ValueError: If path exists and is anything else.
+    """
+    if not os.path.exists(path) or os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+        return
+    if os.path.isdir(path):
+        if not os.listdir(path):
+            return
+    else:
+        with open(path, 'rb') as f:
+            # Pickles of protocol 2 and later start with the PROTO opcode.
+            if f.read(1) == pickle.PROTO:
+                return
+    raise ValueError(f"{path} exists and is not an index; refusing to replace it")
+
+def read_manifest(path: str) -> dict:
+    """
+    Reads and validates the manifest of an index directory.
+
+    Raises:
+        FileNotFoundError: If path is not an index directory.
+        ValueError: If the format or version is not supported.
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Index manifest not found: {manifest_path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_NAME:
+        raise ValueError(f"{path} is not a research assistant index")
+    if manifest.get('version') not in READABLE_VERSIONS:
+        raise ValueError(f"Unsupported index format version {manifest.get('version')} (expected {FORMAT_VERSION})")
+    return manifest
+
+def read_index_dir(path: str, mmap_vectors: bool = True):
+    """
+    Opens an index directory written by write_index_dir.
+
+    Args:
+        path (str): Index directory.
+        mmap_vectors (bool): Memory-map the FAISS index instead of reading it into RAM.
+            Use False when the index will be modified.
+
+    Returns:
+        tuple: (manifest, FAISS index, TextStore, ColumnarMetadata). Full-precision vectors,
+        if saved, are opened separately with read_exact_vectors.
+    """
+    manifest = read_manifest(path)
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap_vectors else 0
+    index = faiss.read_index(os.path.join(path, VECTORS_FILE), flags)
+    compressed = manifest.get('text_compression') == 'zlib'
+    texts = TextStore(os.path.join(path, TEXTS_FILE), os.path.join(path, TEXT_OFFSETS_FILE),
+                      os.path.join(path, TEXT_BLOCKS_FILE) if compressed else None,
+                      manifest.get('text_block_size', TEXT_BLOCK_SIZE))
+    metadata = ColumnarMetadata(os.path.join(path, METADATA_FILE), manifest['metadata_columns'], manifest['count'])
+    return manifest, index, texts, metadata
+
+def read_exact_vectors(path: str, manifest: dict) -> VectorStore | None:
+    """Memory-maps the full-precision vectors of an index directory, or returns None if it has none."""
+    if not manifest.get('exact_vectors'):
+        return None
+    return VectorStore(os.path.join(path, EXACT_VECTORS_FILE))
+
+def read_removed_ids(path: str, manifest: dict) -> np.ndarray:
+    """Returns the positions of removed chunks of an index directory (empty for directories without any)."""
+    if not manifest.get('removed'):
+        return np.empty(0, dtype=np.int64)
+    return np.load(os.path.join(path, REMOVED_IDS_FILE))
+
+def migrate_pickle_index(pkl_path: str, out_path: str) -> int:
+    """
+    Converts a legacy pickled SemanticIndexer file into an index directory.
+
+    Args:
+        pkl_path (str): Path of the legacy index.pkl file.
+        out_path (str): Directory to write.
+
+    Returns:
+        int: Number of chunks migrated.
+    """
+    with open(pkl_path, 'rb') as f:
+        legacy = pickle.load(f)
+    if legacy.index is None:
+        raise ValueError(f"Legacy index {pkl_path} is empty")
+    model_name = getattr(legacy, 'model_name', EMBEDDING_MODEL)
+    write_index_dir(out_path, legacy.index, legacy.texts, legacy.metadata, model_name)
+    return len(legacy.texts)
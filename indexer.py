@@ -1,18 +1,155 @@
-from sentence_transformers import SentenceTransformer
-import faiss
 import numpy as np
+import logging
+import os
 import pickle
-from config import EMBEDDING_MODEL
+import time
+import uuid
+from typing import Callable, Iterable
+from config import (EMBEDDING_MODEL, EMBED_BATCH_SIZE, INDEX_TYPE, VECTOR_PRECISIONS, VECTOR_PRECISION, RERANK_FACTOR,
+                    COMPACT_REMOVED_FRACTION)
+from embedding_cache import EmbeddingCache, cache_key
+from embedding_engine import EmbeddingEngine
+from filters import EXACT_SEARCH_MAX_IDS, MetadataIndex, id_selector
+from metrics import instrumentation
+from query_cache import LRUCache, encode_queries, query_embedding_cache
+from index_store import VectorStore, read_exact_vectors, read_index_dir, read_removed_ids, write_index_dir
+from index_factory import (INDEX_TYPES, can_reconstruct, create_index, enable_reconstruction, exact_rerank, exact_search,
+                           index_type_of, min_training_vectors, precision_of, search_parameters, stored_vectors,
+                           with_ids)
+
+logger = logging.getLogger(__name__)
 
 class SemanticIndexer:
-    def __init__(self, model_name: str = EMBEDDING_MODEL):
+    def __init__(self, model_name: str = EMBEDDING_MODEL, cache: EmbeddingCache | None = None,
+                 index_type: str = INDEX_TYPE, precision: str = VECTOR_PRECISION, rerank_factor: int = RERANK_FACTOR,
+                 engine: EmbeddingEngine | None = None, query_cache: LRUCache | None = None):
         """
         Initialize the semantic indexer with a sentence transformer model.
+
+        The model is taken from the shared model registry on first use, so indexers
+        using the same model share one instance.
+
+        Args:
+            model_name (str): Sentence transformer model name.
+            cache (EmbeddingCache | None): Optional on-disk embedding cache consulted before encoding.
+            index_type (str): Target FAISS index type: 'flat', 'ivf', 'hnsw' or 'ivfpq'. Index types
+                that need training start out flat and are converted once enough vectors exist.
+            precision (str): Storage precision of the vectors in the index: 'fp32', 'fp16',
+                'int8' (scalar quantizer) or 'pq' (product quantizer). Precisions that need
+                training start out as fp32 and are converted like index types.
+            rerank_factor (int): When positive, full-precision vectors are kept beside a
+                compressed index and saved with it, and searches re-rank top_k * rerank_factor
+                candidates with exact distances. 0 disables re-ranking.
+            engine (EmbeddingEngine | None): Encodes texts for the index. Defaults to an engine
+                configured from the EMBED_* settings.
+            query_cache (LRUCache | None): Cache of query embeddings. Defaults to an in-memory
+                cache of QUERY_CACHE_SIZE queries.
         """
-        self.model = SentenceTransformer(model_name)
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}. Expected one of: {', '.join(INDEX_TYPES)}")
+        self._check_precision(precision)
+        self.model_name = model_name
+        self.cache = cache
+        self.engine = engine or EmbeddingEngine(model_name)
+        self.index_type = index_type
+        self.precision = precision
+        self.rerank_factor = rerank_factor
+        # Full-precision vectors by position, kept only for re-ranking.
+        self.exact_vectors = None
         self.index = None
         self.texts = []
         self.metadata = []
+        # Document manifest: source -> {'hash': ..., 'ids': [[start, end], ...]}, filled from 'source' metadata.
+        self.documents = {}
+        self._removed = set()
+        self._metadata_index = None
+        self.query_cache = query_cache if query_cache is not None else query_embedding_cache()
+        # Changes whenever the indexed vectors change, so cached answers of an older index are never served.
+        self.index_version = uuid.uuid4().hex
+
+    @staticmethod
+    def _check_precision(precision: str):
+        if precision not in VECTOR_PRECISIONS:
+            raise ValueError(f"Unknown vector precision: {precision}. Expected one of: {', '.join(VECTOR_PRECISIONS)}")
+
+    @property
+    def model(self):
+        """The sentence transformer of the embedding engine, loaded through the shared model registry."""
+        return self.engine.model
+
+    def close(self):
+        """Stops the embedding engine's worker processes, if any were started."""
+        self.engine.close()
+
+    @property
+    def metadata_index(self) -> MetadataIndex:
+        """Resolves search filters to vector ids; built on first use and after chunks are added."""
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex(self.metadata, self.documents, self._removed)
+        return self._metadata_index
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['cache'] = None
+        state.pop('engine', None)
+        state['_metadata_index'] = None
+        state.pop('query_cache', None)
+        return state
+
+    def __setstate__(self, state):
+        # Legacy pickles carry their own model; the registry provides it now.
+        state.pop('model', None)
+        state.setdefault('model_name', EMBEDDING_MODEL)
+        state.setdefault('cache', None)
+        state.setdefault('index_type', 'flat')
+        state.setdefault('precision', 'fp32')
+        state.setdefault('rerank_factor', 0)
+        state.setdefault('exact_vectors', None)
+        state.setdefault('documents', {})
+        state.setdefault('_removed', set())
+        state.setdefault('_metadata_index', None)
+        state.setdefault('index_version', uuid.uuid4().hex)
+        self.__dict__.update(state)
+        self.engine = EmbeddingEngine(self.model_name)
+        self.query_cache = query_embedding_cache()
+
+    def _touch(self):
+        """Marks the index as changed."""
+        self.index_version = uuid.uuid4().hex
+
+    def encode(self, texts: list[str], show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Embed texts, encoding each distinct text at most once.
+
+        Exact duplicates within the call are encoded once, and when a cache is attached,
+        texts already embedded with this model are served from it instead of the model.
+        The remaining texts are encoded by the embedding engine in length-bucketed batches.
+
+        Args:
+            texts (list[str]): Texts to embed.
+            show_progress_bar (bool): Show the sentence transformer progress bar.
+
+        Returns:
+            np.ndarray: float32 embeddings, one row per input text.
+        """
+        if not texts:
+            return np.empty((0, self.index.d if self.index is not None else 0), dtype=np.float32)
+        keys = [cache_key(self.engine.cache_name, text) for text in texts]
+        unique = {}
+        for position, key in enumerate(keys):
+            unique.setdefault(key, position)
+        unique_keys = list(unique)
+        cached = self.cache.get_many(unique_keys) if self.cache is not None else [None] * len(unique_keys)
+        missing = [key for key, vector in zip(unique_keys, cached) if vector is None]
+        if self.cache is not None:
+            instrumentation.cache_lookup('embedding', len(unique_keys) - len(missing), len(missing))
+        vectors = dict(zip(unique_keys, cached))
+        if missing:
+            encoded = self.engine.encode([texts[unique[key]] for key in missing], show_progress_bar=show_progress_bar)
+            vectors.update(zip(missing, encoded))
+            if self.cache is not None:
+                self.cache.put_many(missing, encoded)
+        return np.stack([vectors[key] for key in keys]).astype(np.float32, copy=False)
 
     def build_index(self, texts: list[str], metadatas: list[dict]):
         """
@@ -22,12 +159,15 @@ class SemanticIndexer:
             texts (list[str]): List of text chunks to embed.
             metadatas (list[dict]): Corresponding metadata for each text chunk.
         """
-        embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(embeddings)
+        embeddings = self.encode(texts, show_progress_bar=True)
+        self.index = None
+        self.exact_vectors = None
+        self._add_embeddings(embeddings, 0)
         self.texts = texts
         self.metadata = metadatas
+        self.documents = {}
+        self._removed = set()
+        self._track_documents(0, metadatas)
 
     def add_texts(self, texts: list[str], metadatas: list[dict]):
         """
@@ -39,50 +179,404 @@ class SemanticIndexer:
         """
         if self.index is None:
             raise ValueError("Index not built. Use build_index first.")
-        embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
-        self.index.add(embeddings)
+        embeddings = self.encode(texts, show_progress_bar=True)
+        self._extend(embeddings, texts, metadatas)
+
+    def add_stream(self, items: Iterable[tuple[str, dict]], batch_size: int = EMBED_BATCH_SIZE,
+                   on_batch: Callable[[int, float, float], None] | None = None) -> int:
+        """
+        Embed and index (text, metadata) pairs in fixed-size batches as they arrive.
+
+        Only one batch of texts and embeddings is held at a time, so peak memory for
+        embedding does not depend on corpus size. The index is created from the first
+        batch if it does not exist yet.
+
+        Args:
+            items (Iterable[tuple[str, dict]]): Stream of (text, metadata) pairs.
+            batch_size (int): Number of texts to embed per batch.
+            on_batch (Callable | None): Called after each batch with
+                (batch size, encode seconds, index add seconds).
+
+        Returns:
+            int: Number of texts added.
+        """
+        total = 0
+        texts, metadatas = [], []
+        for text, metadata in items:
+            texts.append(text)
+            metadatas.append(metadata)
+            if len(texts) >= batch_size:
+                self._add_batch(texts, metadatas, on_batch)
+                total += len(texts)
+                texts, metadatas = [], []
+        if texts:
+            self._add_batch(texts, metadatas, on_batch)
+            total += len(texts)
+        return total
+
+    def _add_batch(self, texts: list[str], metadatas: list[dict], on_batch=None):
+        start = time.perf_counter()
+        embeddings = self.encode(texts)
+        encoded = time.perf_counter()
+        self._extend(embeddings, texts, metadatas)
+        if on_batch is not None:
+            on_batch(len(texts), encoded - start, time.perf_counter() - encoded)
+
+    def _extend(self, embeddings: np.ndarray, texts: list[str], metadatas: list[dict]):
+        start = len(self.texts)
+        self._add_embeddings(embeddings, start)
         self.texts.extend(texts)
         self.metadata.extend(metadatas)
+        self._track_documents(start, metadatas)
+
+    def _track_documents(self, start: int, metadatas: list[dict]):
+        """Records the ids of chunks carrying a 'source' in the document manifest."""
+        self._metadata_index = None
+        for position, metadata in enumerate(metadatas, start):
+            source = metadata.get('source')
+            if source is None:
+                continue
+            ranges = self.documents.setdefault(source, {'hash': None, 'ids': []})['ids']
+            if ranges and ranges[-1][1] == position:
+                ranges[-1][1] = position + 1
+            else:
+                ranges.append([position, position + 1])
+
+    def _add_embeddings(self, embeddings: np.ndarray, start: int):
+        """
+        Adds vectors to the index, creating it or converting it to the target type as needed.
+
+        Each vector's id is its position in texts and metadata, starting at start.
+        """
+        self._touch()
+        ids = np.arange(start, start + len(embeddings), dtype=np.int64)
+        if self.index is None and self.rerank_factor > 0:
+            self.exact_vectors = VectorStore()
+        if self.exact_vectors is not None:
+            self.exact_vectors.append(embeddings)
+        if self.index is None:
+            if len(embeddings) >= min_training_vectors(self.index_type, len(embeddings), self.precision):
+                self.index = create_index(self.index_type, embeddings, ids, self.precision)
+            else:
+                self.index = create_index('flat', embeddings, ids)
+            return
+        self.index = with_ids(self.index)
+        self.index.add_with_ids(embeddings, ids)
+        if index_type_of(self.index) == 'flat' and precision_of(self.index) == 'fp32' and \
+                (self.index_type, self.precision) != ('flat', 'fp32'):
+            if self.index.ntotal >= min_training_vectors(self.index_type, self.index.ntotal, self.precision):
+                self.rebuild_index()
+
+    def _stored_vectors(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns (ids, vectors) of the index, reading full-precision vectors when they are kept."""
+        ids, vectors = stored_vectors(self.index)
+        if self.exact_vectors is not None:
+            vectors = self.exact_vectors.take(ids)
+        return ids, vectors
+
+    def rebuild_index(self, index_type: str | None = None):
+        """
+        Rebuild the FAISS index from its stored vectors, retraining it for the current corpus size.
+
+        Used to move a flat index to an approximate index type once enough vectors exist,
+        and to retrain an IVF index whose coarse quantizer was trained on a much smaller
+        corpus. Rebuilding from a compressed index uses its lossy decoded vectors unless
+        full-precision vectors are kept for re-ranking.
+
+        Args:
+            index_type (str | None): New index type. Defaults to the current target type.
+        """
+        if self.index is None:
+            raise ValueError("Index not built. Use build_index first.")
+        if index_type is not None:
+            if index_type not in INDEX_TYPES:
+                raise ValueError(f"Unknown index type: {index_type}. Expected one of: {', '.join(INDEX_TYPES)}")
+            self.index_type = index_type
+        ntotal = self.index.ntotal
+        needed = min_training_vectors(self.index_type, ntotal, self.precision)
+        if ntotal < needed:
+            raise ValueError(f"Index type '{self.index_type}' with '{self.precision}' vectors needs at least "
+                             f"{needed} vectors, index has {ntotal}")
+        ids, vectors = self._stored_vectors()
+        logger.info(f"Rebuilding index with {ntotal} vectors as '{self.index_type}' ({self.precision})")
+        self.index = create_index(self.index_type, vectors, ids, self.precision)
+        self._touch()
+
+    def change_index_type(self, index_type: str, precision: str | None = None):
+        """
+        Set the target index type and precision, rebuilding the index now if it has enough vectors.
+
+        Args:
+            index_type (str): New index type.
+            precision (str | None): New storage precision. Defaults to the current one.
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}. Expected one of: {', '.join(INDEX_TYPES)}")
+        precision = precision or self.precision
+        self._check_precision(precision)
+        logger.info(f"Changing index type from '{self.index_type}' ({self.precision}) to '{index_type}' ({precision})")
+        self.index_type = index_type
+        self.precision = precision
+        if self.index is not None and \
+                self.index.ntotal >= min_training_vectors(index_type, self.index.ntotal, precision):
+            self.rebuild_index()
+
+    @staticmethod
+    def document_ids(document: dict) -> np.ndarray:
+        """Returns the vector ids of a document manifest entry."""
+        ranges = [np.arange(start, end, dtype=np.int64) for start, end in document['ids']]
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
 
-    def search(self, query: str, top_k: int = 5):
+    def remove_ids(self, ids: np.ndarray):
+        """
+        Remove vectors from the index by id.
+
+        Ids are positions in texts and metadata. Removed rows stay in place, so the ids
+        of all other chunks are unchanged, and are written out empty on the next save.
+        IVF indexes and flat indexes remove vectors in place; HNSW graphs do not support
+        removal and are rebuilt from the remaining vectors.
+
+        Args:
+            ids (np.ndarray): Ids of the vectors to remove.
+        """
+        if self.index is None or len(ids) == 0:
+            return
+        ids = np.asarray(ids, dtype=np.int64)
+        self.index = with_ids(self.index)
+        if index_type_of(self.index) == 'hnsw':
+            stored_ids, vectors = self._stored_vectors()
+            keep = ~np.isin(stored_ids, ids)
+            self.index = create_index('hnsw', vectors[keep], stored_ids[keep], precision_of(self.index))
+        else:
+            self.index.remove_ids(ids)
+        self._removed.update(ids.tolist())
+        self._touch()
+
+    def has_document(self, source: str) -> bool:
+        """Returns True if a document is in the index."""
+        return source in self.documents
+
+    def remove_document(self, source: str) -> int:
+        """
+        Remove all chunks of a document from the index.
+
+        Args:
+            source (str): Document source, as recorded in the chunks' 'source' metadata.
+
+        Returns:
+            int: Number of chunks removed.
+        """
+        document = self.documents.pop(source, None)
+        if document is None:
+            raise ValueError(f"Document not in index: {source}")
+        ids = self.document_ids(document)
+        self.remove_ids(ids)
+        return len(ids)
+
+    def compact(self) -> int:
+        """
+        Drop the rows of removed chunks, renumbering the remaining chunks consecutively.
+
+        Texts, metadata, the document manifest and kept full-precision vectors are
+        rewritten without the removed rows, and the index is rebuilt from the remaining
+        vectors with their new ids. Nothing is compacted if no chunk would remain.
+
+        Returns:
+            int: Number of rows dropped.
+        """
+        if self.index is None or not self._removed or len(self._removed) >= len(self.texts):
+            return 0
+        removed = np.fromiter(self._removed, dtype=np.int64)
+        keep = np.setdiff1d(np.arange(len(self.texts), dtype=np.int64), removed)
+        stored_ids, vectors = self._stored_vectors()
+        new_ids = np.searchsorted(keep, stored_ids)
+        index_type, precision = index_type_of(self.index), precision_of(self.index)
+        if len(keep) < min_training_vectors(index_type, len(keep), precision):
+            index_type, precision = 'flat', 'fp32'
+        logger.info(f"Compacting index: dropping {len(removed)} removed of {len(self.texts)} rows")
+        self.index = create_index(index_type, vectors, new_ids, precision)
+        if self.exact_vectors is not None:
+            exact_vectors = VectorStore()
+            exact_vectors.append(self.exact_vectors.take(keep))
+            self.exact_vectors = exact_vectors
+        self.texts = [self.texts[i] for i in keep]
+        self.metadata = [self.metadata[i] for i in keep]
+        for document in self.documents.values():
+            ids = self.document_ids(document)
+            positions = np.searchsorted(keep, ids[~np.isin(ids, removed)])
+            breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+            document['ids'] = [[int(run[0]), int(run[-1]) + 1] for run in np.split(positions, breaks) if len(run)]
+        self._removed = set()
+        self._metadata_index = None
+        self._touch()
+        return len(removed)
+
+    def search(self, query: str, top_k: int = 5, nprobe: int | None = None, ef_search: int | None = None,
+               filter: dict | None = None):
         """
         Search the index for the most similar text chunks to the query.
 
         Args:
             query (str): The query string.
             top_k (int): Number of top results to return.
+            nprobe (int | None): IVF lists to visit (IVF index types only). Defaults to IVF_NPROBE.
+            ef_search (int | None): HNSW candidate list size (HNSW only). Defaults to HNSW_EF_SEARCH.
+            filter (dict | None): Only return chunks matching this metadata filter, e.g.
+                {'source': 'paper.pdf', 'pages': [3, 7]}. See filters.validate_filter.
 
         Returns:
             list of tuples: (score, text, metadata)
         """
-        query_embedding = self.model.encode([query], convert_to_numpy=True)
-        distances, indices = self.index.search(query_embedding, top_k)
-        results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            if idx < len(self.texts):
-                results.append((dist, self.texts[idx], self.metadata[idx]))
-        return results
+        return self.search_batch([query], top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)[0]
+
+    def search_batch(self, queries: list[str], top_k: int = 5, nprobe: int | None = None,
+                     ef_search: int | None = None, filter: dict | None = None) -> list[list[tuple]]:
+        """
+        Search the index for several queries at once.
+
+        Queries missing from the query embedding cache are encoded in a single model call,
+        and all queries are looked up with a single multi-query FAISS search.
+
+        Args:
+            queries (list[str]): The query strings.
+            top_k (int): Number of top results to return per query.
+            nprobe (int | None): IVF lists to visit (IVF index types only). Defaults to IVF_NPROBE.
+            ef_search (int | None): HNSW candidate list size (HNSW only). Defaults to HNSW_EF_SEARCH.
+            filter (dict | None): Only return chunks matching this metadata filter.
+
+        Returns:
+            list of lists of tuples: (score, text, metadata) for each query, in input order.
+        """
+        if not queries:
+            return []
+        with instrumentation.stage('encode'):
+            query_embeddings = self.encode_queries(queries)
+        return self.search_embeddings(query_embeddings, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)
+
+    def encode_queries(self, queries: list[str]) -> np.ndarray:
+        """Embeds queries with the model, serving repeated questions from the query embedding cache."""
+        return encode_queries(self.model, self.engine.cache_name, queries, self.query_cache)
+
+    def search_embeddings(self, query_embeddings: np.ndarray, top_k: int = 5, nprobe: int | None = None,
+                          ef_search: int | None = None, filter: dict | None = None) -> list[list[tuple]]:
+        """
+        Search the index with already encoded queries and resolve texts and metadata.
+
+        Args:
+            query_embeddings (np.ndarray): Query vectors, one row per query.
+            top_k (int): Number of top results to return per query.
+            nprobe (int | None): IVF lists to visit (IVF index types only). Defaults to IVF_NPROBE.
+            ef_search (int | None): HNSW candidate list size (HNSW only). Defaults to HNSW_EF_SEARCH.
+            filter (dict | None): Only return chunks matching this metadata filter.
+
+        Returns:
+            list of lists of tuples: (score, text, metadata) for each query, in input order.
+        """
+        with instrumentation.stage('search'):
+            distances, indices = self.search_vectors(query_embeddings, top_k=top_k, nprobe=nprobe, ef_search=ef_search,
+                                                     filter=filter)
+        with instrumentation.stage('lookup'):
+            all_results = []
+            for query_distances, query_indices in zip(distances, indices):
+                results = []
+                for dist, idx in zip(query_distances, query_indices):
+                    if 0 <= idx < len(self.texts):
+                        results.append((dist, self.texts[idx], self.metadata[idx]))
+                all_results.append(results)
+        return all_results
+
+    def search_vectors(self, query_embeddings: np.ndarray, top_k: int = 5, nprobe: int | None = None,
+                       ef_search: int | None = None, filter: dict | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Search the FAISS index with already encoded queries.
+
+        Args:
+            query_embeddings (np.ndarray): Query vectors, one row per query.
+            top_k (int): Number of nearest neighbours per query.
+            nprobe (int | None): IVF lists to visit (IVF index types only). Defaults to IVF_NPROBE.
+            ef_search (int | None): HNSW candidate list size (HNSW only). Defaults to HNSW_EF_SEARCH.
+            filter (dict | None): Only return chunks matching this metadata filter. Filters
+                selecting at most EXACT_SEARCH_MAX_IDS chunks are answered by an exact search
+                over just those vectors; larger selections are passed to FAISS as an id
+                selector, so filtered chunks are skipped inside the index search.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (distances, ids), each of shape (queries, top_k).
+            Ids are positions in texts and metadata; -1 marks a missing result. With
+            re-ranking, distances are exact even when the index stores compressed vectors.
+        """
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        selector = None
+        if filter:
+            with instrumentation.stage('filter'):
+                ids = self.metadata_index.select(filter)
+            if len(ids) <= EXACT_SEARCH_MAX_IDS and (self.exact_vectors is not None or can_reconstruct(self.index)):
+                vectors = self.exact_vectors.take(ids) if self.exact_vectors is not None else \
+                    self.index.reconstruct_batch(ids)
+                return exact_search(query_embeddings, ids, vectors, top_k)
+            selector = id_selector(ids)
+        params = search_parameters(self.index, nprobe=nprobe, ef_search=ef_search, selector=selector,
+                                   selected=len(ids) if filter else None)
+        if self.exact_vectors is None or self.rerank_factor <= 0 or precision_of(self.index) == 'fp32':
+            return self.index.search(query_embeddings, top_k, params=params)
+        _, candidates = self.index.search(query_embeddings, top_k * self.rerank_factor, params=params)
+        with instrumentation.stage('rerank'):
+            return exact_rerank(query_embeddings, candidates, self.exact_vectors.take(candidates), top_k)
 
     def save(self, path: str):
         """
-        Save the indexer to a file.
+        Save the indexer to an index directory.
+
+        The FAISS index is written natively, texts to an offset-indexed (by default
+        compressed) blob and metadata to a columnar file, alongside a versioned manifest.
+        Full-precision vectors kept for re-ranking are written to a separate file that
+        is memory-mapped on load. The model is not saved. Once removed chunks make up
+        COMPACT_REMOVED_FRACTION of the rows, the index is compacted before it is written.
 
         Args:
-            path (str): Path to save the indexer.
+            path (str): Directory to save the index to.
         """
-        with open(path, 'wb') as f:
-            pickle.dump(self, f)
+        if self.index is None:
+            raise ValueError("Index not built. Use build_index first.")
+        if self._removed and len(self._removed) >= COMPACT_REMOVED_FRACTION * len(self.texts):
+            self.compact()
+        write_index_dir(path, self.index, self.texts, self.metadata, self.model_name,
+                        extra={'index_type': self.index_type, 'precision': self.precision,
+                               'rerank_factor': self.rerank_factor, 'documents': self.documents,
+                               'index_version': self.index_version},
+                        removed=self._removed, exact_vectors=self.exact_vectors)
 
     @classmethod
-    def load(cls, path: str):
+    def load(cls, path: str, mmap: bool = True):
         """
-        Load the indexer from a file.
+        Load the indexer from an index directory.
+
+        Texts are read lazily and, with mmap=True, the FAISS index is memory-mapped, so
+        load time does not grow with the size of the index. Legacy pickle files are still
+        accepted; convert them with index_store.migrate_pickle_index.
 
         Args:
-            path (str): Path to load the indexer from.
+            path (str): Index directory (or legacy pickle file) to load the indexer from.
+            mmap (bool): Memory-map the FAISS index. Pass False if the index will be modified.
 
         Returns:
             SemanticIndexer: The loaded indexer.
         """
-        with open(path, 'rb') as f:
-            return pickle.load(f)
+        if os.path.isfile(path):
+            logger.warning(f"Loading legacy pickle index {path}; run 'main.py migrate' to convert it")
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        manifest, index, texts, metadata = read_index_dir(path, mmap_vectors=mmap)
+        indexer = cls(manifest['model_name'], index_type=manifest.get('index_type', 'flat'),
+                      precision=manifest.get('precision', 'fp32'), rerank_factor=manifest.get('rerank_factor', 0))
+        indexer.exact_vectors = read_exact_vectors(path, manifest)
+        # IVF indexes saved without a direct map get one, so filtered searches can take the exact path.
+        indexer.index = enable_reconstruction(index)
+        indexer.texts = texts
+        indexer.metadata = metadata
+        indexer.documents = manifest.get('documents', {})
+        indexer._removed = set(read_removed_ids(path, manifest).tolist())
+        indexer._metadata_index = None
+        # Indexes saved before versions were recorded get a fresh one.
+        indexer.index_version = manifest.get('index_version') or indexer.index_version
+        return indexer
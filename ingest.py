@@ -0,0 +1,428 @@
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+from chunker import chunk_token_limit, iter_token_chunks, tokenize_pages
+from dedup import Deduplicator
+from models import get_tokenizer
+from page_cache import file_hash
+from pdf_processor import count_pdf_pages, extract_text_from_pdf, iter_pdf_pages, iter_text_chunks
+from config import CHUNK_OVERLAP, CHUNK_TOKENS, EMBED_BATCH_SIZE, EMBEDDING_MODEL, INGEST_WORKERS, PAGES_PER_TASK
+
+logger = logging.getLogger(__name__)
+
+
+def plan_tasks(pdf_path: str, pages_per_task: int = PAGES_PER_TASK) -> list[tuple[str, int, int]]:
+    """
+    Splits a PDF into page-range tasks so very large files can be processed in parallel.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        pages_per_task (int): Maximum number of pages handled by a single task.
+
+    Returns:
+        list[tuple[str, int, int]]: List of (pdf_path, start_page, end_page), pages 1-based and inclusive.
+    """
+    num_pages = count_pdf_pages(pdf_path)
+    return [
+        (pdf_path, start, min(start + pages_per_task - 1, num_pages))
+        for start in range(1, num_pages + 1, pages_per_task)
+    ]
+
+def process_task(task: tuple[str, int, int], page_cache_dir: str | None = None) -> tuple[list[dict], int]:
+    """
+    Extracts, strips boilerplate from and tokenizes one page range of a PDF. Runs inside a worker process.
+
+    Chunks continue across page boundaries, so they are cut from the whole file's
+    tokens by _merge_task_pages rather than per task.
+
+    Args:
+        task (tuple[str, int, int]): (pdf_path, start_page, end_page) as returned by plan_tasks.
+        page_cache_dir (str | None): Cache directory of extracted page text; None disables it.
+
+    Returns:
+        tuple[list[dict], int]: Pages from tokenize_pages and the number of boilerplate lines removed.
+    """
+    pdf_path, start_page, end_page = task
+    dedup = Deduplicator()
+    pages_text = dedup.strip_pages(extract_text_from_pdf(pdf_path, start_page=start_page, end_page=end_page,
+                                                         cache_dir=page_cache_dir))
+    pages = list(tokenize_pages(pages_text, get_tokenizer(EMBEDDING_MODEL), batch_pages=len(pages_text) or 1))
+    return pages, dedup.boilerplate_lines
+
+def _merge_task_pages(task_results: list[tuple[list[dict], int]]) -> dict:
+    """Chunks the tokenized pages of all tasks of a file in page order and drops near-duplicate chunks."""
+    pages = [page for task_pages, _ in task_results for page in task_pages]
+    limit = chunk_token_limit(get_tokenizer(EMBEDDING_MODEL), CHUNK_TOKENS, CHUNK_OVERLAP)
+    dedup = Deduplicator()
+    dedup.boilerplate_lines = sum(lines for _, lines in task_results)
+    chunks = list(dedup.filter_chunks(iter_token_chunks(pages, limit, CHUNK_OVERLAP)))
+    return {'chunks': chunks, 'pages': len(pages), 'dedup': dedup.counts()}
+
+def _plan_files(pdf_paths: list[str], pages_per_task: int):
+    for pdf_path in pdf_paths:
+        try:
+            yield pdf_path, plan_tasks(pdf_path, pages_per_task), None
+        except Exception as e:
+            yield pdf_path, [], str(e)
+
+def _failed_file(pdf_path: str, error: str) -> dict:
+    return {'path': pdf_path, 'chunks': [], 'pages': 0, 'dedup': Deduplicator().counts(), 'error': error}
+
+def _collect_file(pdf_path: str, futures: list, error: str | None) -> dict:
+    if error is not None:
+        return _failed_file(pdf_path, error)
+    try:
+        return {'path': pdf_path, **_merge_task_pages([future.result() for future in futures]), 'error': None}
+    except Exception as e:
+        for future in futures:
+            future.cancel()
+        return _failed_file(pdf_path, str(e))
+
+def ingest_pdfs(pdf_paths: list[str], workers: int = INGEST_WORKERS, pages_per_task: int = PAGES_PER_TASK,
+                page_cache_dir: str | None = None):
+    """
+    Extracts and chunks PDF files, optionally spreading the work across a process pool.
+
+    Files are split into page-range tasks; results are yielded per file in the order of
+    pdf_paths, with chunk_ids identical to a serial run. A file that fails is reported
+    through its 'error' field and does not stop the remaining files. At most about two
+    tasks per worker are in flight, so finished results do not pile up in memory.
+
+    Args:
+        pdf_paths (list[str]): Paths to PDF files.
+        workers (int): Number of worker processes. 1 runs everything in the current process.
+        pages_per_task (int): Maximum number of pages per task.
+        page_cache_dir (str | None): Cache directory of extracted page text; None disables it.
+
+    Yields:
+        dict: {'path': str, 'chunks': list[dict], 'pages': int, 'dedup': dict, 'error': str | None},
+        where 'dedup' holds the Deduplicator counts for the file.
+    """
+    if workers <= 1:
+        for pdf_path, tasks, error in _plan_files(pdf_paths, pages_per_task):
+            if error is not None:
+                yield _failed_file(pdf_path, error)
+                continue
+            try:
+                yield {'path': pdf_path, **_merge_task_pages([process_task(task, page_cache_dir) for task in tasks]),
+                       'error': None}
+            except Exception as e:
+                yield _failed_file(pdf_path, str(e))
+        return
+
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        in_flight = 0
+        for pdf_path, tasks, error in _plan_files(pdf_paths, pages_per_task):
+            futures = [executor.submit(process_task, task, page_cache_dir) for task in tasks]
+            pending.append((pdf_path, futures, error))
+            in_flight += len(futures)
+            while pending and in_flight > max_in_flight:
+                pdf_path, futures, error = pending.popleft()
+                in_flight -= len(futures)
+                yield _collect_file(pdf_path, futures, error)
+        while pending:
+            yield _collect_file(*pending.popleft())
+
+
+def document_source(pdf_path: str) -> str:
+    """Returns the identity of a PDF in the document manifest: its absolute path."""
+    return os.path.abspath(pdf_path)
+
+def plan_document_updates(pdf_paths: list[str], documents: dict) -> list[dict]:
+    """
+    Compares PDF files with the document manifest of an index.
+
+    A file whose size and modification time match its manifest entry is unchanged
+    without being read; otherwise its content hash decides. A file that cannot be
+    read is planned as failed, so it does not stop the other files.
+
+    Args:
+        pdf_paths (list[str]): Paths to PDF files. Repeated files are planned once.
+        documents (dict): Document manifest of the index (SemanticIndexer.documents).
+
+    Returns:
+        list[dict]: One entry per file with 'path', 'source', 'hash', 'size', 'mtime_ns'
+        and 'status', which is 'new', 'changed' or 'unchanged'; or, for a file that
+        could not be read, 'path', 'source', 'error' and the status 'failed'.
+    """
+    plans = {}
+    for pdf_path in pdf_paths:
+        source = document_source(pdf_path)
+        if source in plans:
+            continue
+        document = documents.get(source)
+        try:
+            stat = os.stat(pdf_path)
+            if document is None:
+                status, content_hash = 'new', file_hash(pdf_path)
+            elif document.get('hash') and document.get('size') == stat.st_size and \
+                    document.get('mtime_ns') == stat.st_mtime_ns:
+                status, content_hash = 'unchanged', document['hash']
+            else:
+                content_hash = file_hash(pdf_path)
+                status = 'unchanged' if content_hash == document.get('hash') else 'changed'
+        except OSError as e:
+            plans[source] = {'path': pdf_path, 'source': source, 'error': str(e), 'status': 'failed'}
+            continue
+        plans[source] = {'path': pdf_path, 'source': source, 'hash': content_hash, 'size': stat.st_size,
+                         'mtime_ns': stat.st_mtime_ns, 'status': status}
+    return list(plans.values())
+
+
+class IngestStats:
+    """Counters, timings and throughput for each stage of a streaming ingest."""
+
+    def __init__(self, progress_interval: float = 10.0):
+        self.pages = 0
+        self.chunks = 0
+        self.embedded = 0
+        self.extract_seconds = 0.0
+        self.chunk_seconds = 0.0
+        self.embed_seconds = 0.0
+        self.index_seconds = 0.0
+        self.boilerplate_lines = 0
+        self.duplicate_chunks = 0
+        self.duplicate_chars = 0
+        # Bytes one embedding takes in the index; set once the index dimension is known.
+        self.vector_bytes = 0
+        self.failed = []
+        self.progress_interval = progress_interval
+        self._start = time.perf_counter()
+        self._last_progress = self._start
+
+    def on_batch(self, count: int, encode_seconds: float, add_seconds: float):
+        """Callback for SemanticIndexer.add_stream."""
+        self.embedded += count
+        self.embed_seconds += encode_seconds
+        self.index_seconds += add_seconds
+        now = time.perf_counter()
+        if now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            logger.info(self.format_summary())
+
+    def add_dedup(self, counts: dict):
+        """Adds the counts of a Deduplicator."""
+        self.boilerplate_lines += counts['boilerplate_lines']
+        self.duplicate_chunks += counts['duplicate_chunks']
+        self.duplicate_chars += counts['duplicate_chars']
+
+    def summary(self) -> dict:
+        """
+        Returns stage counts and throughput.
+
+        Returns:
+            dict: Counts, pages/s, chunks/s per stage (None if the stage was not timed),
+            overall wall-clock rate, and the boilerplate lines and duplicate chunks removed
+            with estimates of the embedding time and index bytes this saved.
+        """
+        def rate(count, seconds):
+            return count / seconds if seconds > 0 else None
+        elapsed = time.perf_counter() - self._start
+        return {
+            'pages': self.pages,
+            'chunks': self.chunks,
+            'embedded': self.embedded,
+            'failed_files': len(self.failed),
+            'elapsed_seconds': elapsed,
+            'extract_pages_per_second': rate(self.pages, self.extract_seconds),
+            'chunk_chunks_per_second': rate(self.chunks, self.chunk_seconds),
+            'embed_chunks_per_second': rate(self.embedded, self.embed_seconds),
+            'index_chunks_per_second': rate(self.embedded, self.index_seconds),
+            'overall_chunks_per_second': rate(self.embedded, elapsed),
+            'boilerplate_lines': self.boilerplate_lines,
+            'duplicate_chunks': self.duplicate_chunks,
+            'dedup_saved_embed_seconds': (self.duplicate_chunks * self.embed_seconds / self.embedded
+                                          if self.embedded else 0.0),
+            # Dropped chunks would have stored their text (UTF-8, about a byte per character) and a vector.
+            'dedup_saved_bytes': self.duplicate_chars + self.duplicate_chunks * self.vector_bytes,
+        }
+
+    def format_summary(self) -> str:
+        s = self.summary()
+        def fmt(value):
+            return 'n/a' if value is None else f"{value:.1f}"
+        return (f"Progress: {s['pages']} pages, {s['chunks']} chunks, {s['embedded']} embedded | "
+                f"extract {fmt(s['extract_pages_per_second'])} pages/s, "
+                f"chunk {fmt(s['chunk_chunks_per_second'])} chunks/s, "
+                f"embed {fmt(s['embed_chunks_per_second'])} chunks/s, "
+                f"index {fmt(s['index_chunks_per_second'])} chunks/s, "
+                f"overall {fmt(s['overall_chunks_per_second'])} chunks/s")
+
+    def format_dedup(self) -> str:
+        s = self.summary()
+        produced = s['chunks'] + s['duplicate_chunks']
+        share = 100 * s['duplicate_chunks'] / produced if produced else 0.0
+        return (f"Dedup: removed {s['boilerplate_lines']} header/footer lines and {s['duplicate_chunks']} "
+                f"near-duplicate chunks ({share:.1f}% of chunks), saving about "
+                f"{s['dedup_saved_embed_seconds']:.1f}s of embedding and {s['dedup_saved_bytes'] / 1024:.1f} KiB of index")
+
+
+def _timed_pages(pages: Iterator[dict], stats: IngestStats) -> Iterator[dict]:
+    """Wraps a page generator, charging the time spent producing each page to extraction."""
+    while True:
+        start = time.perf_counter()
+        try:
+            page = next(pages)
+        except StopIteration:
+            stats.extract_seconds += time.perf_counter() - start
+            return
+        stats.extract_seconds += time.perf_counter() - start
+        stats.pages += 1
+        yield page
+
+def _stream_file(pdf_path: str, stats: IngestStats, pages_per_task: int,
+                 page_cache_dir: str | None = None) -> Iterator[tuple[str, dict]]:
+    source = document_source(pdf_path)
+    dedup = Deduplicator()
+    pages = dedup.iter_pages(_timed_pages(iter_pdf_pages(pdf_path, cache_dir=page_cache_dir), stats), pages_per_task)
+    chunks = dedup.filter_chunks(iter_text_chunks(pages))
+    try:
+        while True:
+            start = time.perf_counter()
+            extract_before = stats.extract_seconds
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            # Time spent inside the page generator is extraction, the rest is chunking.
+            stats.chunk_seconds += time.perf_counter() - start - (stats.extract_seconds - extract_before)
+            stats.chunks += 1
+            yield chunk['text'], {'source': source, 'page': chunk['page'], 'page_end': chunk['page_end'],
+                                  'chunk_id': chunk['chunk_id']}
+    finally:
+        stats.add_dedup(dedup.counts())
+
+def stream_chunks(pdf_paths: list[str], stats: IngestStats, workers: int = INGEST_WORKERS,
+                  pages_per_task: int = PAGES_PER_TASK, page_cache_dir: str | None = None) -> Iterator[tuple[str, dict]]:
+    """
+    Streams (text, metadata) pairs from PDF files for SemanticIndexer.add_stream.
+
+    With one worker, pages are extracted and chunked lazily, so only the page being
+    processed is held in memory. With several workers, files are processed by
+    ingest_pdfs and streamed file by file. Files that fail are logged, recorded in
+    stats.failed and skipped; in serial mode chunks already streamed from a file that
+    fails part-way through remain in the index.
+
+    Args:
+        pdf_paths (list[str]): Paths to PDF files.
+        stats (IngestStats): Receives per-stage counts and timings.
+        workers (int): Number of worker processes.
+        pages_per_task (int): Maximum number of pages per worker task.
+        page_cache_dir (str | None): Cache directory of extracted page text; None disables it.
+
+    Yields:
+        tuple[str, dict]: (chunk text, {'source': str, 'page': int, 'page_end': int, 'chunk_id': int})
+
+    Raises:
+        ValueError: If CHUNK_OVERLAP does not fit in the chunk size, before any file is read.
+    """
+    chunk_token_limit(get_tokenizer(EMBEDDING_MODEL), CHUNK_TOKENS, CHUNK_OVERLAP)
+    if workers <= 1:
+        for pdf_path in pdf_paths:
+            logger.info(f"Processing PDF: {pdf_path}")
+            before = stats.chunks
+            try:
+                yield from _stream_file(pdf_path, stats, pages_per_task, page_cache_dir)
+            except Exception as e:
+                logger.error(f"Error processing {pdf_path}: {e}")
+                stats.failed.append((pdf_path, str(e)))
+                continue
+            logger.info(f"Extracted {stats.chunks - before} chunks from {pdf_path}")
+        return
+
+    results = ingest_pdfs(pdf_paths, workers=workers, pages_per_task=pages_per_task, page_cache_dir=page_cache_dir)
+    while True:
+        # Workers extract and chunk together; the wait for each file is charged to extraction.
+        start = time.perf_counter()
+        try:
+            result = next(results)
+        except StopIteration:
+            return
+        stats.extract_seconds += time.perf_counter() - start
+        if result['error'] is not None:
+            logger.error(f"Error processing {result['path']}: {result['error']}")
+            stats.failed.append((result['path'], result['error']))
+            continue
+        stats.pages += result['pages']
+        stats.add_dedup(result['dedup'])
+        stats.chunks += len(result['chunks'])
+        logger.info(f"Extracted {len(result['chunks'])} chunks from {result['path']}")
+        source = document_source(result['path'])
+        for chunk in result['chunks']:
+            yield chunk['text'], {'source': source, 'page': chunk['page'], 'page_end': chunk['page_end'],
+                                  'chunk_id': chunk['chunk_id']}
+
+def update_documents(indexer, pdf_paths: list[str], stats: IngestStats, workers: int = INGEST_WORKERS,
+                     pages_per_task: int = PAGES_PER_TASK, batch_size: int = EMBED_BATCH_SIZE,
+                     page_cache_dir: str | None = None) -> dict:
+    """
+    Brings the indexed copies of PDF files up to date, doing work only for files that changed.
+
+    New files are added, unchanged files are skipped, and changed files are re-ingested
+    with their old chunks removed from the index by id. If a changed file fails to
+    process, its previous chunks are kept; chunks streamed from a failing file are removed.
+
+    Args:
+        indexer (SemanticIndexer): Index to update.
+        pdf_paths (list[str]): Paths to PDF files.
+        stats (IngestStats): Receives per-stage counts and timings.
+        workers (int): Number of worker processes.
+        pages_per_task (int): Maximum number of pages per worker task.
+        batch_size (int): Number of chunks to embed and index per batch.
+        page_cache_dir (str | None): Cache directory of extracted page text; None disables it.
+
+    Returns:
+        dict: Lists of paths under 'new', 'changed', 'unchanged' and 'failed', the number
+        of chunks 'added' and the number of old chunks 'removed'.
+    """
+    plans = plan_document_updates(pdf_paths, indexer.documents)
+    result = {'new': [], 'changed': [], 'unchanged': [], 'failed': [], 'added': 0, 'removed': 0}
+    for plan in plans:
+        if plan['status'] == 'unchanged':
+            # Refresh size and mtime so the next run can skip hashing this file.
+            indexer.documents[plan['source']].update(size=plan['size'], mtime_ns=plan['mtime_ns'])
+            result['unchanged'].append(plan['path'])
+        elif plan['status'] == 'failed':
+            # An unreadable file keeps its indexed version, like a file that fails to process.
+            logger.error(f"Error processing {plan['path']}: {plan['error']}")
+            stats.failed.append((plan['path'], plan['error']))
+            result['failed'].append(plan['path'])
+    pending = [plan for plan in plans if plan['status'] in ('new', 'changed')]
+    # Old versions are set aside while their replacements stream in, so new chunks get
+    # their own manifest entry and a failed replacement can fall back to the old one.
+    previous = {plan['source']: indexer.documents.pop(plan['source']) for plan in pending if plan['status'] == 'changed'}
+    if pending:
+        chunk_stream = stream_chunks([plan['path'] for plan in pending], stats, workers=workers, pages_per_task=pages_per_task,
+                                     page_cache_dir=page_cache_dir)
+        result['added'] = indexer.add_stream(chunk_stream, batch_size=batch_size, on_batch=stats.on_batch)
+        if indexer.index is not None and stats.duplicate_chunks:
+            # Imported here so extraction workers, which import this module, do not load FAISS.
+            from index_factory import bytes_per_vector
+            # Stored bytes per vector at the index's precision, with ids and graph links, plus kept exact vectors.
+            stats.vector_bytes = bytes_per_vector(indexer.index)
+            if indexer.exact_vectors is not None:
+                stats.vector_bytes += indexer.index.d * 4
+
+    failed = {document_source(pdf_path) for pdf_path, _ in stats.failed}
+    for plan in pending:
+        source = plan['source']
+        if source in failed:
+            if source in indexer.documents:
+                result['added'] -= indexer.remove_document(source)
+            if source in previous:
+                indexer.documents[source] = previous[source]
+            result['failed'].append(plan['path'])
+            continue
+        if source in previous:
+            removed = indexer.document_ids(previous[source])
+            indexer.remove_ids(removed)
+            result['removed'] += len(removed)
+        document = indexer.documents.setdefault(source, {'hash': None, 'ids': []})
+        document.update(hash=plan['hash'], size=plan['size'], mtime_ns=plan['mtime_ns'])
+        result[plan['status']].append(plan['path'])
+    return result
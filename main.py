@@ -1,12 +1,14 @@
 import argparse
+import json
 import sys
 import os
 import logging
 import time
-from pdf_processor import extract_text_from_pdf, split_text_into_chunks
-from indexer import SemanticIndexer
-from query import ResearchAssistant
-from config import LOG_LEVEL, DEFAULT_INDEX_PATH
+from config import LOG_LEVEL, DEFAULT_INDEX_PATH, INGEST_WORKERS, PAGES_PER_TASK, EMBED_BATCH_SIZE, EMBEDDING_CACHE_DIR, PAGE_CACHE_DIR, QUERY_CACHE_DIR, INDEX_TYPE, INDEX_TYPES, VECTOR_PRECISION, VECTOR_PRECISIONS, QA_BATCH_SIZE, ANSWER_MODE, ANSWER_MODES, SERVE_HOST, SERVE_PORT, SERVE_MAX_BATCH_SIZE, SERVE_MAX_WAIT_MS, METRICS_ENABLED, TRACE_LOG
+
+# Modules that pull in faiss, torch, transformers or pdfplumber are imported inside the
+# subcommands that use them, so --help and argument or path validation errors return
+# immediately. Models themselves are only loaded on first use (see models.py).
 
 logging.basicConfig(level=getattr(logging, LOG_LEVEL.upper()), format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -19,6 +21,32 @@ def validate_pdf_paths(pdf_paths):
         if not path.lower().endswith('.pdf'):
             raise ValueError(f"File is not a PDF: {path}")
 
+def read_questions_file(path):
+    """
+    Read questions from a JSONL file.
+
+    Each line is either a JSON object with a "question" field (other fields, such as an
+    id, are echoed in the output) or a JSON string. Blank lines are skipped.
+
+    Returns:
+        list[dict]: One record per question, each with a non-empty "question" field.
+    """
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_number}: invalid JSON ({e})")
+            if isinstance(record, str):
+                record = {'question': record}
+            if not isinstance(record, dict) or not isinstance(record.get('question'), str) or not record['question'].strip():
+                raise ValueError(f"Line {line_number}: expected a JSON string or an object with a non-empty \"question\"")
+            records.append(record)
+    return records
+
 def main():
     parser = argparse.ArgumentParser(description="AI Open Source Research Assistant")
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
@@ -26,18 +54,66 @@ def main():
     # Ingest command
     ingest_parser = subparsers.add_parser('ingest', help='Ingest PDF files and build index')
     ingest_parser.add_argument('pdf_paths', nargs='+', help='Paths to PDF files')
-    ingest_parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, help='Path to save the index file')
+    ingest_parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, help='Path of the index directory to create or update')
+    ingest_parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help='Number of worker processes for extraction and chunking')
+    ingest_parser.add_argument('--pages-per-task', type=int, default=PAGES_PER_TASK, help='Maximum pages per worker task for large PDFs')
+    ingest_parser.add_argument('--batch-size', type=int, default=EMBED_BATCH_SIZE, help='Number of chunks to embed and index per batch')
+    ingest_parser.add_argument('--embedding-cache', default=EMBEDDING_CACHE_DIR, help='Directory of the embedding cache (empty string disables it)')
+    ingest_parser.add_argument('--page-cache', default=PAGE_CACHE_DIR, help='Directory of the extracted page text cache (empty string disables it)')
+    ingest_parser.add_argument('--index-type', choices=INDEX_TYPES, help=f'FAISS index type (default for new indexes: {INDEX_TYPE}); IVF types start flat and are trained once enough vectors exist')
+    ingest_parser.add_argument('--precision', choices=VECTOR_PRECISIONS, help=f'Storage precision of the indexed vectors (default for new indexes: {VECTOR_PRECISION}); int8 and pq start as fp32 and are trained once enough vectors exist')
+    ingest_parser.add_argument('--shards', type=int, help='Create a sharded index with this many shards (existing sharded indexes keep their shard count)')
+    ingest_parser.add_argument('--shard-workers', type=int, default=1, help='Number of shards built in parallel worker processes')
 
     # Query command
     query_parser = subparsers.add_parser('query', help='Query the assistant')
-    query_parser.add_argument('question', help='Question to ask')
-    query_parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, help='Path to the index file')
+    query_parser.add_argument('question', nargs='?', help='Question to ask')
+    query_parser.add_argument('--questions-file', help='JSONL file of questions to answer in batches; answers are streamed to stdout as JSONL')
+    query_parser.add_argument('--batch-size', type=int, default=QA_BATCH_SIZE, help='Number of questions answered together with --questions-file')
+    query_parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, help='Path to the index directory')
     query_parser.add_argument('--top-k', type=int, default=5, help='Number of top results to retrieve')
+    query_parser.add_argument('--nprobe', type=int, help='IVF lists to visit per query (IVF index types only)')
+    query_parser.add_argument('--ef-search', type=int, help='HNSW candidate list size per query (HNSW only)')
+    query_parser.add_argument('--source', action='append', help='Only retrieve chunks of this PDF (repeatable)')
+    query_parser.add_argument('--pages', help="Only retrieve chunks on these pages: 'N' or 'FIRST-LAST'")
+    query_parser.add_argument('--mode', choices=ANSWER_MODES, default=ANSWER_MODE, help='Answer mode: full summarizer, distilled summarizer or extractive sentences (fastest)')
+    query_parser.add_argument('--query-cache', default=QUERY_CACHE_DIR, help='Directory of the on-disk query embedding and answer caches (empty string keeps them in memory only)')
+    query_parser.add_argument('--trace-log', default=TRACE_LOG, help='Append a JSON line with per-stage timings for each answer to this file')
+    query_parser.add_argument('--metrics-file', help='Write stage timings and counters in Prometheus text format to this file')
 
     # Benchmark command
     benchmark_parser = subparsers.add_parser('benchmark', help='Run performance benchmarks')
-    benchmark_parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, help='Path to the index file')
+    benchmark_parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, help='Path to the index directory')
     benchmark_parser.add_argument('--num-queries', type=int, default=10, help='Number of queries to run for benchmarking')
+    benchmark_parser.add_argument('--mode', choices=ANSWER_MODES, default=ANSWER_MODE, help='Answer mode to benchmark')
+
+    # Serve command
+    serve_parser = subparsers.add_parser('serve', help='Run a local query server that keeps models loaded')
+    serve_parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, help='Path to the index directory')
+    serve_parser.add_argument('--host', default=SERVE_HOST, help='Host to bind')
+    serve_parser.add_argument('--port', type=int, default=SERVE_PORT, help='Port to bind')
+    serve_parser.add_argument('--socket', help='Unix socket path to bind instead of host/port')
+    serve_parser.add_argument('--max-batch-size', type=int, default=SERVE_MAX_BATCH_SIZE, help='Maximum number of requests merged into one batch')
+    serve_parser.add_argument('--max-wait-ms', type=float, default=SERVE_MAX_WAIT_MS, help='Maximum time a request waits for its batch to fill')
+    serve_parser.add_argument('--mode', choices=ANSWER_MODES, default=ANSWER_MODE, help='Default answer mode; requests may override it with "mode"')
+    serve_parser.add_argument('--query-cache', default=QUERY_CACHE_DIR, help='Directory of the on-disk query embedding and answer caches (empty string keeps them in memory only)')
+    serve_parser.add_argument('--trace-log', default=TRACE_LOG, help='Append a JSON line with per-stage timings for each batch to this file')
+
+    # ANN report command
+    ann_parser = subparsers.add_parser('ann-report', help='Compare recall@k and latency of index types against exact search')
+    ann_parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, help='Path to the index directory')
+    ann_parser.add_argument('--num-queries', type=int, default=200, help='Number of stored vectors to use as queries')
+    ann_parser.add_argument('--top-k', type=int, default=10, help='k for recall@k')
+
+    # Remove command
+    remove_parser = subparsers.add_parser('remove', help='Remove documents from the index')
+    remove_parser.add_argument('pdf_paths', nargs='+', help='Paths of the PDF files to remove, as they were ingested')
+    remove_parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, help='Path to the index directory')
+
+    # Migrate command
+    migrate_parser = subparsers.add_parser('migrate', help='Convert a legacy pickle index to the directory format')
+    migrate_parser.add_argument('pickle_path', help='Path to the legacy index.pkl file')
+    migrate_parser.add_argument('--index-path', default=DEFAULT_INDEX_PATH, help='Path of the index directory to write')
 
     args = parser.parse_args()
 
@@ -50,66 +126,182 @@ def main():
             print(f"Error: {e}")
             sys.exit(1)
 
-        # Collect all texts and metadatas
-        all_texts = []
-        all_metadatas = []
-        for pdf_path in args.pdf_paths:
+        if args.workers <= 0 or args.pages_per_task <= 0 or args.batch_size <= 0:
+            logger.error(f"Invalid ingest settings: workers={args.workers}, pages_per_task={args.pages_per_task}, batch_size={args.batch_size}")
+            print("Error: --workers, --pages-per-task and --batch-size must be positive integers.")
+            sys.exit(1)
+
+        if (args.shards is not None and args.shards <= 0) or args.shard_workers <= 0:
+            print("Error: --shards and --shard-workers must be positive integers.")
+            sys.exit(1)
+
+        from sharding import is_sharded
+        if args.shards is not None or is_sharded(args.index_path):
+            from sharding import update_sharded_index
             try:
-                logger.info(f"Processing PDF: {pdf_path}")
-                pages_text = extract_text_from_pdf(pdf_path)
-                chunks = split_text_into_chunks(pages_text)
-                for chunk in chunks:
-                    all_texts.append(chunk['text'])
-                    all_metadatas.append({'page': chunk['page'], 'chunk_id': chunk['chunk_id']})
-                logger.info(f"Extracted {len(chunks)} chunks from {pdf_path}")
+                results = update_sharded_index(args.index_path, args.pdf_paths, num_shards=args.shards,
+                                               index_type=args.index_type, precision=args.precision,
+                                               shard_workers=args.shard_workers,
+                                               workers=args.workers, pages_per_task=args.pages_per_task,
+                                               batch_size=args.batch_size, cache_dir=args.embedding_cache or None,
+                                               page_cache_dir=args.page_cache or None)
             except Exception as e:
-                logger.error(f"Error processing {pdf_path}: {e}")
-                print(f"Error processing {pdf_path}: {e}")
+                logger.error(f"Error processing sharded index: {e}")
+                print(f"Error processing index: {e}")
+                sys.exit(1)
+            for result in results:
+                for pdf_path, error in result['errors']:
+                    print(f"Error processing {pdf_path}: {error}")
+                logger.info(f"{result['shard']}: {len(result['new'])} new, {len(result['changed'])} changed, "
+                            f"{len(result['unchanged'])} unchanged, {len(result['failed'])} failed, "
+                            f"{result['added']} chunks added, {result['removed']} removed, "
+                            f"{result['summary']['duplicate_chunks']} near-duplicate chunks and "
+                            f"{result['summary']['boilerplate_lines']} header/footer lines dropped")
+            if not any(result['new'] or result['changed'] or result['unchanged'] for result in results):
+                print("No text extracted from PDFs. Please check the files.")
                 sys.exit(1)
+            print(f"Index saved to {args.index_path}")
+            return
 
-        if not all_texts:
-            logger.error("No text extracted from PDFs")
-            print("No text extracted from PDFs. Please check the files.")
-            sys.exit(1)
+        from ingest import IngestStats, update_documents
+        from indexer import SemanticIndexer
+        from index_store import check_index_path
+        from embedding_cache import EmbeddingCache
 
-        # Build or update index
+        # Load the existing index or start a new one, then stream chunks into it
         try:
             try:
-                indexer = SemanticIndexer.load(args.index_path)
+                indexer = SemanticIndexer.load(args.index_path, mmap=False)
                 logger.info(f"Loaded existing index from {args.index_path}")
-                indexer.add_texts(all_texts, all_metadatas)
-                logger.info(f"Added {len(all_texts)} new text chunks to index")
             except FileNotFoundError:
-                indexer = SemanticIndexer()
-                indexer.build_index(all_texts, all_metadatas)
-                logger.info(f"Built new index with {len(all_texts)} text chunks")
+                # A path that exists but holds no index is reported instead of being overwritten.
+                check_index_path(args.index_path)
+                indexer = SemanticIndexer(index_type=args.index_type or INDEX_TYPE,
+                                          precision=args.precision or VECTOR_PRECISION)
+                logger.info(f"Building new '{indexer.index_type}' index with {indexer.precision} vectors")
+            if (args.index_type and args.index_type != indexer.index_type) or \
+                    (args.precision and args.precision != indexer.precision):
+                indexer.change_index_type(args.index_type or indexer.index_type, args.precision)
+            if args.embedding_cache:
+                indexer.cache = EmbeddingCache(args.embedding_cache, indexer.model_name)
+                logger.info(f"Using embedding cache at {args.embedding_cache} ({len(indexer.cache)} entries)")
+
+            stats = IngestStats()
+            logger.info(f"Processing PDFs with {args.workers} worker(s), embedding in batches of {args.batch_size}")
+            try:
+                update = update_documents(indexer, args.pdf_paths, stats, workers=args.workers,
+                                          pages_per_task=args.pages_per_task, batch_size=args.batch_size,
+                                          page_cache_dir=args.page_cache or None)
+            finally:
+                indexer.close()
+        except Exception as e:
+            logger.error(f"Error processing index: {e}")
+            print(f"Error processing index: {e}")
+            sys.exit(1)
+
+        for pdf_path, error in stats.failed:
+            print(f"Error processing {pdf_path}: {error}")
+        if stats.failed:
+            logger.warning(f"Skipped {len(stats.failed)} of {len(args.pdf_paths)} PDF files due to errors")
+        logger.info(f"Documents: {len(update['new'])} new, {len(update['changed'])} changed, "
+                    f"{len(update['unchanged'])} unchanged, {len(update['failed'])} failed")
+
+        if not update['new'] and not update['changed']:
+            if update['unchanged'] and not update['failed']:
+                print(f"Index {args.index_path} is up to date; {len(update['unchanged'])} unchanged files skipped.")
+                return
+            logger.error("No text extracted from PDFs")
+            print("No text extracted from PDFs. Please check the files.")
+            sys.exit(1)
+
+        logger.info(f"Added {update['added']} text chunks to index, removed {update['removed']} replaced chunks")
+        logger.info(stats.format_summary())
+        logger.info(stats.format_dedup())
+        if indexer.cache is not None:
+            logger.info(f"Embedding cache: {indexer.cache.hits} hits, {indexer.cache.misses} misses")
+            try:
+                indexer.cache.save()
+            except OSError as e:
+                logger.warning(f"Could not save embedding cache: {e}")
+
+        try:
             indexer.save(args.index_path)
             logger.info(f"Index saved to {args.index_path}")
             print(f"Index saved to {args.index_path}")
         except Exception as e:
-            logger.error(f"Error processing index: {e}")
-            print(f"Error processing index: {e}")
+            logger.error(f"Error saving index: {e}")
+            print(f"Error saving index: {e}")
             sys.exit(1)
 
     elif args.command == 'query':
-        logger.info(f"Processing query: '{args.question}' with top_k={args.top_k}")
-        if not args.question.strip():
-            logger.error("Question is empty")
-            print("Error: Question cannot be empty.")
+        if (args.question is None) == (args.questions_file is None):
+            logger.error("Expected exactly one of a question or --questions-file")
+            print("Error: Provide either a question or --questions-file.")
             sys.exit(1)
 
+        if args.questions_file is not None:
+            logger.info(f"Processing questions from {args.questions_file} with top_k={args.top_k}")
+            if args.batch_size <= 0:
+                logger.error(f"Invalid batch size: {args.batch_size}")
+                print("Error: --batch-size must be a positive integer.")
+                sys.exit(1)
+            try:
+                records = read_questions_file(args.questions_file)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading questions file: {e}")
+                print(f"Error reading questions file: {e}")
+                sys.exit(1)
+        else:
+            logger.info(f"Processing query: '{args.question}' with top_k={args.top_k}")
+            if not args.question.strip():
+                logger.error("Question is empty")
+                print("Error: Question cannot be empty.")
+                sys.exit(1)
+
         if args.top_k <= 0:
             logger.error(f"Invalid top_k value: {args.top_k}")
             print("Error: top-k must be a positive integer.")
             sys.exit(1)
 
+        search_kwargs = {}
+        for name in ('nprobe', 'ef_search'):
+            value = getattr(args, name)
+            if value is not None:
+                if value <= 0:
+                    print(f"Error: --{name.replace('_', '-')} must be a positive integer.")
+                    sys.exit(1)
+                search_kwargs[name] = value
+        filter = {}
+        if args.source:
+            filter['source'] = args.source
+        if args.pages:
+            try:
+                first, _, last = args.pages.partition('-')
+                filter['pages'] = [int(first), int(last or first)]
+            except ValueError:
+                print("Error: --pages must be a page number or a FIRST-LAST range.")
+                sys.exit(1)
+            if filter['pages'][0] > filter['pages'][1]:
+                print("Error: --pages range must not end before it starts.")
+                sys.exit(1)
+        if filter:
+            search_kwargs['filter'] = filter
+
+        from sharding import open_index
+        from query import ResearchAssistant
+        from query_cache import open_query_caches
+        from metrics import instrumentation
+
+        if METRICS_ENABLED or args.trace_log or args.metrics_file:
+            instrumentation.enable(trace_path=args.trace_log or None)
+
         # Load index
         try:
             logger.info(f"Loading index from {args.index_path}")
-            indexer = SemanticIndexer.load(args.index_path)
+            indexer = open_index(args.index_path)
         except FileNotFoundError:
-            logger.error(f"Index file not found: {args.index_path}")
-            print(f"Index file {args.index_path} not found. Please run 'ingest' first.")
+            logger.error(f"Index not found: {args.index_path}")
+            print(f"Index {args.index_path} not found. Please run 'ingest' first.")
             sys.exit(1)
         except Exception as e:
             logger.error(f"Error loading index: {e}")
@@ -119,9 +311,18 @@ def main():
         # Query
         try:
             logger.info("Performing semantic search and generating answer")
-            assistant = ResearchAssistant(indexer)
-            result = assistant.answer_question(args.question, top_k=args.top_k)
-            logger.info("Query completed successfully")
+            assistant = ResearchAssistant(indexer, mode=args.mode)
+            if args.query_cache:
+                open_query_caches(assistant, args.query_cache)
+            if args.questions_file is not None:
+                questions = (record['question'] for record in records)
+                answers = assistant.iter_answers(questions, top_k=args.top_k, batch_size=args.batch_size, **search_kwargs)
+                for record, result in zip(records, answers):
+                    print(json.dumps({**record, **result}), flush=True)
+                logger.info(f"Answered {len(records)} questions; query caches: {assistant.cache_stats()}")
+                return
+            result = assistant.answer_question(args.question, top_k=args.top_k, **search_kwargs)
+            logger.info(f"Query completed successfully; query caches: {assistant.cache_stats()}")
 
             print("Answer:", result['answer'])
             print("\nEvidence:")
@@ -131,23 +332,32 @@ def main():
             logger.error(f"Error during query: {e}")
             print(f"Error during query: {e}")
             sys.exit(1)
+        finally:
+            if args.metrics_file:
+                from metrics import metrics
+                with open(args.metrics_file, 'w', encoding='utf-8') as f:
+                    f.write(metrics.render_prometheus())
+            instrumentation.disable()
 
     elif args.command == 'benchmark':
         logger.info(f"Starting benchmark with {args.num_queries} queries on index {args.index_path}")
+        from benchmark import latency_stats
+        from sharding import open_index
+        from query import ResearchAssistant
 
         # Load index and measure time
-        start_time = time.time()
+        start_time = time.perf_counter()
         try:
-            indexer = SemanticIndexer.load(args.index_path)
+            indexer = open_index(args.index_path)
         except FileNotFoundError:
-            logger.error(f"Index file not found: {args.index_path}")
-            print(f"Index file {args.index_path} not found. Please run 'ingest' first.")
+            logger.error(f"Index not found: {args.index_path}")
+            print(f"Index {args.index_path} not found. Please run 'ingest' first.")
             sys.exit(1)
         except Exception as e:
             logger.error(f"Error loading index: {e}")
             print(f"Error loading index: {e}")
             sys.exit(1)
-        load_time = time.time() - start_time
+        load_time = time.perf_counter() - start_time
         logger.info(f"Index loaded in {load_time:.2f} seconds")
 
         # Sample queries
@@ -166,13 +376,13 @@ def main():
 
         # Run queries
         query_times = []
-        assistant = ResearchAssistant(indexer)
+        assistant = ResearchAssistant(indexer, mode=args.mode)
         for i in range(min(args.num_queries, len(sample_questions))):
             question = sample_questions[i]
-            start_time = time.time()
+            start_time = time.perf_counter()
             try:
                 result = assistant.answer_question(question, top_k=5)
-                query_time = time.time() - start_time
+                query_time = time.perf_counter() - start_time
                 query_times.append(query_time)
                 logger.info(f"Query {i+1}: {query_time:.2f} seconds")
             except Exception as e:
@@ -190,10 +400,134 @@ def main():
             print(f"Average query time: {avg_query_time:.2f} seconds")
             print(f"Min query time: {min_query_time:.2f} seconds")
             print(f"Max query time: {max_query_time:.2f} seconds")
+            stats = latency_stats(valid_times, unit='queries')
+            print(f"Query latency p50/p95/p99: {stats['p50_ms']:.1f} / {stats['p95_ms']:.1f} / {stats['p99_ms']:.1f} ms")
             print(f"Successful queries: {len(valid_times)}/{args.num_queries}")
         else:
             print("No successful queries during benchmark.")
 
+    elif args.command == 'serve':
+        if args.max_batch_size <= 0 or args.max_wait_ms < 0:
+            print("Error: --max-batch-size must be positive and --max-wait-ms non-negative.")
+            sys.exit(1)
+        import asyncio
+        from sharding import open_index
+        from query import ResearchAssistant
+        from server import QueryServer
+        from query_cache import open_query_caches
+        from metrics import instrumentation
+        if METRICS_ENABLED or args.trace_log:
+            instrumentation.enable(trace_path=args.trace_log or None)
+        try:
+            logger.info(f"Loading index from {args.index_path}")
+            indexer = open_index(args.index_path)
+        except FileNotFoundError:
+            logger.error(f"Index not found: {args.index_path}")
+            print(f"Index {args.index_path} not found. Please run 'ingest' first.")
+            sys.exit(1)
+        except Exception as e:
+            logger.error(f"Error loading index: {e}")
+            print(f"Error loading index: {e}")
+            sys.exit(1)
+
+        assistant = ResearchAssistant(indexer, mode=args.mode)
+        if args.query_cache:
+            open_query_caches(assistant, args.query_cache)
+            logger.info(f"Caching queries and answers in {args.query_cache}")
+        server = QueryServer(assistant, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+        try:
+            asyncio.run(server.serve(host=args.host, port=args.port, socket_path=args.socket))
+        except KeyboardInterrupt:
+            logger.info("Server stopped")
+        except OSError as e:
+            logger.error(f"Could not start server: {e}")
+            print(f"Could not start server: {e}")
+            sys.exit(1)
+
+    elif args.command == 'ann-report':
+        if args.num_queries <= 0 or args.top_k <= 0:
+            print("Error: --num-queries and --top-k must be positive integers.")
+            sys.exit(1)
+        import numpy as np
+        from indexer import SemanticIndexer
+        from index_factory import recall_latency_report, stored_vectors
+        from sharding import is_sharded
+        if is_sharded(args.index_path):
+            print(f"Error: ann-report works on a single index; pass one shard, e.g. {os.path.join(args.index_path, 'shard-000')}")
+            sys.exit(1)
+        try:
+            indexer = SemanticIndexer.load(args.index_path, mmap=False)
+        except FileNotFoundError:
+            logger.error(f"Index not found: {args.index_path}")
+            print(f"Index {args.index_path} not found. Please run 'ingest' first.")
+            sys.exit(1)
+        except Exception as e:
+            logger.error(f"Error loading index: {e}")
+            print(f"Error loading index: {e}")
+            sys.exit(1)
+
+        # Stored vectors are the corpus; a random sample of them serves as queries.
+        _, vectors = stored_vectors(indexer.index)
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(len(vectors), size=min(args.num_queries, len(vectors)), replace=False)]
+        logger.info(f"Running recall/latency report over {len(vectors)} vectors with {len(queries)} queries")
+        rows = recall_latency_report(vectors, queries, top_k=min(args.top_k, len(vectors)))
+
+        print(f"{'index':<8} {'factory':<16} {'params':<14} {'recall@k':>9} {'mean ms':>9} {'p95 ms':>9} {'build s':>9}")
+        for row in rows:
+            print(f"{row['index_type']:<8} {row['factory']:<16} {row['params']:<14} {row['recall_at_k']:>9.3f} "
+                  f"{row['mean_latency_ms']:>9.3f} {row['p95_latency_ms']:>9.3f} {row['build_seconds']:>9.2f}")
+
+    elif args.command == 'remove':
+        from ingest import document_source
+        from sharding import open_index
+        try:
+            indexer = open_index(args.index_path, mmap=False)
+        except FileNotFoundError:
+            logger.error(f"Index not found: {args.index_path}")
+            print(f"Index {args.index_path} not found. Please run 'ingest' first.")
+            sys.exit(1)
+        except Exception as e:
+            logger.error(f"Error loading index: {e}")
+            print(f"Error loading index: {e}")
+            sys.exit(1)
+
+        missing = [path for path in args.pdf_paths if not indexer.has_document(document_source(path))]
+        if missing:
+            print(f"Error: not in index: {', '.join(missing)}")
+            sys.exit(1)
+        removed = 0
+        for pdf_path in args.pdf_paths:
+            if indexer.has_document(document_source(pdf_path)):
+                removed += indexer.remove_document(document_source(pdf_path))
+        try:
+            indexer.save(args.index_path)
+        except Exception as e:
+            logger.error(f"Error saving index: {e}")
+            print(f"Error saving index: {e}")
+            sys.exit(1)
+        logger.info(f"Removed {removed} text chunks from {len(args.pdf_paths)} documents")
+        print(f"Removed {removed} text chunks from {args.index_path}")
+
+    elif args.command == 'migrate':
+        logger.info(f"Migrating legacy index {args.pickle_path} to {args.index_path}")
+        if os.path.abspath(args.pickle_path) == os.path.abspath(args.index_path):
+            print("Error: --index-path must differ from the legacy pickle path.")
+            sys.exit(1)
+        from index_store import migrate_pickle_index
+        try:
+            count = migrate_pickle_index(args.pickle_path, args.index_path)
+        except FileNotFoundError:
+            logger.error(f"Legacy index file not found: {args.pickle_path}")
+            print(f"Index file {args.pickle_path} not found.")
+            sys.exit(1)
+        except Exception as e:
+            logger.error(f"Error migrating index: {e}")
+            print(f"Error migrating index: {e}")
+            sys.exit(1)
+        logger.info(f"Migrated {count} text chunks")
+        print(f"Migrated {count} text chunks to {args.index_path}")
+
     else:
         parser.print_help()
 
@@ -0,0 +1,285 @@
+import contextvars
+import json
+import math
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+# Seconds; spans sub-millisecond FAISS searches up to multi-second summarizer calls.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonically increasing value, optionally split by labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Gauge(Counter):
+    """Value that can go up and down, optionally split by labels."""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, optionally split by labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(name, '') for name in self.labelnames))
+        return series[2] if series else 0
+
+    def sum(self, **labels) -> float:
+        series = self._series.get(tuple(labels.get(name, '') for name in self.labelnames))
+        return series[1] if series else 0.0
+
+    def render(self) -> list[str]:
+        lines = []
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics that can be rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: tuple = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def render_prometheus(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_current_trace = contextvars.ContextVar('research_assistant_trace', default=None)
+
+class _StageTimer:
+    __slots__ = ('instrumentation', 'stage', 'start')
+
+    def __init__(self, instrumentation, stage: str):
+        self.instrumentation = instrumentation
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        self.instrumentation.stage_seconds.observe(seconds, stage=self.stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace['stages_ms'][self.stage] = trace['stages_ms'].get(self.stage, 0.0) + seconds * 1000
+        return False
+
+class _Trace:
+    __slots__ = ('instrumentation', 'record', 'token', 'start')
+
+    def __init__(self, instrumentation, kind: str):
+        self.instrumentation = instrumentation
+        self.record = {'trace_id': uuid.uuid4().hex, 'kind': kind, 'stages_ms': {}, 'counts': {}}
+
+    def __enter__(self):
+        self.record['timestamp'] = time.time()
+        self.start = time.perf_counter()
+        self.token = _current_trace.set(self.record)
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self.token)
+        self.record['duration_ms'] = (time.perf_counter() - self.start) * 1000
+        if exc_type is not None:
+            self.record['error'] = str(exc)
+        self.instrumentation._write_trace(self.record)
+        return False
+
+_NOOP = nullcontext()
+
+
+class Instrumentation:
+    """
+    Stage timers, counters and an optional per-request trace log for the query path.
+
+    Hooks are no-ops until enable() is called: stage() and trace() then return a shared
+    null context manager and count() returns immediately, so disabled instrumentation
+    costs one attribute check per hook.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.enabled = False
+        self.registry = registry
+        self.stage_seconds = registry.histogram('research_assistant_stage_seconds',
+                                                'Time spent in each query-path stage', ('stage',))
+        self.items = registry.counter('research_assistant_items_total',
+                                      'Queries, chunks and tokens processed', ('kind',))
+        self.cache_requests = registry.counter('research_assistant_cache_requests_total',
+                                               'Cache lookups by cache and result', ('cache', 'result'))
+        self._trace_file = None
+        self._trace_lock = threading.Lock()
+
+    def enable(self, trace_path: str | None = None):
+        """
+        Starts recording metrics.
+
+        Args:
+            trace_path (str | None): File to append one JSON line per traced request to.
+        """
+        self.enabled = True
+        if trace_path:
+            with self._trace_lock:
+                if self._trace_file is not None:
+                    self._trace_file.close()
+                self._trace_file = open(trace_path, 'a', encoding='utf-8')
+
+    def disable(self):
+        """Stops recording metrics and closes the trace log."""
+        self.enabled = False
+        with self._trace_lock:
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+    def stage(self, name: str):
+        """Context manager timing one stage, e.g. 'encode', 'search', 'lookup' or 'summarize'."""
+        if not self.enabled:
+            return _NOOP
+        return _StageTimer(self, name)
+
+    def trace(self, kind: str):
+        """Context manager collecting the stages of one request into a trace log record."""
+        if not self.enabled or self._trace_file is None or _current_trace.get() is not None:
+            return _NOOP
+        return _Trace(self, kind)
+
+    def count(self, kind: str, amount: float = 1):
+        """Adds to the processed-items counter, e.g. kind='chunks_retrieved'."""
+        if not self.enabled:
+            return
+        self.items.inc(amount, kind=kind)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace['counts'][kind] = trace['counts'].get(kind, 0) + amount
+
+    def cache_lookup(self, cache: str, hits: int, misses: int):
+        """Records the hits and misses of a batch of cache lookups."""
+        if not self.enabled:
+            return
+        if hits:
+            self.cache_requests.inc(hits, cache=cache, result='hit')
+        if misses:
+            self.cache_requests.inc(misses, cache=cache, result='miss')
+
+    def cache_hit_rate(self, cache: str) -> float | None:
+        """Returns the fraction of lookups of a cache that were hits, or None if there were none."""
+        hits = self.cache_requests.value(cache=cache, result='hit')
+        total = hits + self.cache_requests.value(cache=cache, result='miss')
+        return hits / total if total else None
+
+    def _write_trace(self, record: dict):
+        line = json.dumps(record)
+        with self._trace_lock:
+            if self._trace_file is not None:
+                self._trace_file.write(line + "\n")
+                self._trace_file.flush()
+
+
+metrics = MetricsRegistry()
+instrumentation = Instrumentation(metrics)
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Dynamically quantized ONNX export published with the sentence-transformers models.
+ONNX_INT8_FILE = 'onnx/model_qint8_avx512_vnni.onnx'
+
+# sentence_transformers and transformers pull in torch, which takes seconds to import.
+# They are imported by the loaders so nothing pays for them until a model is needed.
+
+def _load_sentence_embedding(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def _load_sentence_embedding_onnx(model_name: str):
+    # Needs optimum[onnxruntime]; the model is exported to ONNX on first use if the repo has no ONNX file.
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, backend='onnx')
+
+def _load_sentence_embedding_onnx_int8(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name, backend='onnx', model_kwargs={'file_name': ONNX_INT8_FILE})
+
+def _load_summarization(model_name: str):
+    from transformers import pipeline
+    return pipeline("summarization", model=model_name)
+
+def _load_tokenizer(model_name: str):
+    # Loads only the fast tokenizer of a sentence-transformers model, without torch weights,
+    # and sets model_max_length to the sequence limit the embedding model actually encodes.
+    from transformers import AutoTokenizer
+    repo = model_name if '/' in model_name or os.path.isdir(model_name) else f"sentence-transformers/{model_name}"
+    tokenizer = AutoTokenizer.from_pretrained(repo, use_fast=True)
+    try:
+        if os.path.isdir(repo):
+            config_path = os.path.join(repo, 'sentence_bert_config.json')
+        else:
+            from huggingface_hub import hf_hub_download
+            config_path = hf_hub_download(repo, 'sentence_bert_config.json')
+        with open(config_path) as f:
+            tokenizer.model_max_length = json.load(f)['max_seq_length']
+    except Exception as e:
+        logger.warning(f"No sentence-transformers sequence limit for {model_name}, using the tokenizer's: {e}")
+    return tokenizer
+
+LOADERS = {
+    'sentence-embedding': _load_sentence_embedding,
+    'sentence-embedding-onnx': _load_sentence_embedding_onnx,
+    'sentence-embedding-onnx-int8': _load_sentence_embedding_onnx_int8,
+    'summarization': _load_summarization,
+    'tokenizer': _load_tokenizer,
+}
+
+
+class ModelRegistry:
+    """
+    Process-wide, thread-safe cache of loaded models keyed by (task, model name).
+
+    Models are loaded lazily on first use and shared by every caller afterwards.
+    Each key has its own lock, so concurrent requests for the same model load it
+    once while different models can load in parallel.
+    """
+
+    def __init__(self, loaders: dict[str, Callable] = LOADERS):
+        self._loaders = dict(loaders)
+        self._models = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, task: str, model_name: str):
+        """
+        Returns the model for a task, loading it on first use.
+
+        Args:
+            task (str): Model task, e.g. 'sentence-embedding' or 'summarization'.
+            model_name (str): Model name or path.
+
+        Returns:
+            The loaded model.
+        """
+        key = (task, model_name)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        if task not in self._loaders:
+            raise ValueError(f"Unknown model task: {task}. Expected one of: {', '.join(self._loaders)}")
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            model = self._models.get(key)
+            if model is None:
+                logger.info(f"Loading {task} model {model_name}")
+                model = self._loaders[task](model_name)
+                self._models[key] = model
+        return model
+
+    def register(self, task: str, model_name: str, model):
+        """Registers an already constructed model, e.g. a stub for tests or benchmarks."""
+        with self._lock:
+            self._models[(task, model_name)] = model
+
+    def evict(self, task: str | None = None, model_name: str | None = None) -> int:
+        """
+        Drops loaded models so their memory can be reclaimed.
+
+        Args:
+            task (str | None): Only evict models for this task.
+            model_name (str | None): Only evict models with this name.
+
+        Returns:
+            int: Number of models evicted.
+        """
+        with self._lock:
+            keys = [key for key in self._models
+                    if (task is None or key[0] == task) and (model_name is None or key[1] == model_name)]
+            for key in keys:
+                del self._models[key]
+        for key in keys:
+            logger.info(f"Evicted {key[0]} model {key[1]}")
+        return len(keys)
+
+    def loaded(self) -> list[tuple[str, str]]:
+        """Returns the (task, model name) keys of the currently loaded models."""
+        return list(self._models)
+
+
+registry = ModelRegistry()
+
+def get_embedder(model_name: str, backend: str = 'torch'):
+    """Returns the shared SentenceTransformer for model_name running on backend ('torch', 'onnx' or 'onnx-int8')."""
+    return registry.get('sentence-embedding' if backend == 'torch' else f'sentence-embedding-{backend}', model_name)
+
+def get_summarizer(model_name: str):
+    """Returns the shared summarization pipeline for model_name."""
+    return registry.get('summarization', model_name)
+
+def get_tokenizer(model_name: str):
+    """Returns the shared fast tokenizer of the embedding model model_name."""
+    return registry.get('tokenizer', model_name)
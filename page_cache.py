@@ -0,0 +1,95 @@
+import functools
+import gzip
+import hashlib
+import json
+import os
+import uuid
+
+
+def file_hash(pdf_path: str) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+@functools.lru_cache(maxsize=256)
+def _stat_file_hash(path: str, size: int, mtime_ns: int) -> str:
+    return file_hash(path)
+
+def cached_file_hash(pdf_path: str) -> str:
+    """
+    Returns file_hash(pdf_path), hashing each version of a file at most once per process.
+
+    The page-range tasks of one large file all look up the same cache entry; the hash
+    is remembered by path, size and modification time.
+    """
+    stat = os.stat(pdf_path)
+    return _stat_file_hash(os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+
+
+class PageCache:
+    """
+    On-disk cache of extracted page text keyed by (PDF content hash, extraction backend).
+
+    Each extraction run that produced new pages adds one gzip-compressed JSON file to the
+    document's directory, so concurrent workers extracting different page ranges of the
+    same file never write to the same file. A lookup merges all files of the document.
+    Renamed or copied files hit the same entries; any change to a file's bytes misses.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _directory(self, content_hash: str, backend: str) -> str:
+        return os.path.join(self.cache_dir, backend, content_hash)
+
+    def get(self, content_hash: str, backend: str) -> tuple[int | None, dict[int, str]]:
+        """
+        Looks up the cached pages of a document.
+
+        Args:
+            content_hash (str): file_hash of the PDF.
+            backend (str): Extraction backend that produced the text.
+
+        Returns:
+            tuple[int | None, dict[int, str]]: The document's page count (None if nothing is
+            cached) and the text of every cached page by 1-based page number.
+        """
+        directory = self._directory(content_hash, backend)
+        if not os.path.isdir(directory):
+            return None, {}
+        num_pages, pages = None, {}
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json.gz'):
+                continue
+            try:
+                with gzip.open(os.path.join(directory, name), 'rt', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                # A damaged entry is a miss; its pages are extracted and cached again.
+                continue
+            num_pages = entry['num_pages']
+            pages.update((int(page), text) for page, text in entry['pages'].items())
+        return num_pages, pages
+
+    def put(self, content_hash: str, backend: str, num_pages: int, pages: dict[int, str]):
+        """
+        Adds extracted pages of a document to the cache.
+
+        Args:
+            content_hash (str): file_hash of the PDF.
+            backend (str): Extraction backend that produced the text.
+            num_pages (int): Number of pages in the document.
+            pages (dict[int, str]): Text by 1-based page number; '' for pages without text.
+        """
+        if not pages:
+            return
+        directory = self._directory(content_hash, backend)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{min(pages)}-{max(pages)}-{uuid.uuid4().hex}.json.gz"
+        tmp_path = os.path.join(directory, name + '.tmp')
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'num_pages': num_pages, 'pages': {str(page): text for page, text in pages.items()}}, f)
+        os.replace(tmp_path, os.path.join(directory, name))
@@ -1,53 +1,234 @@
+import contextlib
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
 import pdfplumber
-from config import CHUNK_SIZE
-def extract_text_from_pdf(pdf_path: str) -> list[dict]:
+import pypdfium2 as pdfium
+from typing import Iterable, Iterator
+from chunker import chunk_token_limit, iter_token_chunks, tokenize_pages
+from config import CHUNK_TOKENS, CHUNK_OVERLAP, EMBEDDING_MODEL, PDF_BACKENDS, PDF_BACKEND, PDF_PAGE_TIMEOUT
+from models import get_tokenizer
+from page_cache import PageCache, cached_file_hash
+
+logger = logging.getLogger(__name__)
+
+def count_pdf_pages(pdf_path) -> int:
+    """
+    Returns the number of pages in a PDF file without extracting any text.
+
+    Args:
+        pdf_path: Path to the PDF file, or its contents as bytes.
+
+    Returns:
+        int: Number of pages.
+    """
+    document = pdfium.PdfDocument(pdf_path)
+    try:
+        return len(document)
+    finally:
+        document.close()
+
+def _pdfium_pages(pdf, page_numbers: list[int]) -> Iterator[tuple[int, str | None]]:
+    document = pdfium.PdfDocument(pdf)
+    try:
+        for page_num in page_numbers:
+            try:
+                page = document[page_num - 1]
+                textpage = page.get_textpage()
+                text = textpage.get_text_bounded()
+                textpage.close()
+                page.close()
+            except Exception as e:
+                logger.debug(f"pdfium failed on page {page_num}: {e}")
+                text = None
+            yield page_num, text if text is None else text.replace('\r\n', '\n').replace('\r', '\n')
+    finally:
+        document.close()
+
+def _pdfplumber_pages(pdf, page_numbers: list[int]) -> Iterator[tuple[int, str | None]]:
+    with pdfplumber.open(io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf) as document:
+        for page_num in page_numbers:
+            try:
+                page = document.pages[page_num - 1]
+                text = page.extract_text() or ''
+                page.close()
+            except Exception as e:
+                logger.warning(f"Could not extract page {page_num}: {e}")
+                text = None
+            yield page_num, text
+
+def _extract_pages(pdf, page_numbers: list[int], backend: str) -> Iterator[tuple[int, str | None]]:
+    """Yields (page number, text) for each page in order; text is None if the page could not be extracted."""
+    if backend == 'pdfplumber':
+        yield from _pdfplumber_pages(pdf, page_numbers)
+        return
+    for page_num, text in _pdfium_pages(pdf, page_numbers):
+        if text is None:
+            # pdfplumber parses some unusual or damaged pages that pdfium rejects.
+            with contextlib.closing(_pdfplumber_pages(pdf, [page_num])) as pages:
+                page_num, text = next(pages)
+        yield page_num, text
+
+def _extraction_worker(pdf, page_numbers: list[int], backend: str, conn):
+    try:
+        for page_num, text in _extract_pages(pdf, page_numbers, backend):
+            conn.send((page_num, text))
+    except Exception as e:
+        conn.send((None, f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+def _isolated_pages(pdf, page_numbers: list[int], backend: str, timeout: float) -> Iterator[tuple[int, str | None]]:
+    """
+    Extracts pages in a worker process, skipping pages that time out or crash it.
+
+    Pages are streamed back one at a time. A page that takes longer than timeout seconds
+    or kills the worker (e.g. a segfault in the PDF library) is yielded with text None,
+    and a fresh worker continues with the following page.
+    """
+    remaining = list(page_numbers)
+    while remaining:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        worker = multiprocessing.Process(target=_extraction_worker, args=(pdf, remaining, backend, sender), daemon=True)
+        worker.start()
+        sender.close()
+        try:
+            while remaining:
+                if not receiver.poll(timeout):
+                    logger.warning(f"Page {remaining[0]} timed out after {timeout:g}s and was skipped")
+                    yield remaining.pop(0), None
+                    break
+                try:
+                    page_num, text = receiver.recv()
+                except EOFError:
+                    logger.warning(f"Extraction worker exited with code {worker.exitcode} on page {remaining[0]}; "
+                                   f"the page was skipped")
+                    yield remaining.pop(0), None
+                    break
+                if page_num is None:
+                    raise RuntimeError(text)
+                remaining.pop(0)
+                yield page_num, text
+        finally:
+            if worker.is_alive():
+                worker.kill()
+            worker.join()
+            receiver.close()
+
+def _content_hash(pdf) -> str:
+    return hashlib.sha256(pdf).hexdigest() if isinstance(pdf, bytes) else cached_file_hash(pdf)
+
+def iter_pdf_pages(pdf_path, start_page: int = 1, end_page: int | None = None, backend: str = PDF_BACKEND,
+                   timeout: float = PDF_PAGE_TIMEOUT, cache_dir: str | None = None) -> Iterator[dict]:
+    """
+    Lazily extracts text from a PDF file one page at a time.
+
+    The 'pdfium' backend reads text with PDFium (pypdfium2, which pdfplumber already
+    depends on), many times faster than pdfplumber's layout analysis; pages PDFium
+    cannot read fall back to pdfplumber. The 'pdfplumber' backend uses pdfplumber for
+    every page. With a timeout, pages are extracted in a separate process so a page
+    that hangs or crashes the PDF library is skipped instead of stopping the run.
+    Extracted text is cached by the file's content hash, so re-ingesting a file, or
+    a copy of it, does not extract it again; skipped pages are not cached.
+
+    Args:
+        pdf_path: Path to the PDF file, or a binary file object.
+        start_page (int): First page to extract (1-based, inclusive).
+        end_page (int | None): Last page to extract (inclusive). Defaults to the last page.
+        backend (str): 'pdfium' or 'pdfplumber'.
+        timeout (float): Seconds allowed per page; 0 extracts in this process without a limit.
+        cache_dir (str | None): Page cache directory; None or '' disables the cache.
+
+    Yields:
+        dict: {'page': int, 'text': str} for each page that contains text.
+    """
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {backend}. Expected one of: {', '.join(PDF_BACKENDS)}")
+    if not isinstance(pdf_path, (str, os.PathLike)):
+        # File objects are read once so worker processes and both backends can open the contents.
+        pdf_path = pdf_path.read()
+    cache = PageCache(cache_dir) if cache_dir else None
+    content_hash = _content_hash(pdf_path) if cache else None
+    num_pages, cached = cache.get(content_hash, backend) if cache else (None, {})
+    if num_pages is None:
+        num_pages = count_pdf_pages(pdf_path)
+    page_numbers = range(start_page, min(end_page or num_pages, num_pages) + 1)
+    missing = [page_num for page_num in page_numbers if page_num not in cached]
+    if timeout > 0:
+        extracted = _isolated_pages(pdf_path, missing, backend, timeout)
+    else:
+        extracted = _extract_pages(pdf_path, missing, backend)
+    new_pages = {}
+    try:
+        for page_num in page_numbers:
+            if page_num in cached:
+                text = cached[page_num]
+            else:
+                _, text = next(extracted)
+                if text is None:
+                    continue
+                text = new_pages[page_num] = text.strip()
+            if text:
+                yield {'page': page_num, 'text': text}
+    finally:
+        extracted.close()
+        if cache:
+            cache.put(content_hash, backend, num_pages, new_pages)
+
+def extract_text_from_pdf(pdf_path, start_page: int = 1, end_page: int | None = None, backend: str = PDF_BACKEND,
+                          timeout: float = PDF_PAGE_TIMEOUT, cache_dir: str | None = None) -> list[dict]:
     """
     Extracts text from a PDF file, returning a list of dictionaries with page number and text.
 
     Args:
-        pdf_path (str): Path to the PDF file.
+        pdf_path: Path to the PDF file, or a binary file object.
+        start_page (int): First page to extract (1-based, inclusive).
+        end_page (int | None): Last page to extract (inclusive). Defaults to the last page.
+        backend (str): 'pdfium' or 'pdfplumber'.
+        timeout (float): Seconds allowed per page; 0 extracts in this process without a limit.
+        cache_dir (str | None): Page cache directory; None or '' disables the cache.
 
     Returns:
         list[dict]: List of {'page': int, 'text': str} for each page.
     """
-    pages_text = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
-            text = page.extract_text()
-            if text:
-                pages_text.append({'page': page_num, 'text': text.strip()})
-    return pages_text
+    return list(iter_pdf_pages(pdf_path, start_page=start_page, end_page=end_page, backend=backend, timeout=timeout,
+                               cache_dir=cache_dir))
 
-def split_text_into_chunks(text_list: list[dict], chunk_size: int = CHUNK_SIZE) -> list[dict]:
+def iter_text_chunks(text_list: Iterable[dict], max_tokens: int = CHUNK_TOKENS, overlap: int = CHUNK_OVERLAP,
+                     tokenizer=None) -> Iterator[dict]:
+    """
+    Lazily splits extracted page text into token-sized chunks, consuming pages as they arrive.
+
+    Tokens are counted with the embedding model's tokenizer, so each chunk fills but never
+    exceeds the model's sequence limit. Chunks continue across page boundaries.
+
+    Args:
+        text_list (Iterable[dict]): Pages from iter_pdf_pages or extract_text_from_pdf.
+        max_tokens (int): Tokens per chunk; 0 uses the embedding model's sequence limit.
+        overlap (int): Tokens shared by consecutive chunks.
+        tokenizer: Tokenizer to count with. Defaults to the EMBEDDING_MODEL tokenizer.
+
+    Yields:
+        dict: {'page': int, 'page_end': int, 'text': str, 'chunk_id': int}
+    """
+    tokenizer = tokenizer or get_tokenizer(EMBEDDING_MODEL)
+    limit = chunk_token_limit(tokenizer, max_tokens, overlap)
+    yield from iter_token_chunks(tokenize_pages(text_list, tokenizer), limit, overlap)
+
+def split_text_into_chunks(text_list: list[dict], max_tokens: int = CHUNK_TOKENS, overlap: int = CHUNK_OVERLAP,
+                           tokenizer=None) -> list[dict]:
     """
     Splits the extracted text into smaller chunks for indexing.
 
     Args:
         text_list (list[dict]): List from extract_text_from_pdf.
-        chunk_size (int): Approximate number of characters per chunk.
+        max_tokens (int): Tokens per chunk; 0 uses the embedding model's sequence limit.
+        overlap (int): Tokens shared by consecutive chunks.
+        tokenizer: Tokenizer to count with. Defaults to the EMBEDDING_MODEL tokenizer.
 
     Returns:
-        list[dict]: List of {'page': int, 'text': str, 'chunk_id': int}
-    """
-    chunks = []
-    chunk_id = 0
-    for page_data in text_list:
-        text = page_data['text']
-        page = page_data['page']
-        words = text.split()
-        current_chunk = []
-        current_length = 0
-        for word in words:
-            if current_length + len(word) + 1 > chunk_size and current_chunk:
-                chunk_text = ' '.join(current_chunk)
-                chunks.append({'page': page, 'text': chunk_text, 'chunk_id': chunk_id})
-                chunk_id += 1
-                current_chunk = []
-                current_length = 0
-            current_chunk.append(word)
-            current_length += len(word) + 1
-        if current_chunk:
-            chunk_text = ' '.join(current_chunk)
-            chunks.append({'page': page, 'text': chunk_text, 'chunk_id': chunk_id})
-            chunk_id += 1
-    return chunks
+        list[dict]: List of {'page': int, 'page_end': int, 'text': str, 'chunk_id': int}
+    """
+    return list(iter_text_chunks(text_list, max_tokens=max_tokens, overlap=overlap, tokenizer=tokenizer))
@@ -1,35 +1,348 @@
-from transformers import pipeline
+import re
+from typing import Iterable, Iterator
+import numpy as np
 from indexer import SemanticIndexer
-from config import SUMMARIZATION_MODEL
+from metrics import instrumentation
+from models import get_summarizer
+from query_cache import answer_cache, answer_key, encode_queries, sentence_embedding_cache
+from config import (SUMMARIZATION_MODEL, DISTILLED_SUMMARIZATION_MODEL, ANSWER_MODES, ANSWER_MODE,
+                    CONTEXT_MAX_TOKENS, EXTRACTIVE_SENTENCES, QA_BATCH_SIZE, RESULT_CACHE_SIZE, RESULT_CACHE_TTL,
+                    SENTENCE_CACHE_SIZE)
+
+# BART's input limit, used when the summarizer does not report one.
+DEFAULT_CONTEXT_TOKENS = 1024
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_sentences(text: str) -> list[str]:
+    """Splits text into sentences at '.', '!' or '?' followed by whitespace."""
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+def summarizer_tokenizer(summarizer):
+    """Returns the Hugging Face tokenizer of a summarization pipeline, or None for stand-ins without one."""
+    tokenizer = getattr(summarizer, 'tokenizer', None)
+    return tokenizer if isinstance(getattr(tokenizer, 'model_max_length', None), int) else None
+
+def count_tokens(texts: list[str], tokenizer=None) -> list[int]:
+    """
+    Counts the tokens of each text.
+
+    Args:
+        texts (list[str]): Texts to count.
+        tokenizer: Hugging Face tokenizer; whitespace-separated words are counted without one.
+
+    Returns:
+        list[int]: Token count per text, excluding special tokens.
+    """
+    if not texts:
+        return []
+    if tokenizer is None:
+        return [len(text.split()) for text in texts]
+    return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)['input_ids']]
+
+def context_budget(tokenizer=None, max_tokens: int = 0) -> int:
+    """
+    Returns the number of context tokens the summarizer can use.
+
+    Args:
+        tokenizer: The summarizer's tokenizer, whose model_max_length is the input limit.
+        max_tokens (int): Lower limit to apply; 0 uses the summarizer's input limit.
+    """
+    limit = DEFAULT_CONTEXT_TOKENS
+    # Tokenizers without a known limit report a huge sentinel value.
+    if tokenizer is not None and tokenizer.model_max_length < 1_000_000:
+        limit = tokenizer.model_max_length - tokenizer.num_special_tokens_to_add()
+    return min(max_tokens, limit) if max_tokens else limit
+
+def pack_context(results: list[tuple], budget: int, tokenizer=None) -> tuple[str, list[tuple], int]:
+    """
+    Joins the best-ranked chunks that fit into a token budget.
+
+    Chunks are taken in ranking order. A chunk that does not fit is skipped so that
+    shorter, lower-ranked chunks can still use the remaining budget. If not even one
+    chunk fits, the leading part of the best chunk is used.
+
+    Args:
+        results (list[tuple]): (score, text, metadata) search results, best first.
+        budget (int): Maximum number of tokens in the context.
+        tokenizer: Tokenizer used to count tokens; see count_tokens.
+
+    Returns:
+        tuple[str, list[tuple], int]: The context, the results it contains and its token count.
+    """
+    counts = count_tokens([text for _, text, _ in results], tokenizer)
+    parts, used, total = [], [], 0
+    for result, tokens in zip(results, counts):
+        if total + tokens <= budget:
+            parts.append(result[1])
+            used.append(result)
+            total += tokens
+    if not parts and results:
+        text = results[0][1]
+        # Cut proportionally and back off to a word boundary; the summarizer truncates any remainder.
+        cut = len(text) * budget // counts[0]
+        text = text[:cut] if text[cut].isspace() else text[:cut].rsplit(' ', 1)[0]
+        parts, used, total = [text], [results[0]], budget
+    return " ".join(parts), used, total
 
 
 class ResearchAssistant:
-    def __init__(self, indexer: SemanticIndexer, model_name: str = SUMMARIZATION_MODEL):
+    def __init__(self, indexer: SemanticIndexer, model_name: str = SUMMARIZATION_MODEL, mode: str = ANSWER_MODE,
+                 distilled_model_name: str = DISTILLED_SUMMARIZATION_MODEL, max_context_tokens: int = CONTEXT_MAX_TOKENS,
+                 extractive_sentences: int = EXTRACTIVE_SENTENCES, result_cache_size: int = RESULT_CACHE_SIZE,
+                 result_cache_ttl: float = RESULT_CACHE_TTL, sentence_cache_size: int = SENTENCE_CACHE_SIZE):
         """
         Initialize the research assistant with a semantic indexer and a summarization model.
+
+        The summarizer is loaded through the shared model registry on first use, so
+        creating an assistant per request does not reload the model. Answers are cached
+        by question, retrieval settings and index version, so a repeated question is
+        answered without searching or summarizing again until the index changes.
+
+        Args:
+            indexer (SemanticIndexer): Index to retrieve chunks from.
+            model_name (str): Summarization model for the 'abstractive' mode.
+            mode (str): Default answer mode: 'abstractive', 'distilled' or 'extractive'.
+            distilled_model_name (str): Smaller summarization model for the 'distilled' mode.
+            max_context_tokens (int): Token budget of the summarizer input; 0 uses the model's limit.
+            extractive_sentences (int): Number of sentences in an extractive answer.
+            result_cache_size (int): Answers kept in the in-memory answer cache; 0 disables it.
+            result_cache_ttl (float): Seconds after which a cached answer expires; 0 never expires.
+            sentence_cache_size (int): Sentence embeddings kept for the 'extractive' mode; 0 disables the cache.
         """
         self.indexer = indexer
-        self.summarizer = pipeline("summarization", model=model_name)
+        self.model_name = model_name
+        self.mode = self._check_mode(mode)
+        self.distilled_model_name = distilled_model_name
+        self.max_context_tokens = max_context_tokens
+        self.extractive_sentences = extractive_sentences
+        self.result_cache = answer_cache(max_entries=result_cache_size, ttl=result_cache_ttl)
+        self.sentence_cache = sentence_embedding_cache(max_entries=sentence_cache_size)
+
+    @staticmethod
+    def _check_mode(mode: str) -> str:
+        if mode not in ANSWER_MODES:
+            raise ValueError(f"Unknown answer mode: {mode}. Expected one of: {', '.join(ANSWER_MODES)}")
+        return mode
+
+    @property
+    def summarizer(self):
+        """The summarization pipeline, loaded through the shared model registry."""
+        return get_summarizer(self.model_name)
+
+    def summarizer_for(self, mode: str):
+        """Returns the summarization pipeline used by an abstractive answer mode."""
+        return get_summarizer(self.distilled_model_name if mode == 'distilled' else self.model_name)
+
+    @staticmethod
+    def _build_answer(summary: str, results: list[tuple]) -> dict:
+        evidence = []
+        for _, text, metadata in results:
+            evidence.append({"text": text, "page": metadata.get("page", None)})
+        return {"answer": summary, "evidence": evidence}
 
-    def answer_question(self, question: str, top_k: int = 5) -> dict:
+    def answer_question(self, question: str, top_k: int = 5, mode: str | None = None, filter: dict | None = None,
+                        **search_kwargs) -> dict:
         """
         Answer a question by retrieving relevant chunks and generating a concise, evidence-backed answer.
 
         Args:
             question (str): The question to answer.
             top_k (int): Number of top relevant chunks to retrieve.
+            mode (str | None): Answer mode; defaults to the assistant's mode.
+                'abstractive' summarizes with the full model, 'distilled' with the smaller
+                model, and 'extractive' returns the retrieved sentences closest to the question.
+            filter (dict | None): Only retrieve chunks matching this metadata filter, e.g.
+                {'source': 'paper.pdf', 'pages': [3, 7]}.
+            **search_kwargs: Search-time knobs passed to SemanticIndexer.search (nprobe, ef_search).
 
         Returns:
             dict: {
                 "answer": str,
-                "evidence": list of dicts with "text" and "page"
+                "evidence": list of dicts with "text" and "page" for the chunks the answer was built from
             }
         """
-        results = self.indexer.search(question, top_k=top_k)
-        combined_text = " ".join([res[1] for res in results])
-        summary = self.summarizer(combined_text, max_length=150, min_length=40, do_sample=False)[0]['summary_text']
+        mode = self._check_mode(mode or self.mode)
+        if filter is not None:
+            search_kwargs['filter'] = filter
 
-        evidence = []
-        for _, text, metadata in results:
-            evidence.append({"text": text, "page": metadata.get("page", None)})
-        return {"answer": summary, "evidence": evidence}
+        def answer(questions: list[str]) -> list[dict]:
+            if mode == 'extractive':
+                return self._answer_extractive(questions, top_k, search_kwargs)
+            return self._summarize([self.indexer.search(questions[0], top_k=top_k, **search_kwargs)], mode)
+
+        with instrumentation.trace('answer'), instrumentation.stage('answer'):
+            return self._cached_answers([question], top_k, mode, search_kwargs, answer)[0]
+
+    def answer_questions(self, questions: list[str], top_k: int = 5, batch_size: int = QA_BATCH_SIZE,
+                         mode: str | None = None, **search_kwargs) -> list[dict]:
+        """
+        Answer many questions with batched retrieval and summarization.
+
+        Args:
+            questions (list[str]): The questions to answer.
+            top_k (int): Number of top relevant chunks to retrieve per question.
+            batch_size (int): Number of questions searched and summarized together.
+            mode (str | None): Answer mode; see answer_question.
+            **search_kwargs: Search-time knobs passed to SemanticIndexer.search_batch (nprobe, ef_search, filter).
+
+        Returns:
+            list[dict]: One answer_question-style result per question, in input order.
+        """
+        return list(self.iter_answers(questions, top_k=top_k, batch_size=batch_size, mode=mode, **search_kwargs))
+
+    def iter_answers(self, questions: Iterable[str], top_k: int = 5, batch_size: int = QA_BATCH_SIZE,
+                     mode: str | None = None, **search_kwargs) -> Iterator[dict]:
+        """
+        Lazily answer a stream of questions, yielding results as each batch completes.
+
+        Each batch of questions is encoded in one model call, searched with one
+        multi-query FAISS search and summarized with one batched pipeline call.
+
+        Args:
+            questions (Iterable[str]): The questions to answer.
+            top_k (int): Number of top relevant chunks to retrieve per question.
+            batch_size (int): Number of questions searched and summarized together.
+            mode (str | None): Answer mode; see answer_question.
+            **search_kwargs: Search-time knobs passed to SemanticIndexer.search_batch (nprobe, ef_search, filter).
+
+        Yields:
+            dict: answer_question-style result for each question, in input order.
+        """
+        mode = self._check_mode(mode or self.mode)
+        batch = []
+        for question in questions:
+            batch.append(question)
+            if len(batch) >= batch_size:
+                yield from self._answer_batch(batch, top_k, mode, search_kwargs)
+                batch = []
+        if batch:
+            yield from self._answer_batch(batch, top_k, mode, search_kwargs)
+
+    def _answer_batch(self, questions: list[str], top_k: int, mode: str, search_kwargs: dict) -> list[dict]:
+        def answer(batch: list[str]) -> list[dict]:
+            if mode == 'extractive':
+                return self._answer_extractive(batch, top_k, search_kwargs)
+            return self._summarize(self.indexer.search_batch(batch, top_k=top_k, **search_kwargs), mode)
+
+        with instrumentation.trace('answer_batch'), instrumentation.stage('answer_batch'):
+            return self._cached_answers(questions, top_k, mode, search_kwargs, answer)
+
+    def _answer_settings(self, top_k: int, mode: str, search_kwargs: dict) -> dict:
+        """Returns everything besides the question that an answer depends on, for the answer cache key."""
+        settings = {'top_k': top_k, 'mode': mode, 'search': search_kwargs,
+                    'index_version': str(getattr(self.indexer, 'index_version', None))}
+        if mode == 'extractive':
+            settings['sentences'] = self.extractive_sentences
+        else:
+            settings['model'] = self.distilled_model_name if mode == 'distilled' else self.model_name
+            settings['max_context_tokens'] = self.max_context_tokens
+        return settings
+
+    def _cached_answers(self, questions: list[str], top_k: int, mode: str, search_kwargs: dict,
+                        answer) -> list[dict]:
+        """
+        Serves answers from the answer cache and computes the rest.
+
+        Args:
+            questions (list[str]): The questions to answer.
+            top_k (int): Number of chunks retrieved per question.
+            mode (str): Answer mode.
+            search_kwargs (dict): Search-time knobs, including any filter.
+            answer (Callable): Answers a list of questions; only called with the cache misses,
+                each distinct question once.
+
+        Returns:
+            list[dict]: One answer per question, in input order.
+        """
+        if self.result_cache is None:
+            return answer(questions)
+        settings = self._answer_settings(top_k, mode, search_kwargs)
+        keys = [answer_key(question, settings) for question in questions]
+        answers, missing = {}, {}
+        for key, question in zip(keys, questions):
+            if key in answers or key in missing:
+                continue
+            cached = self.result_cache.get(key)
+            if cached is None:
+                missing[key] = question
+            else:
+                answers[key] = cached
+        instrumentation.cache_lookup('answer', len(answers), len(missing))
+        if missing:
+            for key, result in zip(missing, answer(list(missing.values()))):
+                answers[key] = result
+                self.result_cache.put(key, result)
+        return [answers[key] for key in keys]
+
+    def cache_stats(self) -> dict:
+        """Returns the statistics of the query, sentence and answer caches; disabled caches are omitted."""
+        stats = {}
+        query_cache = getattr(self.indexer, 'query_cache', None)
+        if query_cache is not None:
+            stats['query_embeddings'] = query_cache.stats()
+        if self.sentence_cache is not None:
+            stats['sentence_embeddings'] = self.sentence_cache.stats()
+        if self.result_cache is not None:
+            stats['answers'] = self.result_cache.stats()
+        return stats
+
+    def _summarize(self, all_results: list[list[tuple]], mode: str) -> list[dict]:
+        """Summarizes the best-ranked chunks of each result list that fit the summarizer's token budget."""
+        summarizer = self.summarizer_for(mode)
+        tokenizer = summarizer_tokenizer(summarizer)
+        budget = context_budget(tokenizer, self.max_context_tokens)
+        with instrumentation.stage('context'):
+            contexts = [pack_context(results, budget, tokenizer) for results in all_results]
+        with instrumentation.stage('summarize'):
+            summaries = summarizer([context for context, _, _ in contexts], max_length=150, min_length=40,
+                                   do_sample=False, truncation=True, batch_size=len(contexts))
+        if instrumentation.enabled:
+            self._record_counts(all_results, [used for _, used, _ in contexts])
+            instrumentation.count('summarizer_input_tokens', sum(tokens for _, _, tokens in contexts))
+        return [self._build_answer(summary['summary_text'], used)
+                for summary, (_, used, _) in zip(summaries, contexts)]
+
+    def _answer_extractive(self, questions: list[str], top_k: int, search_kwargs: dict) -> list[dict]:
+        """
+        Answers with the retrieved sentences most similar to each question, without a summarizer.
+
+        The question embeddings are computed once and used for both the index search and
+        the sentence ranking. Candidate sentences are served from the sentence embedding
+        cache where possible, since popular chunks are retrieved again and again; the
+        remaining distinct sentences of the batch are encoded in one call.
+        """
+        model = self.indexer.model
+        with instrumentation.stage('encode'):
+            query_embeddings = self.indexer.encode_queries(questions)
+        all_results = self.indexer.search_embeddings(query_embeddings, top_k=top_k, **search_kwargs)
+        with instrumentation.stage('rank'):
+            candidates = [list(dict.fromkeys(sentence for _, text, _ in results for sentence in split_sentences(text)))
+                          for results in all_results]
+            flat = [sentence for sentences in candidates for sentence in sentences]
+            sentence_embeddings = _normalize(encode_queries(model, self.indexer.model_name, flat, self.sentence_cache,
+                                                            cache_name='sentence_embedding')) if flat else None
+            answers, offset = [], 0
+            for query_embedding, sentences, results in zip(_normalize(query_embeddings), candidates, all_results):
+                scores = sentence_embeddings[offset:offset + len(sentences)] @ query_embedding if sentences else []
+                offset += len(sentences)
+                # The best sentences are returned in their reading order.
+                best = sorted(np.argsort(-np.asarray(scores), kind='stable')[:self.extractive_sentences])
+                answers.append(self._build_answer(" ".join(sentences[i] for i in best), results))
+        if instrumentation.enabled:
+            self._record_counts(all_results, all_results)
+            instrumentation.count('sentences_ranked', len(flat))
+        return answers
+
+    def _record_counts(self, all_results: list[list[tuple]], used_results: list[list[tuple]]):
+        """Counts queries, retrieved chunks and chunks used in answers for the metrics."""
+        instrumentation.count('queries', len(all_results))
+        instrumentation.count('chunks_retrieved', sum(len(results) for results in all_results))
+        instrumentation.count('chunks_in_context', sum(len(results) for results in used_results))
+
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
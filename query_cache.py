@@ -0,0 +1,263 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+import numpy as np
+from config import QUERY_CACHE_SIZE, RESULT_CACHE_SIZE, RESULT_CACHE_TTL, SENTENCE_CACHE_SIZE
+from embedding_cache import cache_key, normalize_text
+from metrics import instrumentation
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_FILE = 'query_cache.sqlite'
+# Disk-backed caches drop expired and surplus rows once every this many writes.
+PRUNE_INTERVAL = 64
+
+
+def encode_vector(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+def decode_vector(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.float32)
+
+def encode_json(value) -> bytes:
+    return json.dumps(value).encode('utf-8')
+
+def decode_json(data: bytes):
+    return json.loads(data)
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache with optional expiry and SQLite backing.
+
+    Entries live in memory up to max_entries; the least recently used entry is evicted
+    when a new one would exceed the limit. With a ttl, an entry expires that many
+    seconds after it was stored. With a path, every stored entry is also written to a
+    table of an SQLite database, and memory misses are looked up there, so the cache
+    survives restarts. The table keeps the max_entries most recently stored entries.
+    """
+
+    def __init__(self, max_entries: int, ttl: float = 0, path: str | None = None, table: str = 'entries',
+                 encode: Callable[[object], bytes] = encode_json, decode: Callable[[bytes], object] = decode_json,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            max_entries (int): Maximum number of entries in memory and on disk.
+            ttl (float): Seconds after which an entry expires; 0 keeps entries until evicted.
+            path (str | None): SQLite database file backing the cache; None keeps it in memory only.
+            table (str): Table of the database holding this cache, so several caches can share a file.
+            encode (Callable): Serializes a value for the database.
+            decode (Callable): Deserializes a value read from the database.
+            clock (Callable): Returns the current time in seconds.
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.table = table
+        self.encode = encode
+        self.decode = decode
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (key TEXT PRIMARY KEY, value BLOB, stored REAL)')
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, stored: float) -> bool:
+        return self.ttl > 0 and self.clock() - stored >= self.ttl
+
+    def get(self, key: str):
+        """
+        Looks up an entry, marking it as most recently used.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            The cached value, or None if it is missing or expired. Values are shared with
+            the cache and must not be modified.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1]):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                entry = self._read(key)
+                if entry is not None:
+                    self._store(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value):
+        """
+        Stores an entry, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (str): Cache key.
+            value: Value to cache; must be serializable with encode when the cache is disk-backed.
+        """
+        with self._lock:
+            entry = (value, self.clock())
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute(f'INSERT OR REPLACE INTO "{self.table}" VALUES (?, ?, ?)',
+                                 (key, self.encode(value), entry[1]))
+                self._writes += 1
+                if self._writes % PRUNE_INTERVAL == 0:
+                    self._prune()
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read(self, key: str) -> tuple | None:
+        row = self._db.execute(f'SELECT value, stored FROM "{self.table}" WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if self._expired(row[1]):
+            self._db.execute(f'DELETE FROM "{self.table}" WHERE key = ?', (key,))
+            return None
+        return self.decode(row[0]), row[1]
+
+    def _prune(self):
+        if self.ttl > 0:
+            self._db.execute(f'DELETE FROM "{self.table}" WHERE stored <= ?', (self.clock() - self.ttl,))
+        self._db.execute(f'DELETE FROM "{self.table}" WHERE key NOT IN '
+                         f'(SELECT key FROM "{self.table}" ORDER BY stored DESC LIMIT ?)', (self.max_entries,))
+
+    def clear(self):
+        """Removes all entries, including those on disk."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute(f'DELETE FROM "{self.table}"')
+
+    def stats(self) -> dict:
+        """Returns entry counts and hit/miss statistics of this cache."""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries), 'max_entries': self.max_entries, 'ttl_seconds': self.ttl,
+            'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else None, 'path': self.path,
+        }
+
+    def close(self):
+        """Closes the database connection, if any. The in-memory entries stay usable."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def query_embedding_cache(path: str | None = None, max_entries: int = QUERY_CACHE_SIZE) -> LRUCache | None:
+    """Returns a cache of query embeddings, or None if max_entries is 0."""
+    if max_entries <= 0:
+        return None
+    return LRUCache(max_entries, path=path, table='query_embeddings', encode=encode_vector, decode=decode_vector)
+
+def sentence_embedding_cache(max_entries: int = SENTENCE_CACHE_SIZE) -> LRUCache | None:
+    """Returns an in-memory cache of the embeddings of retrieved sentences, or None if max_entries is 0."""
+    if max_entries <= 0:
+        return None
+    return LRUCache(max_entries)
+
+def answer_cache(path: str | None = None, max_entries: int = RESULT_CACHE_SIZE,
+                 ttl: float = RESULT_CACHE_TTL) -> LRUCache | None:
+    """Returns a cache of answers, or None if max_entries is 0."""
+    if max_entries <= 0:
+        return None
+    return LRUCache(max_entries, ttl=ttl, path=path, table='answers')
+
+def open_query_caches(assistant, cache_dir: str):
+    """
+    Backs the query embedding cache of an assistant's index and its answer cache with
+    one SQLite database in cache_dir, so both survive restarts.
+
+    Args:
+        assistant (ResearchAssistant): Assistant whose caches to replace.
+        cache_dir (str): Directory of the database.
+    """
+    path = os.path.join(cache_dir, QUERY_CACHE_FILE)
+    assistant.indexer.query_cache = query_embedding_cache(path)
+    assistant.result_cache = answer_cache(path)
+
+
+def encode_queries(model, model_name: str, queries: list[str], cache: LRUCache | None = None,
+                   cache_name: str = 'query_embedding') -> np.ndarray:
+    """
+    Embeds queries, serving repeated questions from a query embedding cache.
+
+    Queries are keyed by model name and whitespace-normalized text, but the model
+    always sees the query as given, with or without a cache. The embeddings of the
+    misses, including duplicates within the call, are computed in one model call.
+
+    Args:
+        model: Sentence transformer used to encode the queries.
+        model_name (str): Name of the model, part of the cache key.
+        queries (list[str]): Query strings.
+        cache (LRUCache | None): Query embedding cache; None encodes every query.
+        cache_name (str): Name of the cache in the cache hit metrics.
+
+    Returns:
+        np.ndarray: float32 embeddings, one row per query.
+    """
+    if cache is None:
+        return np.asarray(model.encode(list(queries), convert_to_numpy=True), dtype=np.float32)
+    keys = [cache_key(model_name, query).hex() for query in queries]
+    vectors, missing = {}, {}
+    for key, query in zip(keys, queries):
+        if key in vectors or key in missing:
+            continue
+        vector = cache.get(key)
+        if vector is None:
+            missing[key] = query
+        else:
+            vectors[key] = vector
+    instrumentation.cache_lookup(cache_name, len(vectors), len(missing))
+    if missing:
+        encoded = np.asarray(model.encode(list(missing.values()), convert_to_numpy=True), dtype=np.float32)
+        for key, vector in zip(missing, encoded):
+            vectors[key] = vector
+            cache.put(key, vector)
+    return np.stack([vectors[key] for key in keys]).astype(np.float32, copy=False)
+
+def answer_key(question: str, settings: dict) -> str:
+    """
+    Returns the answer cache key of a question.
+
+    Args:
+        question (str): The question; whitespace is normalized.
+        settings (dict): Everything else the answer depends on, such as top_k, the answer
+            mode, search parameters and the index version. Must be JSON-serializable.
+
+    Returns:
+        str: Hex SHA-1 digest of the normalized question and settings.
+    """
+    data = json.dumps([normalize_text(question), settings], sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
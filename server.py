@@ -0,0 +1,320 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+import numpy as np
+from config import ANSWER_MODES, SERVE_MAX_BATCH_SIZE, SERVE_MAX_WAIT_MS
+from filters import validate_filter
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class RequestError(ValueError):
+    """An invalid request, answered with 400 Bad Request. Other errors are answered with 500."""
+
+def is_positive_int(value) -> bool:
+    """Returns True for a positive JSON integer; booleans are rejected although bool is a subclass of int."""
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+class ServerStats:
+    """Request latency, batch size and queue depth statistics for the query server."""
+
+    def __init__(self, window: int = 1000):
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.started = time.time()
+        self._latencies = deque(maxlen=window)
+        self._batch_sizes = deque(maxlen=window)
+
+    def record_request(self, seconds: float, ok: bool = True):
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        self._latencies.append(seconds)
+
+    def record_batch(self, size: int):
+        self.batches += 1
+        self._batch_sizes.append(size)
+
+    def set_queue_depth(self, depth: int):
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def snapshot(self) -> dict:
+        """
+        Returns current statistics.
+
+        Returns:
+            dict: Request and error counts, latency percentiles in milliseconds over the
+            most recent requests, mean batch size and current/maximum queue depth.
+        """
+        latencies = np.array(self._latencies) * 1000
+        percentiles = {}
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            percentiles = {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+                           'mean_ms': float(latencies.mean())}
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'requests': self.requests,
+            'errors': self.errors,
+            'batches': self.batches,
+            'mean_batch_size': float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'latency': percentiles,
+        }
+
+
+class MicroBatcher:
+    """
+    Merges concurrent requests into batches for a blocking batch function.
+
+    Requests are grouped by key (requests in one batch must share search settings).
+    A batch is dispatched when it reaches max_batch_size or when its oldest request
+    has waited max_wait_ms. Batches run one at a time on a single worker thread so
+    model calls never overlap, while the event loop keeps accepting requests.
+    """
+
+    def __init__(self, process_batch: Callable[[tuple, list], list], stats: ServerStats,
+                 max_batch_size: int = SERVE_MAX_BATCH_SIZE, max_wait_ms: float = SERVE_MAX_WAIT_MS):
+        self.process_batch = process_batch
+        self.stats = stats
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, key: tuple, item):
+        """Queues an item and waits for its result."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, item, future))
+        self.stats.set_queue_depth(self._queue.qsize())
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        held = deque()
+        while True:
+            first = held.popleft() if held else await self._queue.get()
+            key = first[0]
+            batch = [first]
+            deadline = loop.time() + self.max_wait
+            # Requests with other keys are held back for the next batch, in arrival order.
+            for _ in range(len(held)):
+                entry = held.popleft()
+                if entry[0] == key and len(batch) < self.max_batch_size:
+                    batch.append(entry)
+                else:
+                    held.append(entry)
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry[0] == key:
+                    batch.append(entry)
+                else:
+                    held.append(entry)
+            self.stats.set_queue_depth(self._queue.qsize() + len(held))
+            self.stats.record_batch(len(batch))
+            items = [item for _, item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.process_batch, key, items)
+            except Exception as e:
+                logger.error(f"Error processing batch of {len(batch)}: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+class QueryServer:
+    """
+    Local HTTP server that answers questions with a warm ResearchAssistant.
+
+    Endpoints:
+        POST /query  {"question": str, "top_k": int, "mode": str, "nprobe": int, "ef_search": int,
+                      "filter": {"source": str | [str], "pages": int | [first, last], ...}} -> answer JSON
+        GET  /stats  latency, batch size, queue depth and query cache statistics
+        GET  /metrics stage timings, counters and server statistics in Prometheus text format
+        GET  /health liveness check
+    """
+
+    def __init__(self, assistant, max_batch_size: int = SERVE_MAX_BATCH_SIZE, max_wait_ms: float = SERVE_MAX_WAIT_MS):
+        self.assistant = assistant
+        self.stats = ServerStats()
+        self.batcher = MicroBatcher(self._answer_batch, self.stats, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    def _answer_batch(self, key: tuple, questions: list[str]) -> list[dict]:
+        top_k, mode, search_kwargs = key[0], key[1], dict(key[2])
+        if 'filter' in search_kwargs:
+            search_kwargs['filter'] = json.loads(search_kwargs['filter'])
+        if mode is not None:
+            search_kwargs['mode'] = mode
+        return self.assistant.answer_questions(questions, top_k=top_k, batch_size=len(questions), **search_kwargs)
+
+    async def handle_query(self, payload: dict) -> dict:
+        """
+        Validates a query payload and answers it through the micro-batcher.
+
+        Raises:
+            RequestError: If the payload is invalid.
+        """
+        question = payload.get('question')
+        if not isinstance(question, str) or not question.strip():
+            raise RequestError('"question" must be a non-empty string')
+        top_k = payload.get('top_k', 5)
+        if not is_positive_int(top_k):
+            raise RequestError('"top_k" must be a positive integer')
+        mode = payload.get('mode')
+        if mode is not None and mode not in ANSWER_MODES:
+            raise RequestError(f'"mode" must be one of: {", ".join(ANSWER_MODES)}')
+        search_kwargs = []
+        for name in ('nprobe', 'ef_search'):
+            value = payload.get(name)
+            if value is not None:
+                if not is_positive_int(value):
+                    raise RequestError(f'"{name}" must be a positive integer')
+                search_kwargs.append((name, value))
+        filter = payload.get('filter')
+        if filter is not None:
+            try:
+                validate_filter(filter)
+            except ValueError as e:
+                raise RequestError(str(e)) from e
+            # Batch keys must be hashable; equal filters batch together whatever their key order.
+            search_kwargs.append(('filter', json.dumps(filter, sort_keys=True)))
+        return await self.batcher.submit((top_k, mode, tuple(search_kwargs)), question)
+
+    def render_metrics(self) -> str:
+        """Returns the shared metrics registry, with the current server statistics, in Prometheus text format."""
+        snapshot = self.stats.snapshot()
+        for name in ('requests', 'errors', 'batches', 'queue_depth', 'max_queue_depth', 'uptime_seconds', 'mean_batch_size'):
+            metrics.gauge(f'research_assistant_server_{name}', f'Query server {name.replace("_", " ")}').set(snapshot[name])
+        latency = metrics.gauge('research_assistant_server_latency_ms',
+                                'Query server request latency percentiles over recent requests', ('quantile',))
+        for quantile, key in (('0.5', 'p50_ms'), ('0.95', 'p95_ms'), ('0.99', 'p99_ms')):
+            if key in snapshot['latency']:
+                latency.set(snapshot['latency'][key], quantile=quantile)
+        return metrics.render_prometheus()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        start = time.perf_counter()
+        status, body = 500, {'error': 'internal error'}
+        is_query = False
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            if not request_line:
+                writer.close()
+                return
+            parts = request_line.split(' ', 2)
+            if len(parts) != 3:
+                raise RequestError(f'malformed request line: {request_line}')
+            method, path, _ = parts
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            try:
+                length = int(headers.get('content-length', '0'))
+            except ValueError as e:
+                raise RequestError('Content-Length must be an integer') from e
+            if length < 0:
+                raise RequestError('Content-Length must not be negative')
+            if length > MAX_BODY_BYTES:
+                status, body = 413, {'error': 'request body too large'}
+            elif method == 'GET' and path == '/health':
+                status, body = 200, {'status': 'ok'}
+            elif method == 'GET' and path == '/stats':
+                status, body = 200, {**self.stats.snapshot(), 'caches': self.assistant.cache_stats()}
+            elif method == 'GET' and path == '/metrics':
+                status, body = 200, self.render_metrics()
+            elif method == 'POST' and path == '/query':
+                is_query = True
+                try:
+                    body_bytes = await reader.readexactly(length) if length else b'{}'
+                except asyncio.IncompleteReadError as e:
+                    raise RequestError(f'request body ended after {len(e.partial)} of {length} bytes') from e
+                try:
+                    payload = json.loads(body_bytes)
+                except ValueError as e:
+                    raise RequestError(f'request body is not valid JSON: {e}') from e
+                if not isinstance(payload, dict):
+                    raise RequestError('request body must be a JSON object')
+                status, body = 200, await self.handle_query(payload)
+            else:
+                status, body = 404, {'error': f'no route for {method} {path}'}
+        except RequestError as e:
+            status, body = 400, {'error': str(e)}
+        except Exception as e:
+            logger.error(f"Error handling request: {e}")
+            status, body = 500, {'error': str(e)}
+        finally:
+            if is_query:
+                self.stats.record_request(time.perf_counter() - start, ok=status == 200)
+        if isinstance(body, str):
+            data, content_type = body.encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            data, content_type = json.dumps(body).encode('utf-8'), 'application/json'
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large'}.get(status, 'Internal Server Error')
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode('latin-1') + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str | None = None, port: int | None = None, socket_path: str | None = None):
+        """
+        Runs the server until cancelled.
+
+        Args:
+            host (str | None): TCP host to bind.
+            port (int | None): TCP port to bind.
+            socket_path (str | None): Unix socket path to bind instead of TCP.
+        """
+        self.batcher.start()
+        if socket_path:
+            server = await asyncio.start_unix_server(self._handle_connection, path=socket_path)
+            logger.info(f"Serving on unix socket {socket_path}")
+        else:
+            server = await asyncio.start_server(self._handle_connection, host=host, port=port)
+            logger.info(f"Serving on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
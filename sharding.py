@@ -0,0 +1,532 @@
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from config import (EMBEDDING_MODEL, EMBED_BATCH_SIZE, INDEX_TYPE, INGEST_WORKERS, PAGES_PER_TASK,
+                    SHARD_SEARCH_EXECUTOR, SHARD_SEARCH_EXECUTORS, SHARD_SEARCH_WORKERS, VECTOR_PRECISION)
+from embedding_cache import EmbeddingCache
+from filters import validate_filter
+from index_store import MANIFEST_FILE, read_manifest
+from indexer import SemanticIndexer
+from ingest import IngestStats, document_source, update_documents
+from metrics import instrumentation
+from models import get_embedder
+from query_cache import encode_queries, query_embedding_cache
+
+logger = logging.getLogger(__name__)
+
+SHARDS_FORMAT_NAME = 'research-assistant-sharded-index'
+SHARDS_FORMAT_VERSION = 1
+SHARDS_FILE = 'shards.json'
+
+
+def shard_name(shard_no: int) -> str:
+    """Returns the directory name of a shard, e.g. 'shard-003'."""
+    return f"shard-{shard_no:03d}"
+
+def shard_for(source: str, num_shards: int) -> int:
+    """Returns the shard a document belongs to. Routing is stable, so re-ingesting a file updates the same shard."""
+    return int.from_bytes(hashlib.sha1(source.encode('utf-8')).digest()[:8], 'big') % num_shards
+
+def is_sharded(path: str) -> bool:
+    """Returns True if path is a sharded index directory."""
+    return os.path.isfile(os.path.join(path, SHARDS_FILE))
+
+def manifest_stamp(shard_path: str) -> tuple | None:
+    """
+    Returns the inode, size and modification time of a shard's manifest, or None if
+    the shard does not exist. Saving a shard replaces its directory, so the stamp
+    changes with every save.
+    """
+    try:
+        stat = os.stat(os.path.join(shard_path, MANIFEST_FILE))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+def read_shards_manifest(path: str) -> dict:
+    """
+    Reads and validates the manifest of a sharded index directory.
+
+    Raises:
+        FileNotFoundError: If path is not a sharded index directory.
+        ValueError: If the format or version is not supported.
+    """
+    manifest_path = os.path.join(path, SHARDS_FILE)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Shard manifest not found: {manifest_path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != SHARDS_FORMAT_NAME:
+        raise ValueError(f"{path} is not a sharded research assistant index")
+    if manifest.get('version') != SHARDS_FORMAT_VERSION:
+        raise ValueError(f"Unsupported sharded index version {manifest.get('version')} (expected {SHARDS_FORMAT_VERSION})")
+    return manifest
+
+def write_shards_manifest(path: str, num_shards: int, model_name: str):
+    """Creates path if needed and writes its shard manifest."""
+    os.makedirs(path, exist_ok=True)
+    manifest = {
+        'format': SHARDS_FORMAT_NAME,
+        'version': SHARDS_FORMAT_VERSION,
+        'num_shards': num_shards,
+        'shards': [shard_name(i) for i in range(num_shards)],
+        'model_name': model_name,
+    }
+    tmp_path = os.path.join(path, SHARDS_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(path, SHARDS_FILE))
+
+
+# Shards opened by search worker processes: shard path -> (manifest stamp, indexer).
+_process_shards = {}
+
+def _search_shard_in_process(shard_path: str, query_embeddings: np.ndarray, top_k: int,
+                             nprobe: int | None, ef_search: int | None, filter: dict | None = None):
+    """
+    Searches a shard in a search worker process, reopening it whenever it was saved since it was opened.
+
+    Returns:
+        tuple | None: Distances, ids and the (text, metadata) rows of the ids, or None if the shard does not exist.
+    """
+    stamp = manifest_stamp(shard_path)
+    if stamp is None:
+        _process_shards.pop(shard_path, None)
+        return None
+    cached = _process_shards.get(shard_path)
+    if cached is None or cached[0] != stamp:
+        cached = _process_shards[shard_path] = (stamp, SemanticIndexer.load(shard_path))
+    indexer = cached[1]
+    distances, ids = indexer.search_vectors(query_embeddings, top_k=top_k, nprobe=nprobe, ef_search=ef_search,
+                                            filter=filter)
+    rows = [[(indexer.texts[idx], indexer.metadata[idx]) if 0 <= idx < len(indexer.texts) else None for idx in row]
+            for row in ids.tolist()]
+    return distances, ids, rows
+
+
+class ShardedIndex:
+    """
+    A corpus split across independently built shard indexes, searched as one.
+
+    Each shard is an ordinary index directory holding a disjoint set of documents.
+    Shards are opened on first use. A query is encoded once, searched on every shard
+    concurrently, and the per-shard top-k lists are merged into a global top-k. The
+    search and search_batch signatures match SemanticIndexer, so a ShardedIndex can
+    back a ResearchAssistant directly.
+    """
+
+    def __init__(self, path: str, manifest: dict, mmap: bool = True, executor: str = SHARD_SEARCH_EXECUTOR,
+                 max_workers: int = SHARD_SEARCH_WORKERS):
+        """
+        Args:
+            path (str): Sharded index directory.
+            manifest (dict): Its shard manifest.
+            mmap (bool): Memory-map shard FAISS indexes. Pass False if shards will be modified.
+            executor (str): 'thread' searches shards on a thread pool in this process; 'process'
+                searches them in worker processes, each keeping the shards it has opened.
+            max_workers (int): Search workers; 0 uses one per shard.
+        """
+        if executor not in SHARD_SEARCH_EXECUTORS:
+            raise ValueError(f"Unknown shard search executor: {executor}. Expected one of: {', '.join(SHARD_SEARCH_EXECUTORS)}")
+        self.path = path
+        self.model_name = manifest['model_name']
+        self.shard_names = manifest['shards']
+        self.mmap = mmap
+        self.executor = executor
+        self.max_workers = max_workers or len(self.shard_names)
+        self._shards = [None] * len(self.shard_names)
+        # Index version of each opened shard as it was read from or last saved to disk.
+        self._saved_versions = [None] * len(self.shard_names)
+        # Shard manifest stamp and the index version it records, by shard number.
+        self._disk_versions = {}
+        self._missing = set()
+        self._lock = threading.Lock()
+        self._pool = None
+        self.query_cache = query_embedding_cache()
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, executor: str = SHARD_SEARCH_EXECUTOR,
+             max_workers: int = SHARD_SEARCH_WORKERS):
+        """
+        Open a sharded index directory. No shard is read until it is needed.
+
+        Args:
+            path (str): Sharded index directory.
+            mmap (bool): Memory-map shard FAISS indexes.
+            executor (str): 'thread' or 'process' shard search.
+            max_workers (int): Search workers; 0 uses one per shard.
+
+        Returns:
+            ShardedIndex: The sharded index.
+        """
+        return cls(path, read_shards_manifest(path), mmap=mmap, executor=executor, max_workers=max_workers)
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.shard_names)
+
+    @property
+    def model(self):
+        """The sentence transformer used to encode queries, from the shared model registry."""
+        return get_embedder(self.model_name)
+
+    @property
+    def index_version(self) -> str:
+        """
+        Identifies the current contents of all shards, for keying cached answers.
+
+        Each shard contributes the index version recorded in its manifest on disk, so
+        opening a shard does not change the version and answers cached before a shard
+        was rebuilt are not served after a restart. Opened shards with unsaved changes
+        contribute their in-memory version instead.
+        """
+        parts = []
+        for shard_no, shard in enumerate(self._shards):
+            if shard is not None and shard.index_version != self._saved_versions[shard_no]:
+                parts.append(shard.index_version)
+            else:
+                parts.append(self._disk_version(shard_no))
+        return hashlib.sha1('/'.join(parts).encode('utf-8')).hexdigest()
+
+    def _disk_version(self, shard_no: int) -> str:
+        """Returns the index version in a shard's manifest, re-reading it only when the file changes."""
+        stamp = manifest_stamp(self.shard_path(shard_no))
+        if stamp is None:
+            return ''
+        cached = self._disk_versions.get(shard_no)
+        if cached is None or cached[0] != stamp:
+            try:
+                version = read_manifest(self.shard_path(shard_no)).get('index_version')
+            except FileNotFoundError:
+                return ''
+            # Shards saved before versions were recorded are identified by their manifest file.
+            cached = self._disk_versions[shard_no] = (stamp, version or '-'.join(map(str, stamp)))
+        return cached[1]
+
+    def encode_queries(self, queries: list[str]) -> np.ndarray:
+        """Embeds queries with the model, serving repeated questions from the query embedding cache."""
+        return encode_queries(self.model, self.model_name, queries, self.query_cache)
+
+    def shard_path(self, shard_no: int) -> str:
+        return os.path.join(self.path, self.shard_names[shard_no])
+
+    def loaded_shards(self) -> list[int]:
+        """Returns the numbers of the shards opened so far."""
+        return [i for i, shard in enumerate(self._shards) if shard is not None]
+
+    def shard(self, shard_no: int) -> SemanticIndexer | None:
+        """
+        Returns a shard's indexer, opening it on first use.
+
+        Returns:
+            SemanticIndexer | None: None if no document has been assigned to the shard yet.
+        """
+        shard = self._shards[shard_no]
+        if shard is not None or shard_no in self._missing:
+            return shard
+        with self._lock:
+            if self._shards[shard_no] is None and shard_no not in self._missing:
+                try:
+                    shard = SemanticIndexer.load(self.shard_path(shard_no), mmap=self.mmap)
+                    self._saved_versions[shard_no] = shard.index_version
+                    self._shards[shard_no] = shard
+                except FileNotFoundError:
+                    self._missing.add(shard_no)
+            return self._shards[shard_no]
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    pool_class = ProcessPoolExecutor if self.executor == 'process' else ThreadPoolExecutor
+                    self._pool = pool_class(max_workers=self.max_workers)
+        return self._pool
+
+    def close(self):
+        """Shuts down the search workers."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _search_shard(self, shard_no: int, query_embeddings: np.ndarray, top_k: int,
+                      nprobe: int | None, ef_search: int | None, filter: dict | None = None):
+        shard = self.shard(shard_no)
+        if shard is None or shard.index is None:
+            return None
+        return shard.search_vectors(query_embeddings, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)
+
+    def search(self, query: str, top_k: int = 5, nprobe: int | None = None, ef_search: int | None = None,
+               filter: dict | None = None):
+        """
+        Search all shards for the most similar text chunks to the query.
+
+        Args:
+            query (str): The query string.
+            top_k (int): Number of top results to return.
+            nprobe (int | None): IVF lists to visit (IVF index types only).
+            ef_search (int | None): HNSW candidate list size (HNSW only).
+            filter (dict | None): Only return chunks matching this metadata filter.
+
+        Returns:
+            list of tuples: (score, text, metadata)
+        """
+        return self.search_batch([query], top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)[0]
+
+    def search_batch(self, queries: list[str], top_k: int = 5, nprobe: int | None = None,
+                     ef_search: int | None = None, filter: dict | None = None) -> list[list[tuple]]:
+        """
+        Search all shards for several queries at once.
+
+        Queries are encoded once and every shard is searched concurrently with the whole
+        batch. Each shard returns its own top_k; these lists are merged by distance, and
+        texts and metadata are only read for the global top_k.
+
+        Args:
+            queries (list[str]): The query strings.
+            top_k (int): Number of top results to return per query.
+            nprobe (int | None): IVF lists to visit (IVF index types only).
+            ef_search (int | None): HNSW candidate list size (HNSW only).
+            filter (dict | None): Only return chunks matching this metadata filter.
+
+        Returns:
+            list of lists of tuples: (score, text, metadata) for each query, in input order.
+        """
+        if not queries:
+            return []
+        with instrumentation.stage('encode'):
+            query_embeddings = self.encode_queries(queries)
+        return self.search_embeddings(query_embeddings, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filter=filter)
+
+    def search_embeddings(self, query_embeddings: np.ndarray, top_k: int = 5, nprobe: int | None = None,
+                          ef_search: int | None = None, filter: dict | None = None) -> list[list[tuple]]:
+        """
+        Search all shards with already encoded queries and merge the results.
+
+        Args:
+            query_embeddings (np.ndarray): Query vectors, one row per query.
+            top_k (int): Number of top results to return per query.
+            nprobe (int | None): IVF lists to visit (IVF index types only).
+            ef_search (int | None): HNSW candidate list size (HNSW only).
+            filter (dict | None): Only return chunks matching this metadata filter. A filter
+                on 'source' only searches the shards holding those documents.
+
+        Returns:
+            list of lists of tuples: (score, text, metadata) for each query, in input order.
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        with instrumentation.stage('search'):
+            shard_results = self._fan_out(query_embeddings, top_k, nprobe, ef_search, filter)
+        with instrumentation.stage('lookup'):
+            return self._merge(shard_results, len(query_embeddings), top_k)
+
+    def _shard_nos(self, filter: dict | None) -> list[int]:
+        """Returns the shards that can hold chunks matching a filter."""
+        if filter:
+            validate_filter(filter)
+        if not filter or 'source' not in filter:
+            return list(range(self.num_shards))
+        sources = filter['source'] if isinstance(filter['source'], list) else [filter['source']]
+        # Documents are assigned to shards by absolute path; the source may also be given as stored.
+        return sorted({shard_for(path, self.num_shards) for source in sources
+                       for path in (source, document_source(source))})
+
+    def _fan_out(self, query_embeddings: np.ndarray, top_k: int, nprobe: int | None, ef_search: int | None,
+                 filter: dict | None = None) -> list:
+        pool = self._get_pool()
+        shard_nos = self._shard_nos(filter)
+        if self.executor == 'process':
+            # Workers return the texts of their top_k, so shards are never opened in this process.
+            futures = [pool.submit(_search_shard_in_process, self.shard_path(i), query_embeddings, top_k, nprobe,
+                                   ef_search, filter) for i in shard_nos]
+        else:
+            futures = [pool.submit(self._search_shard, i, query_embeddings, top_k, nprobe, ef_search, filter)
+                       for i in shard_nos]
+        shard_results = [(shard_no, future.result()) for shard_no, future in zip(shard_nos, futures)]
+        return [(shard_no, result) for shard_no, result in shard_results if result is not None]
+
+    def _merge(self, shard_results: list, num_queries: int, top_k: int) -> list[list[tuple]]:
+        """
+        Merges per-shard (distances, ids) results into a global top_k per query.
+
+        Texts come with the results of worker processes; otherwise they are read from
+        the opened shard for the merged top_k only.
+        """
+        all_results = []
+        for q in range(num_queries):
+            candidates = [
+                [(float(dist), shard_no, rank, int(idx))
+                 for rank, (dist, idx) in enumerate(zip(result[0][q], result[1][q])) if idx >= 0]
+                for shard_no, result in shard_results
+            ]
+            rows_of = {shard_no: result[2] for shard_no, result in shard_results if len(result) > 2}
+            results = []
+            for dist, shard_no, rank, idx in itertools.islice(heapq.merge(*candidates), top_k):
+                if shard_no in rows_of:
+                    row = rows_of[shard_no][q][rank]
+                    if row is not None:
+                        results.append((dist, *row))
+                    continue
+                shard = self.shard(shard_no)
+                if idx < len(shard.texts):
+                    results.append((dist, shard.texts[idx], shard.metadata[idx]))
+            all_results.append(results)
+        return all_results
+
+    @property
+    def documents(self) -> dict:
+        """The document manifests of all shards combined. Opens every shard."""
+        documents = {}
+        for shard_no in range(self.num_shards):
+            shard = self.shard(shard_no)
+            if shard is not None:
+                documents.update(shard.documents)
+        return documents
+
+    def has_document(self, source: str) -> bool:
+        """Returns True if a document is in the index. Opens only the shard the document belongs to."""
+        shard = self.shard(shard_for(source, self.num_shards))
+        return shard is not None and source in shard.documents
+
+    def remove_document(self, source: str) -> int:
+        """
+        Remove all chunks of a document from the shard that holds it.
+
+        Args:
+            source (str): Document source, as recorded in the chunks' 'source' metadata.
+
+        Returns:
+            int: Number of chunks removed.
+        """
+        shard = self.shard(shard_for(source, self.num_shards))
+        if shard is None:
+            raise ValueError(f"Document not in index: {source}")
+        return shard.remove_document(source)
+
+    def save(self, path: str | None = None):
+        """
+        Save the shards changed since they were opened and the shard manifest.
+
+        Shards that were never opened, or were opened but not changed, are unchanged on
+        disk, so saving only rewrites the shards that were touched.
+
+        Args:
+            path (str | None): Sharded index directory. Defaults to the directory it was loaded from.
+        """
+        path = path or self.path
+        if os.path.abspath(path) != os.path.abspath(self.path):
+            raise ValueError("A sharded index can only be saved to the directory it was loaded from")
+        write_shards_manifest(path, self.num_shards, self.model_name)
+        for shard_no in self.loaded_shards():
+            shard = self._shards[shard_no]
+            if shard.index is not None and shard.index_version != self._saved_versions[shard_no]:
+                shard.save(self.shard_path(shard_no))
+                self._saved_versions[shard_no] = shard.index_version
+
+
+def _update_shard(task: dict) -> dict:
+    """Updates one shard with its share of the PDF files. Runs inside a build worker process."""
+    shard_path = task['shard_path']
+    try:
+        indexer = SemanticIndexer.load(shard_path, mmap=False)
+        if (task['index_type'] and task['index_type'] != indexer.index_type) or \
+                (task['precision'] and task['precision'] != indexer.precision):
+            indexer.change_index_type(task['index_type'] or indexer.index_type, task['precision'])
+    except FileNotFoundError:
+        indexer = SemanticIndexer(task['model_name'], index_type=task['index_type'] or INDEX_TYPE,
+                                  precision=task['precision'] or VECTOR_PRECISION)
+    if task['cache_dir']:
+        # Each shard has its own cache so parallel builds never write the same cache files.
+        indexer.cache = EmbeddingCache(os.path.join(task['cache_dir'], os.path.basename(shard_path)), indexer.model_name)
+    stats = IngestStats()
+    try:
+        update = update_documents(indexer, task['pdf_paths'], stats, workers=task['workers'],
+                                  pages_per_task=task['pages_per_task'], batch_size=task['batch_size'],
+                                  page_cache_dir=task.get('page_cache_dir'))
+    finally:
+        indexer.close()
+    if indexer.cache is not None:
+        try:
+            indexer.cache.save()
+        except OSError as e:
+            logger.warning(f"Could not save embedding cache for {shard_path}: {e}")
+    if indexer.index is not None and (update['new'] or update['changed']):
+        indexer.save(shard_path)
+    return {'shard': os.path.basename(shard_path), **update, 'errors': stats.failed, 'summary': stats.summary()}
+
+def update_sharded_index(path: str, pdf_paths: list[str], num_shards: int | None = None, index_type: str | None = None,
+                         precision: str | None = None, shard_workers: int = 1, workers: int = INGEST_WORKERS, pages_per_task: int = PAGES_PER_TASK,
+                         batch_size: int = EMBED_BATCH_SIZE, cache_dir: str | None = None,
+                         page_cache_dir: str | None = None) -> list[dict]:
+    """
+    Creates or updates a sharded index, building the affected shards independently.
+
+    Documents are assigned to shards by a hash of their source path. Each shard with
+    assigned files is updated with update_documents, so unchanged files are skipped and
+    changed ones replaced. With shard_workers > 1 shards are built in parallel worker
+    processes, each loading its own copy of the embedding model.
+
+    Args:
+        path (str): Sharded index directory.
+        pdf_paths (list[str]): Paths to PDF files.
+        num_shards (int | None): Number of shards for a new index. Must match for an existing one.
+        index_type (str | None): FAISS index type of the shards.
+        precision (str | None): Storage precision of the shards' vectors.
+        shard_workers (int): Number of shards built at the same time.
+        workers (int): Extraction worker processes per shard.
+        pages_per_task (int): Maximum pages per extraction task.
+        batch_size (int): Number of chunks to embed and index per batch.
+        cache_dir (str | None): Embedding cache directory; each shard uses a subdirectory.
+        page_cache_dir (str | None): Cache directory of extracted page text, shared by all shards.
+
+    Returns:
+        list[dict]: Per updated shard, the update_documents result plus 'shard', 'errors' and 'summary'.
+    """
+    if is_sharded(path):
+        manifest = read_shards_manifest(path)
+        if num_shards is not None and num_shards != manifest['num_shards']:
+            raise ValueError(f"{path} has {manifest['num_shards']} shards; changing the shard count is not supported")
+    else:
+        if os.path.exists(os.path.join(path, 'manifest.json')):
+            raise ValueError(f"{path} is a single (unsharded) index")
+        if not num_shards or num_shards <= 0:
+            raise ValueError("num_shards must be a positive integer for a new sharded index")
+        write_shards_manifest(path, num_shards, EMBEDDING_MODEL)
+        manifest = read_shards_manifest(path)
+
+    assigned = {}
+    for pdf_path in pdf_paths:
+        assigned.setdefault(shard_for(document_source(pdf_path), manifest['num_shards']), []).append(pdf_path)
+    tasks = [{
+        'shard_path': os.path.join(path, manifest['shards'][shard_no]),
+        'pdf_paths': shard_paths,
+        'model_name': manifest['model_name'],
+        'index_type': index_type,
+        'precision': precision,
+        'cache_dir': cache_dir,
+        'page_cache_dir': page_cache_dir,
+        'workers': workers,
+        'pages_per_task': pages_per_task,
+        'batch_size': batch_size,
+    } for shard_no, shard_paths in sorted(assigned.items())]
+    logger.info(f"Updating {len(tasks)} of {manifest['num_shards']} shards with {max(1, shard_workers)} build worker(s)")
+    if shard_workers <= 1 or len(tasks) <= 1:
+        return [_update_shard(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=shard_workers) as executor:
+        return list(executor.map(_update_shard, tasks))
+
+def open_index(path: str, mmap: bool = True):
+    """
+    Opens an index directory, sharded or not.
+
+    Returns:
+        SemanticIndexer | ShardedIndex: The index.
+    """
+    if is_sharded(path):
+        return ShardedIndex.load(path, mmap=mmap)
+    return SemanticIndexer.load(path, mmap=mmap)
@@ -0,0 +1,112 @@
+"""
+Measures CLI startup time and checks which heavy modules each startup path imports.
+
+Run from the repository root:
+
+    python startup_benchmark.py --repeats 5 --output startup.json --max-seconds 1.0
+
+Exits with status 1 if any scenario imports a heavy module or exceeds --max-seconds,
+so CI can track startup regressions.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ('torch', 'transformers', 'sentence_transformers', 'faiss', 'pdfplumber')
+
+# Startup paths that must not need any ML dependency.
+SCENARIOS = {
+    'import': None,
+    'help': ['--help'],
+    'invalid-args': ['query', 'What is AI?', '--top-k', 'not-a-number'],
+    'invalid-top-k': ['query', 'What is AI?', '--top-k', '0'],
+    'missing-pdf': ['ingest', 'does-not-exist.pdf'],
+}
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_PROBE = """
+import atexit, json, runpy, sys
+heavy = {heavy!r}
+def report():
+    sys.stderr.write('\\nSTARTUP_PROBE ' + json.dumps(sorted(m for m in heavy if m in sys.modules)) + '\\n')
+atexit.register(report)
+argv = {argv!r}
+if argv is None:
+    import main
+else:
+    sys.argv = ['main.py'] + argv
+    runpy.run_path('main.py', run_name='__main__')
+"""
+
+
+def run_scenario(argv: list[str] | None) -> tuple[float, list[str]]:
+    """
+    Runs one startup path in a fresh interpreter.
+
+    Args:
+        argv (list[str] | None): Arguments for main.py, or None to only import main.
+
+    Returns:
+        tuple[float, list[str]]: Wall-clock seconds and the heavy modules that were imported.
+    """
+    code = _PROBE.format(heavy=HEAVY_MODULES, argv=argv)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    imported = []
+    for line in proc.stderr.splitlines():
+        if line.startswith('STARTUP_PROBE '):
+            imported = json.loads(line[len('STARTUP_PROBE '):])
+    return elapsed, imported
+
+def run_benchmark(repeats: int = 5) -> dict:
+    """
+    Measures every scenario in SCENARIOS.
+
+    Returns:
+        dict: Per scenario, the median and minimum seconds and the heavy modules imported.
+    """
+    results = {}
+    for name, argv in SCENARIOS.items():
+        timings = []
+        imported = []
+        for _ in range(repeats):
+            elapsed, imported = run_scenario(argv)
+            timings.append(elapsed)
+        results[name] = {
+            'median_seconds': statistics.median(timings),
+            'min_seconds': min(timings),
+            'heavy_modules': imported,
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure CLI startup time and heavy imports")
+    parser.add_argument('--repeats', type=int, default=5, help='Runs per scenario')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--max-seconds', type=float, help='Fail if any scenario median exceeds this')
+    args = parser.parse_args()
+
+    results = run_benchmark(args.repeats)
+    failed = False
+    for name, result in results.items():
+        status = 'ok'
+        if result['heavy_modules']:
+            status = f"imports {', '.join(result['heavy_modules'])}"
+            failed = True
+        elif args.max_seconds is not None and result['median_seconds'] > args.max_seconds:
+            status = f"slower than {args.max_seconds:.2f}s"
+            failed = True
+        print(f"{name:<14} median {result['median_seconds'] * 1000:8.1f} ms  min {result['min_seconds'] * 1000:8.1f} ms  {status}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from chunker import WhitespaceTokenizer
+from config import EMBEDDING_MODEL
+from indexer import SemanticIndexer
+from models import registry
+
+
+class FakeEmbedder:
+    """Deterministic stand-in for SentenceTransformer that needs no model download."""
+
+    def __init__(self):
+        self.encode_calls = []
+
+    def encode(self, texts, **kwargs):
+        self.encode_calls.append(list(texts))
+        return np.array([[len(t), t.count(' '), sum(map(ord, t)) % 97] for t in texts], dtype='float32')
+
+@pytest.fixture
+def fake_tokenizer():
+    tokenizer = WhitespaceTokenizer()
+    registry.register('tokenizer', EMBEDDING_MODEL, tokenizer)
+    yield tokenizer
+    registry.evict('tokenizer', EMBEDDING_MODEL)
+
+@pytest.fixture
+def fake_embedder(fake_tokenizer):
+    embedder = FakeEmbedder()
+    registry.register('sentence-embedding', EMBEDDING_MODEL, embedder)
+    yield embedder
+    registry.evict('sentence-embedding', EMBEDDING_MODEL)
+
+@pytest.fixture
+def fake_indexer(fake_embedder):
+    return SemanticIndexer()
+
+@pytest.fixture
+def sample_texts():
+    return ["This is a test.", "Another test sentence.", "More text data."]
+
+@pytest.fixture
+def sample_metadatas():
+    return [{"page": 1}, {"page": 2}, {"page": 3}]
+
+def _write_pdf(path, pages):
+    """Writes a minimal text-only PDF with one line of text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, text in enumerate(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>")
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    out = "%PDF-1.4\n"
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "w", encoding="latin-1") as f:
+        f.write(out)
+    return str(path)
+
+@pytest.fixture
+def write_pdf():
+    """Writes a minimal text-only PDF with one line of text per page and returns its path."""
+    return _write_pdf
@@ -0,0 +1,52 @@
+import json
+import pytest
+from benchmark import StubEmbedder, compare_results, latency_stats, run_benchmark, synthetic_chunks
+from config import EMBEDDING_MODEL, SUMMARIZATION_MODEL, DISTILLED_SUMMARIZATION_MODEL
+from models import registry
+
+
+@pytest.fixture
+def stub_registry():
+    yield
+    registry.evict('sentence-embedding', EMBEDDING_MODEL)
+    registry.evict('tokenizer', EMBEDDING_MODEL)
+    registry.evict('summarization', SUMMARIZATION_MODEL)
+    registry.evict('summarization', DISTILLED_SUMMARIZATION_MODEL)
+
+def test_synthetic_corpus_is_deterministic():
+    first = list(synthetic_chunks(20, words_per_chunk=10, seed=3))
+    assert first == list(synthetic_chunks(20, words_per_chunk=10, seed=3))
+    assert first != list(synthetic_chunks(20, words_per_chunk=10, seed=4))
+    assert all(len(text.split()) == 10 for text in first)
+
+def test_stub_embedder_is_normalized():
+    vectors = StubEmbedder(dimension=16).encode(["alpha beta", "alpha beta", "gamma"])
+    assert vectors.shape == (3, 16)
+    assert vectors[0] == pytest.approx(vectors[1])
+    assert (vectors ** 2).sum(axis=1) == pytest.approx([1, 1, 1])
+
+def test_latency_stats_percentiles():
+    stats = latency_stats([0.001] * 99 + [0.1], count=200, unit='chunks')
+    assert stats['p50_ms'] == pytest.approx(1.0)
+    assert stats['p99_ms'] > stats['p95_ms']
+    assert stats['throughput_per_second'] == pytest.approx(200 / 0.199)
+
+def test_run_benchmark_offline(stub_registry):
+    results = run_benchmark(num_chunks=300, pdf_pages=2, num_queries=10, batch_size=64, dimension=32)
+    assert set(results['stages']) == {'extraction', 'extraction_cached', 'extraction_pdfplumber', 'chunking', 'dedup',
+                                      'embedding', 'index_add', 'search', 'search_batch', 'retrieval', 'summarization', 'answer', 'answer_extractive',
+                                      'answer_cached'}
+    assert results['stages']['embedding']['count'] == 300
+    assert results['stages']['search']['operations'] == 10
+    assert results['peak_rss_mb'] > 0
+    json.dumps(results)
+
+def test_compare_flags_regressions():
+    baseline = {'stages': {'search': {'mean_ms': 2.0, 'p50_ms': 2.0, 'p95_ms': 3.0, 'p99_ms': 4.0, 'throughput_per_second': 500.0},
+                           'tiny': {'mean_ms': 0.01, 'p50_ms': 0.01, 'p95_ms': 0.01, 'p99_ms': 0.01, 'throughput_per_second': 1e5}},
+                'peak_rss_mb': 100.0}
+    current = {'stages': {'search': {'mean_ms': 2.1, 'p50_ms': 2.1, 'p95_ms': 4.0, 'p99_ms': 4.1, 'throughput_per_second': 400.0},
+                          'tiny': {'mean_ms': 0.05, 'p50_ms': 0.05, 'p95_ms': 0.05, 'p99_ms': 0.05, 'throughput_per_second': 2e4}},
+               'peak_rss_mb': 105.0}
+    regressions = compare_results(current, baseline, threshold=0.1)
+    assert {(r['stage'], r['metric']) for r in regressions} == {('search', 'p95_ms'), ('search', 'throughput_per_second')}
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from chunker import WhitespaceTokenizer, chunk_token_limit, iter_token_chunks, tokenize_pages
+
+
+def chunk(pages, max_tokens, overlap):
+    tokenized = tokenize_pages([{'page': i, 'text': text} for i, text in enumerate(pages, 1)], WhitespaceTokenizer(),
+                               batch_pages=2)
+    return list(iter_token_chunks(tokenized, max_tokens, overlap))
+
+def test_chunks_fill_limit_and_cross_pages():
+    pages = [" ".join(f"p1w{i}" for i in range(5)), "", " ".join(f"p3w{i}" for i in range(7))]
+    chunks = chunk(pages, max_tokens=4, overlap=1)
+    assert [len(c['text'].split()) for c in chunks] == [4, 4, 4, 4]
+    assert chunks[0]['text'] == "p1w0 p1w1 p1w2 p1w3"
+    assert (chunks[1]['page'], chunks[1]['page_end']) == (1, 3)
+    assert chunks[1]['text'] == "p1w3 p1w4 p3w0 p3w1"
+    # The last chunk is shifted back to end at the last token instead of leaving a short tail.
+    assert chunks[-1]['text'] == "p3w3 p3w4 p3w5 p3w6"
+    assert [c['chunk_id'] for c in chunks] == [0, 1, 2, 3]
+
+def test_short_document_is_one_chunk():
+    chunks = chunk(["alpha beta", "gamma"], max_tokens=10, overlap=2)
+    assert chunks == [{'page': 1, 'page_end': 2, 'text': "alpha beta gamma", 'chunk_id': 0}]
+    assert chunk([], max_tokens=10, overlap=2) == []
+
+def test_every_token_is_covered():
+    words = [f"w{i}" for i in range(103)]
+    pages = [" ".join(words[i:i + 9]) for i in range(0, len(words), 9)]
+    chunks = chunk(pages, max_tokens=16, overlap=4)
+    covered = {word for c in chunks for word in c['text'].split()}
+    assert covered == set(words)
+    assert all(len(c['text'].split()) == 16 for c in chunks)
+
+def test_limit_and_overlap_validation():
+    tokenizer = WhitespaceTokenizer(model_max_length=256)
+    assert chunk_token_limit(tokenizer) == 254
+    assert chunk_token_limit(tokenizer, 100) == 100
+    assert chunk_token_limit(tokenizer, 1000) == 254
+    with pytest.raises(ValueError):
+        chunk(["a b c"], max_tokens=4, overlap=4)
+    with pytest.raises(ValueError, match="smaller than the chunk size"):
+        chunk_token_limit(tokenizer, 20, overlap=32)
+    with pytest.raises(ValueError, match="sequence length of 30"):
+        chunk_token_limit(WhitespaceTokenizer(model_max_length=32), overlap=32)
+
+def test_config_rejects_overlap_not_smaller_than_chunk_size():
+    env = {**os.environ, 'CHUNK_TOKENS': '20', 'CHUNK_OVERLAP': '32'}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', 'import config'], cwd=root, env=env, capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "CHUNK_OVERLAP (32) must be smaller than CHUNK_TOKENS (20)" in result.stderr
+
+def test_offsets_are_batched_arrays():
+    pages = list(tokenize_pages([{'page': 1, 'text': "ab  cd"}], WhitespaceTokenizer()))
+    assert np.array_equal(pages[0]['offsets'], [[0, 2], [4, 6]])
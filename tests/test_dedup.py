@@ -0,0 +1,54 @@
+import numpy as np
+from dedup import Deduplicator, minhash_signature
+
+
+TOPICS = ["graphs", "proteins", "markets", "galaxies", "languages", "soils", "viruses", "glaciers"]
+
+def make_pages(count):
+    return [{'page': i, 'text': f"Journal of Examples, Vol. 12\nThis section studies {TOPICS[i - 1]}.\n"
+                                f"Results for {TOPICS[i - 1]} follow.\nLicensed under CC-BY 4.0\n{i}"}
+            for i in range(1, count + 1)]
+
+def test_strip_pages_removes_running_headers_footers_and_page_numbers():
+    dedup = Deduplicator()
+    pages = dedup.strip_pages(make_pages(6))
+    assert pages[0]['text'] == "This section studies graphs.\nResults for graphs follow."
+    assert pages[5]['text'] == "This section studies soils.\nResults for soils follow."
+    assert dedup.boilerplate_lines == 18
+
+def test_strip_pages_keeps_rare_lines_and_small_blocks():
+    dedup = Deduplicator()
+    assert dedup.strip_pages(make_pages(2)) == [{**page, 'text': page['text'].rsplit('\n', 1)[0]}
+                                                for page in make_pages(2)]
+    single_line = [{'page': i, 'text': f"Page {i}"} for i in range(1, 6)]
+    assert dedup.strip_pages(single_line) == single_line
+
+def test_iter_pages_uses_page_number_blocks():
+    dedup = Deduplicator()
+    streamed = list(dedup.iter_pages(iter(make_pages(8)), block_pages=4))
+    expected = Deduplicator().strip_pages(make_pages(8)[:4]) + Deduplicator().strip_pages(make_pages(8)[4:])
+    assert streamed == expected
+
+def test_filter_chunks_drops_near_duplicates_within_a_document():
+    base = " ".join(f"word{i}" for i in range(200))
+    near = base.replace("word100", "changed")
+    other = " ".join(f"other{i}" for i in range(200))
+    tail = " ".join(f"tail{i}" for i in range(200))
+    chunks = [{'page': 1, 'text': text, 'chunk_id': i} for i, text in enumerate([base, other, near, base, tail])]
+    dedup = Deduplicator(threshold=0.8)
+    kept = list(dedup.filter_chunks(chunks))
+    assert [c['text'] for c in kept] == [base, other, tail]
+    assert [c['chunk_id'] for c in kept] == [0, 1, 2]
+    assert dedup.duplicate_chunks == 2
+    # A new document starts with an empty LSH index.
+    assert len(list(dedup.filter_chunks(chunks[:1]))) == 1
+    assert len(list(Deduplicator(threshold=0).filter_chunks(chunks))) == 5
+    # The last chunk of a document is kept even when it nearly duplicates an earlier one.
+    assert [c['text'] for c in dedup.filter_chunks(chunks[:4])] == [base, other, base]
+
+def test_minhash_estimates_jaccard():
+    a = " ".join(f"w{i}" for i in range(300))
+    b = " ".join(f"w{i}" for i in range(150, 450))
+    estimate = np.mean(minhash_signature(a) == minhash_signature(b))
+    assert 0.2 < estimate < 0.5
+    assert (minhash_signature(a) == minhash_signature(a.upper())).all()
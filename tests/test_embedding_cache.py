@@ -0,0 +1,31 @@
+import numpy as np
+from embedding_cache import EmbeddingCache, cache_key
+
+
+def test_cache_key_normalizes_whitespace():
+    assert cache_key("model", "some  text\n") == cache_key("model", "some text")
+    assert cache_key("model", "some text") != cache_key("other-model", "some text")
+
+def test_save_and_reload(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model")
+    keys = [cache_key("model", t) for t in ["a", "b"]]
+    cache.put_many(keys, np.array([[1, 2], [3, 4]], dtype="float32"))
+    cache.save()
+    reloaded = EmbeddingCache(str(tmp_path), "model")
+    assert len(reloaded) == 2
+    hit, miss = reloaded.get_many([keys[1], cache_key("model", "c")])
+    assert hit.tolist() == [3, 4]
+    assert miss is None
+    assert (reloaded.hits, reloaded.misses) == (1, 1)
+
+def test_eviction_keeps_recently_used(tmp_path):
+    row_bytes = 2 * 4 + 20 + 8
+    cache = EmbeddingCache(str(tmp_path), "model", max_bytes=2 * row_bytes)
+    keys = [cache_key("model", t) for t in ["a", "b", "c"]]
+    cache.put_many(keys[:2], np.zeros((2, 2), dtype="float32"))
+    cache.save()
+    cache.get_many([keys[0]])
+    cache.put_many(keys[2:], np.ones((1, 2), dtype="float32"))
+    cache.save()
+    assert len(cache) == 2
+    assert [v is not None for v in cache.get_many(keys)] == [True, False, True]
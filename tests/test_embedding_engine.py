@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from embedding_engine import EmbeddingEngine, length_batches
+
+
+@pytest.fixture
+def texts():
+    rng = np.random.default_rng(0)
+    return [" ".join(f"word{i}" for i in range(n)) for n in rng.integers(1, 40, size=50)]
+
+def test_length_batches_fit_budget():
+    lengths = np.array([5, 30, 12, 30, 2, 7])
+    batches = length_batches(lengths, batch_tokens=60)
+    assert sorted(np.concatenate(batches).tolist()) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) * lengths[batch].max() <= 60
+    assert batches[0].tolist() == [1, 3]
+    assert len(batches[-1]) > len(batches[0])
+    assert [len(batch) for batch in length_batches(lengths, batch_tokens=1)] == [1] * len(lengths)
+
+def test_encode_restores_input_order(fake_embedder, texts):
+    engine = EmbeddingEngine(batch_tokens=100)
+    embeddings = engine.encode(texts)
+    assert len(fake_embedder.encode_calls) > 1
+    assert np.array_equal(embeddings, fake_embedder.encode(texts))
+
+def test_worker_pool_matches_serial(fake_embedder, texts):
+    engine = EmbeddingEngine(workers=2, threads=1, batch_tokens=100)
+    try:
+        assert np.array_equal(engine.encode(texts), EmbeddingEngine(batch_tokens=100).encode(texts))
+    finally:
+        engine.close()
+    assert engine._executor is None
+
+def test_backend_selection():
+    assert EmbeddingEngine('model').cache_name == 'model'
+    assert EmbeddingEngine('model', backend='onnx-int8').cache_name == 'model-onnx-int8'
+    with pytest.raises(ValueError):
+        EmbeddingEngine('model', backend='tensorrt')
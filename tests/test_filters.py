@@ -0,0 +1,38 @@
+import faiss
+import numpy as np
+import pytest
+from filters import MetadataIndex, id_selector, validate_filter
+
+
+@pytest.fixture
+def metadata_index():
+    metadatas = [{"source": "a.pdf", "page": 1}, {"source": "a.pdf", "page": 2, "page_end": 4},
+                 {"source": "b.pdf", "page": 3, "section": "intro"}, {"source": "b.pdf", "page": 5, "section": "results"},
+                 {"page": 3}]
+    documents = {"a.pdf": {"ids": [[0, 2]]}, "b.pdf": {"ids": [[2, 4]]}}
+    return MetadataIndex(metadatas, documents)
+
+def test_validate_filter():
+    assert validate_filter({"source": ["a.pdf"], "pages": [1, 3]}) == {"source": ["a.pdf"], "pages": [1, 3]}
+    for bad in ([], {"source": 1}, {"pages": [3, 1]}, {"pages": [1, 2, 3]}, {"pages": "1"}):
+        with pytest.raises(ValueError):
+            validate_filter(bad)
+
+def test_select_combines_conditions(metadata_index):
+    assert metadata_index.select({"source": "a.pdf"}).tolist() == [0, 1]
+    assert metadata_index.select({"source": ["a.pdf", "b.pdf"]}).tolist() == [0, 1, 2, 3]
+    # Chunks spanning several pages match any page they overlap.
+    assert metadata_index.select({"pages": 3}).tolist() == [1, 2, 4]
+    assert metadata_index.select({"source": "b.pdf", "pages": [3, 5]}).tolist() == [2, 3]
+    assert metadata_index.select({"section": ["results"]}).tolist() == [3]
+    assert metadata_index.select({"source": "missing.pdf"}).tolist() == []
+
+def test_select_skips_removed(metadata_index):
+    metadata_index.removed = {1, 2}
+    assert metadata_index.select({"pages": [1, 5]}).tolist() == [0, 3, 4]
+
+@pytest.mark.parametrize('ids', [[3, 4, 5, 6], [0, 2, 9, 17]])
+def test_id_selector_accepts_exactly_ids(ids):
+    selector = id_selector(np.array(ids, dtype=np.int64))
+    assert isinstance(selector, faiss.IDSelectorRange if ids == [3, 4, 5, 6] else faiss.IDSelectorBitmap)
+    assert [i for i in range(25) if selector.is_member(i)] == ids
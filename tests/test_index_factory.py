@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from index_factory import (bytes_per_vector, create_index, exact_rerank, factory_string, index_type_of,
+                           min_training_vectors, precision_of, recall_latency_report, search_parameters,
+                           storage_report)
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).random((10000, 16), dtype=np.float32)
+
+def test_factory_strings():
+    assert factory_string('flat', 384, 10) == 'Flat'
+    assert factory_string('ivf', 384, 10000) == 'IVF256,Flat'
+    assert factory_string('ivfpq', 384, 10000) == 'IVF256,PQ48'
+    assert factory_string('hnsw', 384, 10).startswith('HNSW')
+    with pytest.raises(ValueError):
+        factory_string('lsh', 384, 10)
+
+def test_precision_factory_strings():
+    assert factory_string('flat', 384, 10, 'fp16') == 'SQfp16'
+    assert factory_string('flat', 384, 10, 'pq') == 'PQ48'
+    assert factory_string('ivf', 384, 10000, 'int8') == 'IVF256,SQ8'
+    assert factory_string('hnsw', 384, 10, 'int8').endswith('_SQ8')
+    assert factory_string('ivfpq', 384, 10000, 'fp16') == 'IVF256,PQ48'
+    assert min_training_vectors('flat', 10, 'fp16') == 0
+    assert min_training_vectors('flat', 10, 'pq') > min_training_vectors('flat', 10, 'int8') > 0
+    with pytest.raises(ValueError):
+        factory_string('flat', 384, 10, 'int4')
+
+@pytest.mark.parametrize('index_type', ['flat', 'ivf', 'hnsw'])
+@pytest.mark.parametrize('precision', ['fp16', 'int8', 'pq'])
+def test_create_with_precision(index_type, precision, vectors):
+    index = create_index(index_type, vectors, np.arange(len(vectors)), precision)
+    assert index_type_of(index) == ('ivfpq' if (index_type, precision) == ('ivf', 'pq') else index_type)
+    assert precision_of(index) == precision
+    assert bytes_per_vector(index) < bytes_per_vector(create_index(index_type, vectors, np.arange(len(vectors))))
+
+def test_exact_rerank_orders_candidates():
+    queries = np.zeros((1, 2), dtype=np.float32)
+    candidate_ids = np.array([[7, 3, -1]])
+    candidate_vectors = np.array([[[2, 0], [1, 0], [0, 0]]], dtype=np.float32)
+    distances, ids = exact_rerank(queries, candidate_ids, candidate_vectors, 3)
+    assert ids.tolist() == [[3, 7, -1]]
+    assert distances[0, :2].tolist() == [1.0, 4.0]
+
+def test_storage_report(vectors):
+    rows = {row['precision']: row for row in storage_report(vectors, vectors[:20], top_k=5)}
+    assert list(rows) == ['fp32', 'fp16', 'int8', 'pq']
+    assert rows['fp32']['recall_loss'] == 0.0
+    assert rows['fp32']['bytes_per_vector'] > rows['fp16']['bytes_per_vector'] > rows['int8']['bytes_per_vector']
+    assert rows['int8']['bytes_per_vector'] > rows['pq']['bytes_per_vector']
+    assert rows['pq']['reranked_recall_at_k'] >= rows['pq']['recall_at_k']
+    assert 'pq' not in {row['precision'] for row in storage_report(vectors[:100], vectors[:5], top_k=5)}
+
+@pytest.mark.parametrize('index_type', ['flat', 'ivf', 'hnsw', 'ivfpq'])
+def test_create_and_search(index_type, vectors):
+    assert len(vectors) >= min_training_vectors(index_type, len(vectors))
+    index = create_index(index_type, vectors)
+    assert index_type_of(index) == index_type
+    assert index.ntotal == len(vectors)
+    _, ids = index.search(vectors[:5], 3, params=search_parameters(index, nprobe=8, ef_search=32))
+    assert ids.shape == (5, 3)
+    if index_type != 'ivfpq':
+        assert list(ids[:, 0]) == [0, 1, 2, 3, 4]
+
+def test_recall_latency_report(vectors):
+    rows = recall_latency_report(vectors, vectors[:20], top_k=5, nprobes=(1, 32), ef_searches=(16,))
+    flat = [row for row in rows if row['index_type'] == 'flat']
+    assert flat[0]['recall_at_k'] == 1.0
+    assert {row['index_type'] for row in rows} == {'flat', 'ivf', 'hnsw', 'ivfpq'}
+    ivf = {row['params']: row['recall_at_k'] for row in rows if row['index_type'] == 'ivf'}
+    assert ivf['nprobe=32'] >= ivf['nprobe=1']
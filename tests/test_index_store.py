@@ -0,0 +1,113 @@
+import json
+import os
+import pickle
+import faiss
+import numpy as np
+import pytest
+from index_store import (FORMAT_VERSION, MANIFEST_FILE, TEXT_BLOCK_SIZE, VectorStore, migrate_pickle_index,
+                         read_exact_vectors, read_index_dir, write_index_dir)
+
+
+class LegacyIndexer:
+    """Shape of a pickled SemanticIndexer from before the directory format."""
+
+    def __init__(self, index, texts, metadata):
+        self.index = index
+        self.texts = texts
+        self.metadata = metadata
+
+@pytest.fixture
+def flat_index():
+    index = faiss.IndexFlatL2(4)
+    index.add(np.eye(4, dtype="float32")[:3])
+    return index
+
+def test_round_trip_mixed_metadata(flat_index, tmp_path):
+    texts = ["first", "second ünïcode", ""]
+    metadatas = [{"page": 1, "source": "a.pdf"}, {"page": 2, "source": "a.pdf", "extra": [1, 2]}, {"page": 3}]
+    write_index_dir(str(tmp_path / "index"), flat_index, texts, metadatas, "model")
+    manifest, index, loaded_texts, loaded_metadata = read_index_dir(str(tmp_path / "index"))
+    assert manifest["version"] == FORMAT_VERSION
+    assert manifest["metadata_columns"] == {"page": "int", "source": "json", "extra": "json"}
+    assert index.ntotal == 3
+    assert list(loaded_texts) == texts
+    assert loaded_texts[-1] == ""
+    assert list(loaded_metadata) == metadatas
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_texts_round_trip_across_blocks(compress, tmp_path):
+    count = TEXT_BLOCK_SIZE * 2 + 3
+    index = faiss.IndexFlatL2(2)
+    index.add(np.zeros((count, 2), dtype="float32"))
+    texts = [f"chunk {i} " * (i % 5) for i in range(count)]
+    path = str(tmp_path / "index")
+    write_index_dir(path, index, texts, [{}] * count, "model", removed={3}, compress_texts=compress)
+    manifest, _, loaded, _ = read_index_dir(path)
+    assert manifest["text_compression"] == ("zlib" if compress else None)
+    assert loaded[count - 1] == texts[-1]
+    assert loaded[3] == ""
+    assert list(loaded) == texts[:3] + [""] + texts[4:]
+
+def test_exact_vectors_round_trip(flat_index, tmp_path):
+    vectors = VectorStore()
+    vectors.append(np.eye(4, dtype="float32")[:2])
+    vectors.append(np.eye(4, dtype="float32")[2:3])
+    path = str(tmp_path / "index")
+    write_index_dir(path, flat_index, ["a", "b", "c"], [{}, {}, {}], "model", removed={1}, exact_vectors=vectors)
+    manifest, _, _, _ = read_index_dir(path)
+    loaded = read_exact_vectors(path, manifest)
+    assert len(loaded) == 3
+    assert loaded.take(np.array([[2, -1], [1, 0]])).tolist() == [[[0, 0, 1, 0], [0] * 4], [[0] * 4, [1, 0, 0, 0]]]
+    loaded.append(np.ones((1, 4), dtype="float32"))
+    assert loaded.take(np.array([3, 0])).tolist() == [[1] * 4, [1, 0, 0, 0]]
+
+def test_reads_version_1_directories(flat_index, tmp_path):
+    path = tmp_path / "index"
+    write_index_dir(str(path), flat_index, ["a", "b", "c"], [{}, {}, {}], "model", compress_texts=False)
+    manifest = json.loads((path / MANIFEST_FILE).read_text())
+    for key in ("text_compression", "text_block_size", "exact_vectors"):
+        del manifest[key]
+    manifest["version"] = 1
+    (path / MANIFEST_FILE).write_text(json.dumps(manifest))
+    manifest, _, texts, _ = read_index_dir(str(path))
+    assert list(texts) == ["a", "b", "c"]
+    assert read_exact_vectors(str(path), manifest) is None
+
+def test_rejects_unknown_version(flat_index, tmp_path):
+    path = tmp_path / "index"
+    write_index_dir(str(path), flat_index, ["a", "b", "c"], [{}, {}, {}], "model")
+    manifest = json.loads((path / MANIFEST_FILE).read_text())
+    manifest["version"] = FORMAT_VERSION + 1
+    (path / MANIFEST_FILE).write_text(json.dumps(manifest))
+    with pytest.raises(ValueError):
+        read_index_dir(str(path))
+
+def test_migrate_pickle_index(flat_index, tmp_path):
+    pkl_path = tmp_path / "index.pkl"
+    with open(pkl_path, "wb") as f:
+        pickle.dump(LegacyIndexer(flat_index, ["a", "b", "c"], [{"page": 1}, {"page": 2}, {"page": 3}]), f)
+    assert migrate_pickle_index(str(pkl_path), str(tmp_path / "index")) == 3
+    _, index, texts, metadata = read_index_dir(str(tmp_path / "index"))
+    assert index.ntotal == 3
+    assert list(texts) == ["a", "b", "c"]
+    assert metadata[1] == {"page": 2}
+    assert not os.path.exists(str(tmp_path / "index.tmp"))
+
+def test_never_replaces_a_path_that_is_not_an_index(flat_index, tmp_path):
+    papers = tmp_path / "papers"
+    papers.mkdir()
+    (papers / "paper.pdf").write_bytes(b"%PDF-1.4")
+    notes = tmp_path / "notes.txt"
+    notes.write_text("keep me")
+    for path in (papers, notes):
+        with pytest.raises(ValueError, match="not an index"):
+            write_index_dir(str(path), flat_index, ["a", "b", "c"], [{}, {}, {}], "model")
+    assert (papers / "paper.pdf").read_bytes() == b"%PDF-1.4" and notes.read_text() == "keep me"
+
+    (tmp_path / "empty").mkdir()
+    legacy = tmp_path / "index.pkl"
+    legacy.write_bytes(pickle.dumps(["legacy"], protocol=2))
+    for path in (tmp_path / "empty", legacy, papers.with_name("index")):
+        write_index_dir(str(path), flat_index, ["a", "b", "c"], [{}, {}, {}], "model")
+        write_index_dir(str(path), flat_index, ["a", "b", "c"], [{}, {}, {}], "model")
+        assert os.path.isfile(os.path.join(str(path), MANIFEST_FILE))
@@ -1,15 +1,10 @@
 import os
 import tempfile
+import faiss
+import numpy as np
 import pytest
 from indexer import SemanticIndexer
 
-@pytest.fixture
-def sample_texts():
-    return ["This is a test.", "Another test sentence.", "More text data."]
-
-@pytest.fixture
-def sample_metadatas():
-    return [{"page": 1}, {"page": 2}, {"page": 3}]
 
 def test_build_and_search(sample_texts, sample_metadatas):
     indexer = SemanticIndexer()
@@ -23,12 +18,247 @@ def test_build_and_search(sample_texts, sample_metadatas):
 def test_save_and_load(sample_texts, sample_metadatas):
     indexer = SemanticIndexer()
     indexer.build_index(sample_texts, sample_metadatas)
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        path = tmp.name
-    indexer.save(path)
-    loaded_indexer = SemanticIndexer.load(path)
-    os.remove(path)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "index")
+        indexer.save(path)
+        loaded_indexer = SemanticIndexer.load(path)
     assert loaded_indexer.texts == sample_texts
     assert loaded_indexer.metadata == sample_metadatas
     results = loaded_indexer.search("test", top_k=2)
     assert len(results) == 2
+
+def test_add_stream_batches(fake_indexer, sample_texts, sample_metadatas):
+    batches = []
+    added = fake_indexer.add_stream(zip(sample_texts, sample_metadatas), batch_size=2,
+                                    on_batch=lambda n, encode_s, add_s: batches.append(n))
+    assert added == 3
+    assert batches == [2, 1]
+    assert fake_indexer.model.encode_calls == [sample_texts[:2], sample_texts[2:]]
+    assert fake_indexer.index.ntotal == 3
+    assert fake_indexer.texts == sample_texts
+    assert fake_indexer.metadata == sample_metadatas
+
+def test_encode_uses_cache_and_dedupes(fake_embedder, tmp_path):
+    from embedding_cache import EmbeddingCache
+    indexer = SemanticIndexer(cache=EmbeddingCache(str(tmp_path), "fake"))
+    first = indexer.encode(["same text", "same text", "other"])
+    indexer.cache.save()
+    second = indexer.encode(["other", "new text"])
+    assert indexer.model.encode_calls == [["same text", "other"], ["new text"]]
+    assert np.array_equal(first[0], first[1])
+    assert np.array_equal(first[2], second[0])
+    assert indexer.cache.hits == 1
+
+def test_load_is_lazy_and_appendable(fake_indexer, sample_texts, sample_metadatas, tmp_path):
+    fake_indexer.build_index(sample_texts, sample_metadatas)
+    path = str(tmp_path / "index")
+    fake_indexer.save(path)
+    loaded = SemanticIndexer.load(path, mmap=False)
+    loaded.add_texts(["Appended text."], [{"page": 4, "source": "b.pdf"}])
+    loaded.save(path)
+    reloaded = SemanticIndexer.load(path)
+    assert reloaded.texts == sample_texts + ["Appended text."]
+    assert reloaded.metadata == sample_metadatas + [{"page": 4, "source": "b.pdf"}]
+    assert reloaded.index.ntotal == 4
+    assert reloaded.search("Appended text.", top_k=1)[0][1] == "Appended text."
+
+def test_flat_index_upgrades_once_trainable():
+    from index_factory import index_type_of, min_training_vectors
+    vectors = np.random.default_rng(0).random((1000, 8), dtype=np.float32)
+    threshold = min_training_vectors('ivf', len(vectors))
+    indexer = SemanticIndexer(index_type='ivf')
+    indexer._add_embeddings(vectors[:100], 0)
+    assert index_type_of(indexer.index) == 'flat'
+    indexer._add_embeddings(vectors[100:threshold], 100)
+    assert index_type_of(indexer.index) == 'ivf'
+    indexer._add_embeddings(vectors[threshold:], threshold)
+    assert indexer.index.ntotal == len(vectors)
+    _, ids = indexer.index.search(vectors[:1], 1, params=faiss.SearchParametersIVF(nprobe=64))
+    assert ids[0][0] == 0
+
+def test_search_batch_matches_search(fake_indexer, sample_texts, sample_metadatas):
+    fake_indexer.build_index(sample_texts, sample_metadatas)
+    fake_indexer.model.encode_calls.clear()
+    batched = fake_indexer.search_batch(["test", "More text data."], top_k=2)
+    assert fake_indexer.model.encode_calls == [["test", "More text data."]]
+    assert [[text for _, text, _ in results] for results in batched] == [
+        [text for _, text, _ in fake_indexer.search(query, top_k=2)] for query in ["test", "More text data."]
+    ]
+
+@pytest.mark.parametrize('index_type', ['flat', 'hnsw'])
+def test_remove_document_keeps_other_ids(monkeypatch, fake_embedder, sample_texts, tmp_path, index_type):
+    monkeypatch.setattr("indexer.COMPACT_REMOVED_FRACTION", 1.0)
+    indexer = SemanticIndexer(index_type=index_type)
+    metadatas = [{"source": "a.pdf", "page": 1}, {"source": "b.pdf", "page": 1}, {"source": "a.pdf", "page": 2}]
+    indexer.build_index(sample_texts, metadatas)
+    assert indexer.documents["a.pdf"]["ids"] == [[0, 1], [2, 3]]
+    assert indexer.remove_document("a.pdf") == 2
+    assert indexer.index.ntotal == 1
+    assert [text for _, text, _ in indexer.search("test", top_k=3)] == [sample_texts[1]]
+    with pytest.raises(ValueError):
+        indexer.remove_document("a.pdf")
+
+    path = str(tmp_path / "index")
+    indexer.save(path)
+    loaded = SemanticIndexer.load(path, mmap=False)
+    assert list(loaded.documents) == ["b.pdf"]
+    assert loaded.texts == ["", sample_texts[1], ""]
+    loaded.add_texts(["Appended text."], [{"source": "c.pdf", "page": 1}])
+    assert loaded.documents["c.pdf"]["ids"] == [[3, 4]]
+    assert loaded.search("Appended text.", top_k=1)[0][1] == "Appended text."
+
+@pytest.mark.parametrize('index_type', ['flat', 'ivf'])
+def test_save_compacts_removed_rows_past_threshold(monkeypatch, fake_embedder, tmp_path, index_type):
+    monkeypatch.setattr("indexer.COMPACT_REMOVED_FRACTION", 0.5)
+    texts = [f"chunk {i} " + "word " * (i % 7) for i in range(600)]
+    metadatas = [{"source": ["a.pdf", "b.pdf", "c.pdf"][i % 3], "page": i} for i in range(600)]
+    indexer = SemanticIndexer(index_type=index_type)
+    indexer.build_index(texts, metadatas)
+    path = str(tmp_path / "index")
+
+    indexer.remove_document("a.pdf")
+    indexer.save(path)
+    loaded = SemanticIndexer.load(path, mmap=False)
+    assert len(loaded.texts) == 600 and loaded._removed == set(range(0, 600, 3))
+    version = loaded.index_version
+
+    loaded.remove_document("b.pdf")
+    loaded.save(path)
+    assert loaded.index_version != version
+    compacted = SemanticIndexer.load(path, mmap=False)
+    assert len(compacted.texts) == compacted.index.ntotal == 200 and not compacted._removed
+    assert compacted.documents["c.pdf"]["ids"] == [[0, 200]]
+    assert list(compacted.texts) == texts[2::3]
+    assert [row["page"] for row in compacted.metadata] == list(range(2, 600, 3))
+    results = compacted.search(texts[5], top_k=1, filter={"pages": 5})
+    assert [text for _, text, _ in results] == [texts[5]]
+    compacted.add_texts(["Appended text."], [{"source": "d.pdf", "page": 1}])
+    assert compacted.documents["d.pdf"]["ids"] == [[200, 201]]
+
+def test_legacy_plain_index_gains_ids(fake_indexer, sample_texts, sample_metadatas):
+    fake_indexer.build_index(sample_texts, sample_metadatas)
+    vectors = fake_indexer.index.reconstruct_n(0, 3)
+    fake_indexer.index = faiss.IndexFlatL2(vectors.shape[1])
+    fake_indexer.index.add(vectors)
+    fake_indexer.remove_ids(np.array([0]))
+    assert isinstance(fake_indexer.index, faiss.IndexIDMap2)
+    assert sorted(text for _, text, _ in fake_indexer.search("test", top_k=3)) == sorted(sample_texts[1:])
+
+def test_compressed_index_reranks_from_exact_vectors(tmp_path):
+    from index_factory import precision_of
+    vectors = np.random.default_rng(0).random((500, 16), dtype=np.float32)
+    exact = SemanticIndexer(precision='fp32')
+    exact._add_embeddings(vectors, 0)
+    indexer = SemanticIndexer(precision='fp16', rerank_factor=3)
+    indexer._add_embeddings(vectors[:200], 0)
+    indexer._add_embeddings(vectors[200:], 200)
+    indexer.texts = [str(i) for i in range(len(vectors))]
+    indexer.metadata = [{}] * len(vectors)
+    assert precision_of(indexer.index) == 'fp16'
+    expected_distances, expected_ids = exact.search_vectors(vectors[:10], top_k=5)
+    distances, ids = indexer.search_vectors(vectors[:10], top_k=5)
+    assert (ids == expected_ids).all()
+    assert np.allclose(distances, expected_distances, atol=1e-5)
+
+    path = str(tmp_path / "index")
+    indexer.save(path)
+    loaded = SemanticIndexer.load(path)
+    assert (loaded.precision, loaded.rerank_factor) == ('fp16', 3)
+    assert len(loaded.exact_vectors) == len(vectors)
+    assert (loaded.search_vectors(vectors[:10], top_k=5)[1] == expected_ids).all()
+
+def test_change_precision_rebuilds_from_exact_vectors():
+    from index_factory import MIN_SQ8_TRAINING_VECTORS, precision_of
+    vectors = np.random.default_rng(1).random((MIN_SQ8_TRAINING_VECTORS + 10, 8), dtype=np.float32)
+    indexer = SemanticIndexer(precision='int8', rerank_factor=2)
+    indexer._add_embeddings(vectors[:100], 0)
+    assert precision_of(indexer.index) == 'fp32'
+    indexer._add_embeddings(vectors[100:], 100)
+    assert precision_of(indexer.index) == 'int8'
+    indexer.change_index_type('hnsw', 'fp16')
+    assert precision_of(indexer.index) == 'fp16'
+    _, rebuilt = indexer._stored_vectors()
+    assert np.array_equal(rebuilt, vectors)
+    with pytest.raises(ValueError):
+        indexer.change_index_type('flat', 'fp8')
+
+def _filtered_indexer(index_type, num_vectors=2000):
+    vectors = np.random.default_rng(2).random((num_vectors, 8), dtype=np.float32)
+    metadatas = [{"source": f"{i % 4}.pdf", "page": i // 4 + 1} for i in range(num_vectors)]
+    indexer = SemanticIndexer(index_type=index_type)
+    indexer._extend(vectors, [str(i) for i in range(num_vectors)], metadatas)
+    return indexer, vectors
+
+@pytest.mark.parametrize('index_type', ['flat', 'hnsw', 'ivf'])
+def test_filtered_search_exact_and_selector_paths(monkeypatch, index_type):
+    import indexer as indexer_module
+    from index_factory import index_type_of
+    indexer, vectors = _filtered_indexer(index_type)
+    assert index_type_of(indexer.index) == index_type
+    query_filter = {"source": ["1.pdf", "2.pdf"], "pages": [100, 400]}
+    selected = np.array([i for i in range(len(vectors)) if i % 4 in (1, 2) and 100 <= i // 4 + 1 <= 400])
+    truth = np.argsort(((vectors[selected][None] - vectors[:5, None]) ** 2).sum(axis=2), axis=1)[:, :5]
+    expected = selected[truth]
+
+    _, exact_ids = indexer.search_vectors(vectors[:5], top_k=5, filter=query_filter)
+    assert (exact_ids == expected).all()
+    monkeypatch.setattr(indexer_module, 'EXACT_SEARCH_MAX_IDS', 0)
+    _, selector_ids = indexer.search_vectors(vectors[:5], top_k=5, nprobe=1024, ef_search=256, filter=query_filter)
+    assert np.isin(selector_ids, selected).all()
+    if index_type != 'hnsw':
+        assert (selector_ids == expected).all()
+
+def test_filtered_search_skips_removed_and_survives_save(fake_embedder, sample_texts, tmp_path):
+    indexer = SemanticIndexer()
+    metadatas = [{"source": "a.pdf", "page": 1}, {"source": "b.pdf", "page": 1}, {"source": "a.pdf", "page": 2}]
+    indexer.build_index(sample_texts, metadatas)
+    results = indexer.search("test", top_k=3, filter={"source": "a.pdf"})
+    assert sorted(text for _, text, _ in results) == sorted([sample_texts[0], sample_texts[2]])
+    assert [text for _, text, _ in indexer.search("test", top_k=3, filter={"pages": 2})] == [sample_texts[2]]
+    indexer.remove_document("a.pdf")
+    assert [text for _, text, _ in indexer.search("test", top_k=3, filter={"pages": [1, 2]})] == [sample_texts[1]]
+
+    path = str(tmp_path / "index")
+    indexer.save(path)
+    loaded = SemanticIndexer.load(path)
+    assert [text for _, text, _ in loaded.search("test", top_k=3, filter={"pages": [1, 2]})] == [sample_texts[1]]
+    assert loaded.search("test", top_k=3, filter={"source": "a.pdf"}) == []
+    loaded.add_texts(["Appended text."], [{"source": "c.pdf", "page": 7}])
+    assert [text for _, text, _ in loaded.search("test", filter={"source": "c.pdf"})] == ["Appended text."]
+
+def test_query_embeddings_are_cached(fake_indexer, sample_texts, sample_metadatas):
+    fake_indexer.build_index(sample_texts, sample_metadatas)
+    fake_indexer.model.encode_calls.clear()
+    first = fake_indexer.search("test  query", top_k=2)
+    assert fake_indexer.search_batch(["test query", "other"], top_k=2)[0] == first
+    assert fake_indexer.model.encode_calls == [["test  query"], ["other"]]
+    assert fake_indexer.query_cache.stats()["hits"] == 1
+
+def test_index_version_changes_with_index_and_survives_save(fake_indexer, sample_texts, sample_metadatas, tmp_path):
+    fake_indexer.build_index(sample_texts, sample_metadatas)
+    version = fake_indexer.index_version
+    fake_indexer.search("test", top_k=1)
+    assert fake_indexer.index_version == version
+    fake_indexer.add_texts(["Appended text."], [{"page": 4, "source": "b.pdf"}])
+    assert fake_indexer.index_version != version
+    path = str(tmp_path / "index")
+    fake_indexer.save(path)
+    loaded = SemanticIndexer.load(path, mmap=False)
+    assert loaded.index_version == fake_indexer.index_version
+    loaded.remove_document("b.pdf")
+    assert loaded.index_version != fake_indexer.index_version
+
+@pytest.mark.parametrize('exact_max_ids', [16384, 0])
+def test_selective_filter_on_ivf_returns_top_k(monkeypatch, tmp_path, exact_max_ids):
+    import indexer as indexer_module
+    vectors = np.random.default_rng(3).random((20000, 16), dtype=np.float32)
+    metadatas = [{"source": "a.pdf" if 5000 <= i < 5050 else "b.pdf", "page": 1} for i in range(len(vectors))]
+    indexer = SemanticIndexer(index_type='ivf')
+    indexer._extend(vectors, [str(i) for i in range(len(vectors))], metadatas)
+    # Simulate an index saved before IVF indexes kept a direct map.
+    faiss.extract_index_ivf(indexer.index).set_direct_map_type(faiss.DirectMap.NoMap)
+    indexer.save(str(tmp_path / "index"))
+    monkeypatch.setattr(indexer_module, 'EXACT_SEARCH_MAX_IDS', exact_max_ids)
+    for searched in (SemanticIndexer.load(str(tmp_path / "index")), indexer):
+        _, ids = searched.search_vectors(vectors[:20], top_k=5, filter={"source": "a.pdf"})
+        assert ((ids >= 5000) & (ids < 5050)).sum(axis=1).tolist() == [5] * 20
@@ -0,0 +1,133 @@
+import os
+import pytest
+from ingest import IngestStats, document_source, ingest_pdfs, plan_tasks, stream_chunks, update_documents
+
+pytestmark = pytest.mark.usefixtures('fake_tokenizer')
+
+
+@pytest.fixture
+def sample_pdfs(tmp_path, write_pdf):
+    first = write_pdf(tmp_path / "first.pdf", [f"First document page {i}" for i in range(1, 6)])
+    second = write_pdf(tmp_path / "second.pdf", ["Second document page 1", "Second document page 2"])
+    return [first, second]
+
+def test_plan_tasks_splits_page_ranges(sample_pdfs):
+    assert plan_tasks(sample_pdfs[0], pages_per_task=2) == [
+        (sample_pdfs[0], 1, 2), (sample_pdfs[0], 3, 4), (sample_pdfs[0], 5, 5)
+    ]
+
+def test_parallel_matches_serial(sample_pdfs):
+    serial = list(ingest_pdfs(sample_pdfs, workers=1))
+    parallel = list(ingest_pdfs(sample_pdfs, workers=2, pages_per_task=2))
+    assert [r['path'] for r in parallel] == sample_pdfs
+    assert parallel == serial
+    assert [r['pages'] for r in parallel] == [5, 2]
+    # Short pages are carried into one chunk that records its page span.
+    assert parallel[0]['chunks'] == [{'page': 1, 'page_end': 5, 'chunk_id': 0, 'text': ' '.join(
+        f"First document page {i}" for i in range(1, 6))}]
+
+def test_bad_file_does_not_stop_run(sample_pdfs, tmp_path):
+    bad = tmp_path / "broken.pdf"
+    bad.write_text("not a pdf")
+    results = list(ingest_pdfs([str(bad)] + sample_pdfs, workers=2, pages_per_task=2))
+    assert results[0]['error'] is not None
+    assert results[0]['chunks'] == []
+    assert all(r['error'] is None and r['chunks'] for r in results[1:])
+
+def test_stream_chunks_matches_batch_ingest(sample_pdfs):
+    expected = [
+        (chunk['text'], {'source': os.path.abspath(result['path']), 'page': chunk['page'], 'page_end': chunk['page_end'],
+                         'chunk_id': chunk['chunk_id']})
+        for result in ingest_pdfs(sample_pdfs, workers=1) for chunk in result['chunks']
+    ]
+    serial_stats = IngestStats()
+    assert list(stream_chunks(sample_pdfs, serial_stats, workers=1)) == expected
+    assert serial_stats.pages == 7
+    assert serial_stats.chunks == len(expected)
+    parallel_stats = IngestStats()
+    assert list(stream_chunks(sample_pdfs, parallel_stats, workers=2, pages_per_task=2)) == expected
+    assert parallel_stats.chunks == len(expected)
+
+def test_stream_chunks_records_failures(sample_pdfs, tmp_path):
+    bad = tmp_path / "broken.pdf"
+    bad.write_text("not a pdf")
+    stats = IngestStats()
+    items = list(stream_chunks([str(bad), sample_pdfs[1]], stats, workers=1))
+    assert len(items) == 1 and stats.pages == 2
+    assert [path for path, _ in stats.failed] == [str(bad)]
+
+def test_update_documents_skips_unchanged_and_replaces_changed(sample_pdfs, fake_indexer, write_pdf):
+    first = update_documents(fake_indexer, sample_pdfs, IngestStats())
+    assert first['new'] == sample_pdfs and first['added'] == 2
+    second = update_documents(fake_indexer, sample_pdfs, IngestStats())
+    assert second['unchanged'] == sample_pdfs and second['added'] == 0
+    assert fake_indexer.index.ntotal == 2
+
+    write_pdf(sample_pdfs[1], ["Second document revised"])
+    third = update_documents(fake_indexer, sample_pdfs, IngestStats())
+    assert third['changed'] == [sample_pdfs[1]]
+    assert third['added'] == 1 and third['removed'] == 1
+    assert fake_indexer.index.ntotal == 2
+    results = fake_indexer.search("Second document revised", top_k=2)
+    assert "Second document revised" in [text for _, text, _ in results]
+    assert not any(text.startswith("Second document page") for _, text, _ in results)
+    assert fake_indexer.documents[document_source(sample_pdfs[1])]['ids'] == [[2, 3]]
+
+def test_update_documents_keeps_old_version_on_failure(sample_pdfs, fake_indexer):
+    update_documents(fake_indexer, sample_pdfs, IngestStats())
+    before = fake_indexer.documents[document_source(sample_pdfs[1])]
+    with open(sample_pdfs[1], 'w') as f:
+        f.write("not a pdf any more")
+    stats = IngestStats()
+    result = update_documents(fake_indexer, sample_pdfs, stats)
+    assert result['failed'] == [sample_pdfs[1]]
+    assert fake_indexer.documents[document_source(sample_pdfs[1])] == before
+    assert fake_indexer.index.ntotal == 2
+
+def test_unreadable_paths_fail_without_stopping_the_update(sample_pdfs, fake_indexer, tmp_path):
+    update_documents(fake_indexer, sample_pdfs[:1], IngestStats())
+    before = fake_indexer.documents[document_source(sample_pdfs[0])]
+    os.remove(sample_pdfs[0])
+    missing = str(tmp_path / "missing.pdf")
+    stats = IngestStats()
+    result = update_documents(fake_indexer, [missing, sample_pdfs[0], sample_pdfs[1]], stats)
+    assert result['failed'] == [missing, sample_pdfs[0]] and result['new'] == [sample_pdfs[1]]
+    assert [path for path, _ in stats.failed] == [missing, sample_pdfs[0]]
+    assert fake_indexer.documents[document_source(sample_pdfs[0])] == before
+    assert document_source(missing) not in fake_indexer.documents
+
+def test_ingest_stats_report_dedup_savings():
+    stats = IngestStats()
+    stats.add_dedup({'boilerplate_lines': 12, 'duplicate_chunks': 2, 'duplicate_chars': 1000})
+    stats.on_batch(8, encode_seconds=4.0, add_seconds=0.1)
+    stats.chunks, stats.vector_bytes = 8, 1536
+    summary = stats.summary()
+    assert summary['dedup_saved_embed_seconds'] == 1.0
+    assert summary['dedup_saved_bytes'] == 1000 + 2 * 1536
+    assert "2 near-duplicate chunks (20.0% of chunks)" in stats.format_dedup()
+
+@pytest.mark.parametrize('precision', ['fp32', 'fp16'])
+def test_dedup_savings_use_stored_vector_size(fake_embedder, tmp_path, precision, write_pdf):
+    from index_factory import bytes_per_vector
+    from indexer import SemanticIndexer
+    # Words repeat with the chunk stride, so the chunks before the tail are near-duplicates.
+    words = [f"w{i % 222}" for i in range(222 * 4)] + [f"tail{i}" for i in range(40)]
+    pdf = write_pdf(tmp_path / "repeats.pdf", [" ".join(words[i:i + 10]) for i in range(0, len(words), 10)])
+    indexer = SemanticIndexer(precision=precision)
+    stats = IngestStats()
+    update_documents(indexer, [pdf], stats)
+    assert stats.duplicate_chunks > 0
+    assert stats.vector_bytes == bytes_per_vector(indexer.index)
+    assert stats.summary()['dedup_saved_bytes'] == stats.duplicate_chars + stats.duplicate_chunks * stats.vector_bytes
+
+@pytest.mark.parametrize('num_tokens', [700, 705, 710])
+def test_last_tokens_of_a_document_are_indexed(fake_indexer, tmp_path, num_tokens, write_pdf):
+    # The tail chunk is shifted back to end at the last token and overlaps the chunk before it.
+    words = [f"tok{i}" for i in range(num_tokens)]
+    pdf = write_pdf(tmp_path / "long.pdf", [" ".join(words[i:i + 10]) for i in range(0, num_tokens, 10)])
+    stats = IngestStats()
+    update_documents(fake_indexer, [pdf], stats)
+    indexed = {word for text in fake_indexer.texts for word in text.split()}
+    assert indexed == set(words)
+    results = fake_indexer.search(words[-1], top_k=len(fake_indexer.texts), filter={"source": document_source(pdf)})
+    assert any(words[-1] in text.split() for _, text, _ in results)
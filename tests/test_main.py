@@ -1,3 +1,4 @@
+import json
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 import sys
@@ -6,8 +7,8 @@ import os
 
 
 def test_query_command():
-    with patch('main.SemanticIndexer.load') as mock_load, \
-         patch('main.ResearchAssistant') as mock_assistant_class:
+    with patch('indexer.SemanticIndexer.load') as mock_load, \
+         patch('query.ResearchAssistant') as mock_assistant_class:
         mock_indexer = Mock()
         mock_load.return_value = mock_indexer
         mock_assistant = Mock()
@@ -21,12 +22,83 @@ def test_query_command():
             from main import main
             main()
 
-        mock_load.assert_called_once_with('test.pkl')
+        mock_load.assert_called_once_with('test.pkl', mmap=True)
         mock_assistant.answer_question.assert_called_once_with('What is AI?', top_k=3)
 
 def test_query_missing_index():
-    with patch('main.SemanticIndexer.load', side_effect=FileNotFoundError):
+    with patch('indexer.SemanticIndexer.load', side_effect=FileNotFoundError):
         with patch('sys.argv', ['main.py', 'query', 'Question']):
             with pytest.raises(SystemExit):
                 from main import main
                 main()
+
+def test_query_questions_file(tmp_path, capsys):
+    questions_file = tmp_path / "q.jsonl"
+    questions_file.write_text('{"id": 1, "question": "What is AI?"}\n\n"Explain ML."\n')
+    with patch('indexer.SemanticIndexer.load'), \
+         patch('query.ResearchAssistant') as mock_assistant_class:
+        mock_assistant = Mock()
+        mock_assistant.iter_answers.side_effect = lambda questions, **kwargs: (
+            {"answer": f"Answer to {q}", "evidence": []} for q in questions
+        )
+        mock_assistant_class.return_value = mock_assistant
+        with patch('sys.argv', ['main.py', 'query', '--questions-file', str(questions_file), '--batch-size', '4']):
+            from main import main
+            main()
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert lines == [
+        {"id": 1, "question": "What is AI?", "answer": "Answer to What is AI?", "evidence": []},
+        {"question": "Explain ML.", "answer": "Answer to Explain ML.", "evidence": []},
+    ]
+    assert mock_assistant.iter_answers.call_args.kwargs == {"top_k": 5, "batch_size": 4}
+
+def test_query_questions_file_rejects_bad_line(tmp_path):
+    questions_file = tmp_path / "q.jsonl"
+    questions_file.write_text('{"id": 1}\n')
+    with patch('sys.argv', ['main.py', 'query', '--questions-file', str(questions_file)]):
+        with pytest.raises(SystemExit):
+            from main import main
+            main()
+
+def test_query_filter_options():
+    with patch('indexer.SemanticIndexer.load') as mock_load, \
+         patch('query.ResearchAssistant') as mock_assistant_class:
+        mock_load.return_value = Mock()
+        mock_assistant = Mock()
+        mock_assistant.answer_question.return_value = {"answer": "Test answer", "evidence": []}
+        mock_assistant_class.return_value = mock_assistant
+
+        with patch('sys.argv', ['main.py', 'query', 'What is AI?', '--source', 'a.pdf', '--source', 'b.pdf',
+                                '--pages', '3-7']):
+            from main import main
+            main()
+
+        mock_assistant.answer_question.assert_called_once_with(
+            'What is AI?', top_k=5, filter={'source': ['a.pdf', 'b.pdf'], 'pages': [3, 7]})
+
+    with patch('sys.argv', ['main.py', 'query', 'Question', '--pages', 'three']):
+        with pytest.raises(SystemExit):
+            main()
+
+def test_query_cache_option(tmp_path):
+    with patch('indexer.SemanticIndexer.load'), \
+         patch('query.ResearchAssistant') as mock_assistant_class, \
+         patch('query_cache.open_query_caches') as open_query_caches:
+        mock_assistant = Mock()
+        mock_assistant.answer_question.return_value = {"answer": "Test answer", "evidence": []}
+        mock_assistant_class.return_value = mock_assistant
+        with patch('sys.argv', ['main.py', 'query', 'What is AI?', '--query-cache', str(tmp_path)]):
+            from main import main
+            main()
+    open_query_caches.assert_called_once_with(mock_assistant, str(tmp_path))
+
+def test_ingest_refuses_a_directory_that_is_not_an_index(tmp_path, capsys):
+    papers = tmp_path / "papers"
+    papers.mkdir()
+    (papers / "paper.pdf").write_bytes(b"%PDF-1.4")
+    with patch('sys.argv', ['main.py', 'ingest', str(papers / "paper.pdf"), '--index-path', str(papers)]):
+        with pytest.raises(SystemExit):
+            from main import main
+            main()
+    assert "is not an index" in capsys.readouterr().out
+    assert os.listdir(papers) == ["paper.pdf"]
@@ -0,0 +1,70 @@
+import json
+import pytest
+from unittest.mock import patch
+from metrics import Instrumentation, MetricsRegistry, _NOOP, instrumentation, metrics
+from query import ResearchAssistant
+
+
+@pytest.fixture
+def enabled(tmp_path):
+    trace_path = tmp_path / "trace.jsonl"
+    instrumentation.enable(trace_path=str(trace_path))
+    yield trace_path
+    instrumentation.disable()
+
+def summarize(texts, **kwargs):
+    texts = [texts] if isinstance(texts, str) else texts
+    return [{"summary_text": f"Summary of {len(text.split())} words"} for text in texts]
+
+def test_render_prometheus():
+    registry = MetricsRegistry()
+    registry.counter('requests_total', 'Requests', ('route',)).inc(2, route='/query')
+    histogram = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+    text = registry.render_prometheus()
+    assert '# TYPE requests_total counter\nrequests_total{route="/query"} 2\n' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1\n' in text
+    assert 'latency_seconds_bucket{le="1"} 2\n' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3\n' in text
+    assert 'latency_seconds_sum 5.55\nlatency_seconds_count 3\n' in text
+    with pytest.raises(ValueError):
+        registry.gauge('requests_total', 'Requests')
+
+def test_disabled_instrumentation_records_nothing():
+    instr = Instrumentation(MetricsRegistry())
+    assert instr.stage('search') is _NOOP
+    assert instr.trace('answer') is _NOOP
+    instr.count('queries')
+    instr.cache_lookup('embedding', 3, 1)
+    assert instr.items.value(kind='queries') == 0
+    assert instr.cache_hit_rate('embedding') is None
+
+def test_query_path_stages_counts_and_trace(fake_indexer, sample_texts, sample_metadatas, enabled):
+    fake_indexer.build_index(sample_texts, sample_metadatas)
+    before = {stage: instrumentation.stage_seconds.count(stage=stage)
+              for stage in ('encode', 'search', 'lookup', 'summarize', 'answer')}
+    queries_before = instrumentation.items.value(kind='queries')
+    with patch('query.get_summarizer', return_value=summarize):
+        assistant = ResearchAssistant(fake_indexer, result_cache_size=0)
+        assistant.answer_question("test", top_k=2)
+        assistant.answer_questions(["test", "more"], top_k=2)
+
+    for stage in ('encode', 'search', 'lookup', 'summarize'):
+        assert instrumentation.stage_seconds.count(stage=stage) == before[stage] + 2
+    assert instrumentation.stage_seconds.count(stage='answer') == before['answer'] + 1
+    assert instrumentation.items.value(kind='queries') == queries_before + 3
+
+    records = [json.loads(line) for line in enabled.read_text().splitlines()]
+    assert [record['kind'] for record in records] == ['answer', 'answer_batch']
+    assert set(records[0]['stages_ms']) == {'answer', 'encode', 'search', 'lookup', 'context', 'summarize'}
+    assert records[1]['counts']['queries'] == 2
+    assert records[1]['counts']['chunks_retrieved'] == 4
+    assert 'research_assistant_stage_seconds_bucket{stage="search",le="+Inf"}' in metrics.render_prometheus()
+
+def test_cache_hit_rate():
+    instr = Instrumentation(MetricsRegistry())
+    instr.enable()
+    instr.cache_lookup('embedding', 3, 1)
+    instr.cache_lookup('embedding', 1, 3)
+    assert instr.cache_hit_rate('embedding') == 0.5
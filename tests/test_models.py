@@ -0,0 +1,50 @@
+import threading
+import time
+import pytest
+from models import ModelRegistry
+
+
+def test_loads_lazily_once_per_key():
+    calls = []
+
+    def loader(name):
+        calls.append(name)
+        time.sleep(0.05)
+        return object()
+
+    registry = ModelRegistry({'embed': loader})
+    assert calls == []
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get('embed', 'a'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == ['a']
+    assert all(model is results[0] for model in results)
+    assert registry.get('embed', 'b') is not results[0]
+    assert registry.loaded() == [('embed', 'a'), ('embed', 'b')]
+
+def test_evict_and_register():
+    registry = ModelRegistry({'embed': lambda name: object(), 'summarize': lambda name: object()})
+    first = registry.get('embed', 'a')
+    registry.get('summarize', 'a')
+    assert registry.evict(task='embed') == 1
+    assert registry.get('embed', 'a') is not first
+    stub = object()
+    registry.register('summarize', 'stub', stub)
+    assert registry.get('summarize', 'stub') is stub
+    assert registry.evict() == 3
+    with pytest.raises(ValueError):
+        registry.get('unknown', 'a')
+
+def test_embedder_backends_are_separate_models():
+    from models import get_embedder, registry
+    torch_model, onnx_model = object(), object()
+    registry.register('sentence-embedding', 'backend-test', torch_model)
+    registry.register('sentence-embedding-onnx-int8', 'backend-test', onnx_model)
+    try:
+        assert get_embedder('backend-test') is torch_model
+        assert get_embedder('backend-test', 'onnx-int8') is onnx_model
+    finally:
+        registry.evict(model_name='backend-test')
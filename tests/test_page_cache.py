@@ -0,0 +1,20 @@
+from page_cache import PageCache, cached_file_hash, file_hash
+
+
+def test_put_and_get_merge_entries(tmp_path):
+    cache = PageCache(str(tmp_path))
+    assert cache.get('abc', 'pdfium') == (None, {})
+    cache.put('abc', 'pdfium', 10, {1: 'one', 2: ''})
+    cache.put('abc', 'pdfium', 10, {5: 'five'})
+    cache.put('abc', 'pdfium', 10, {})
+    assert cache.get('abc', 'pdfium') == (10, {1: 'one', 2: '', 5: 'five'})
+    assert cache.get('abc', 'pdfplumber') == (None, {})
+    (tmp_path / 'pdfium' / 'abc' / 'broken.json.gz').write_bytes(b'not gzip')
+    assert cache.get('abc', 'pdfium')[1][5] == 'five'
+
+def test_cached_file_hash_follows_content(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"first")
+    assert cached_file_hash(str(path)) == file_hash(str(path))
+    path.write_bytes(b"second version")
+    assert cached_file_hash(str(path)) == file_hash(str(path))
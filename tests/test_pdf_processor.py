@@ -0,0 +1,59 @@
+import io
+import os
+import time
+import pytest
+import pdf_processor
+from pdf_processor import count_pdf_pages, iter_pdf_pages
+
+PAGES = [f"Page {i} text of the test document" for i in range(1, 7)]
+
+
+@pytest.fixture
+def pdf_path(tmp_path, write_pdf):
+    return write_pdf(tmp_path / "doc.pdf", PAGES)
+
+@pytest.mark.parametrize('timeout', [0, 10])
+def test_backends_extract_the_same_words(pdf_path, timeout):
+    assert count_pdf_pages(pdf_path) == len(PAGES)
+    fast = list(iter_pdf_pages(pdf_path, start_page=2, end_page=4, backend='pdfium', timeout=timeout))
+    slow = list(iter_pdf_pages(pdf_path, start_page=2, end_page=4, backend='pdfplumber', timeout=timeout))
+    assert [page['page'] for page in fast] == [2, 3, 4]
+    assert [page['text'].split() for page in fast] == [page['text'].split() for page in slow] == \
+        [text.split() for text in PAGES[1:4]]
+    with pytest.raises(ValueError):
+        list(iter_pdf_pages(pdf_path, backend='ocr'))
+
+def test_file_objects_are_extracted(pdf_path):
+    with open(pdf_path, 'rb') as f:
+        pages = list(iter_pdf_pages(io.BytesIO(f.read())))
+    assert [page['text'] for page in pages] == PAGES
+
+def _flaky_pages(pdf, page_numbers):
+    for page_num in page_numbers:
+        if page_num == 2:
+            time.sleep(30)
+        if page_num == 4:
+            os._exit(1)
+        yield page_num, f"Page {page_num}"
+
+def test_hanging_and_crashing_pages_are_skipped(pdf_path, monkeypatch):
+    monkeypatch.setattr(pdf_processor, '_pdfium_pages', _flaky_pages)
+    start = time.perf_counter()
+    pages = list(iter_pdf_pages(pdf_path, timeout=0.5))
+    assert time.perf_counter() - start < 10
+    assert [page['page'] for page in pages] == [1, 3, 5, 6]
+
+def test_pages_are_cached_by_content(pdf_path, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    assert [page['page'] for page in iter_pdf_pages(pdf_path, end_page=3, cache_dir=cache_dir)] == [1, 2, 3]
+    calls = []
+    extract_pages = pdf_processor._extract_pages
+    monkeypatch.setattr(pdf_processor, '_extract_pages',
+                        lambda pdf, page_numbers, backend: calls.append(page_numbers) or extract_pages(pdf, page_numbers, backend))
+    copy = tmp_path / "copy.pdf"
+    copy.write_bytes(open(pdf_path, 'rb').read())
+    pages = list(iter_pdf_pages(str(copy), timeout=0, cache_dir=cache_dir))
+    assert [page['text'] for page in pages] == PAGES
+    assert calls == [[4, 5, 6]]
+    assert list(iter_pdf_pages(str(copy), timeout=0, cache_dir=cache_dir)) == pages
+    assert calls == [[4, 5, 6], []]
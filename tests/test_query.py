@@ -1,6 +1,7 @@
+import numpy as np
 import pytest
 from unittest.mock import Mock, patch
-from query import ResearchAssistant
+from query import ResearchAssistant, pack_context
 
 @pytest.fixture
 def mock_indexer():
@@ -18,7 +19,7 @@ def mock_summarizer():
     return summarizer
 
 def test_answer_question(mock_indexer, mock_summarizer):
-    with patch('query.pipeline', return_value=mock_summarizer):
+    with patch('query.get_summarizer', return_value=mock_summarizer):
         assistant = ResearchAssistant(mock_indexer)
         result = assistant.answer_question("Test question", top_k=2)
         assert "answer" in result
@@ -31,3 +32,134 @@ def test_answer_question(mock_indexer, mock_summarizer):
         assert result["evidence"][1]["page"] == 2
         mock_indexer.search.assert_called_once_with("Test question", top_k=2)
         mock_summarizer.assert_called_once()
+
+def test_answer_question_passes_filter(mock_indexer, mock_summarizer):
+    with patch('query.get_summarizer', return_value=mock_summarizer):
+        assistant = ResearchAssistant(mock_indexer)
+        assistant.answer_question("Test question", top_k=2, filter={"source": "a.pdf"}, nprobe=4)
+        mock_indexer.search.assert_called_once_with("Test question", top_k=2, nprobe=4, filter={"source": "a.pdf"})
+
+def test_answer_questions_batches_calls(mock_indexer, mock_summarizer):
+    mock_indexer.search_batch.side_effect = lambda questions, top_k: [
+        [(0.1, f"Text for {q}", {"page": i})] for i, q in enumerate(questions)
+    ]
+    mock_summarizer.side_effect = lambda texts, **kwargs: [{"summary_text": f"Summary of {t}"} for t in texts]
+    with patch('query.get_summarizer', return_value=mock_summarizer):
+        assistant = ResearchAssistant(mock_indexer)
+        results = assistant.answer_questions(["Q1", "Q2", "Q3"], top_k=1, batch_size=2)
+    assert [r["answer"] for r in results] == ["Summary of Text for Q1", "Summary of Text for Q2", "Summary of Text for Q3"]
+    assert results[2]["evidence"] == [{"text": "Text for Q3", "page": 0}]
+    assert [call.args[0] for call in mock_indexer.search_batch.call_args_list] == [["Q1", "Q2"], ["Q3"]]
+    assert mock_summarizer.call_count == 2
+    mock_indexer.search.assert_not_called()
+
+class FakeTokenizer:
+    """Counts one token per word, like a Hugging Face tokenizer with a small input limit."""
+
+    model_max_length = 12
+
+    def __call__(self, texts, add_special_tokens=True):
+        return {'input_ids': [list(range(len(text.split()))) for text in texts]}
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+def test_context_is_packed_to_token_budget(mock_indexer, mock_summarizer):
+    mock_indexer.search.return_value = [
+        (0.1, "one two three four five six", {"page": 1}),
+        (0.2, "this chunk is too long to fit in the rest", {"page": 2}),
+        (0.3, "short tail", {"page": 3}),
+    ]
+    mock_summarizer.tokenizer = FakeTokenizer()
+    with patch('query.get_summarizer', return_value=mock_summarizer):
+        result = ResearchAssistant(mock_indexer).answer_question("Test question", top_k=3)
+    assert mock_summarizer.call_args.args[0] == ["one two three four five six short tail"]
+    assert [ev["page"] for ev in result["evidence"]] == [1, 3]
+
+def test_pack_context_truncates_oversized_best_chunk():
+    text, used, tokens = pack_context([(0.1, "a b c d e f g h", {"page": 1})], budget=4)
+    assert text == "a b c d"
+    assert len(used) == 1 and tokens == 4
+
+def test_distilled_mode_uses_smaller_model(mock_indexer, mock_summarizer):
+    with patch('query.get_summarizer', return_value=mock_summarizer) as get_summarizer:
+        ResearchAssistant(mock_indexer, distilled_model_name="small-model").answer_question("Q", mode="distilled")
+    get_summarizer.assert_called_once_with("small-model")
+    with pytest.raises(ValueError):
+        ResearchAssistant(mock_indexer, mode="generative")
+
+def test_extractive_mode_ranks_sentences_without_summarizer():
+    class WordEmbedder:
+        vocabulary = ["cats", "dogs", "fish"]
+        calls = []
+
+        def encode(self, texts, **kwargs):
+            self.calls.append(list(texts))
+            return np.array([[text.lower().count(word) + 0.01 for word in self.vocabulary] for text in texts])
+
+    indexer = Mock()
+    indexer.model = WordEmbedder()
+    indexer.model_name = "words"
+    indexer.encode_queries.side_effect = indexer.model.encode
+    indexer.search_embeddings.return_value = [[
+        (0.1, "Dogs bark loudly. Cats purr softly.", {"page": 1}),
+        (0.2, "Fish swim. Cats sleep a lot.", {"page": 2}),
+    ]]
+    with patch('query.get_summarizer') as get_summarizer:
+        result = ResearchAssistant(indexer, extractive_sentences=2).answer_question("cats?", top_k=2, mode="extractive")
+    get_summarizer.assert_not_called()
+    assert result["answer"] == "Cats purr softly. Cats sleep a lot."
+    assert [ev["page"] for ev in result["evidence"]] == [1, 2]
+    query_embeddings = indexer.search_embeddings.call_args.args[0]
+    assert query_embeddings.shape == (1, 3)
+
+    # Sentences of chunks retrieved again are not encoded again.
+    sentence_calls = len(indexer.model.calls)
+    assistant = ResearchAssistant(indexer, extractive_sentences=2, result_cache_size=0)
+    assistant.answer_question("cats?", top_k=2, mode="extractive")
+    assistant.answer_question("fish?", top_k=2, mode="extractive")
+    assert indexer.model.calls[sentence_calls + 1] == ["Dogs bark loudly.", "Cats purr softly.", "Fish swim.", "Cats sleep a lot."]
+    assert indexer.model.calls[sentence_calls + 2:] == [["fish?"]]
+    assert assistant.cache_stats()["sentence_embeddings"]["hits"] == 4
+
+def test_repeated_questions_are_answered_from_cache(fake_embedder, mock_summarizer):
+    from indexer import SemanticIndexer
+    indexer = SemanticIndexer()
+    indexer.build_index(["Cats purr.", "Dogs bark."], [{"page": 1}, {"page": 2}])
+    with patch('query.get_summarizer', return_value=mock_summarizer):
+        assistant = ResearchAssistant(indexer)
+        first = assistant.answer_question("What do cats do?", top_k=1)
+        assert assistant.answer_question(" What do  cats do?", top_k=1) == first
+        assert mock_summarizer.call_count == 1
+        assistant.answer_question("What do cats do?", top_k=2)
+        assistant.answer_question("What do cats do?", top_k=1, mode="extractive")
+        assert mock_summarizer.call_count == 2
+        indexer.add_texts(["Cats sleep."], [{"page": 3}])
+        assistant.answer_question("What do cats do?", top_k=1)
+        assert mock_summarizer.call_count == 3
+    stats = assistant.cache_stats()
+    assert (stats["answers"]["hits"], stats["answers"]["misses"]) == (1, 4)
+    assert stats["query_embeddings"]["hits"] == 3
+
+def test_batches_only_answer_cache_misses(mock_indexer, mock_summarizer):
+    mock_indexer.index_version = "v1"
+    mock_indexer.search_batch.side_effect = lambda questions, top_k: [[(0.1, f"Text for {q}", {"page": 1})] for q in questions]
+    mock_summarizer.side_effect = lambda texts, **kwargs: [{"summary_text": f"Summary of {t}"} for t in texts]
+    with patch('query.get_summarizer', return_value=mock_summarizer):
+        assistant = ResearchAssistant(mock_indexer)
+        assistant.answer_questions(["Q1", "Q2"], top_k=1)
+        results = assistant.answer_questions(["Q2", "Q3", "Q3"], top_k=1)
+    assert [r["answer"] for r in results] == ["Summary of Text for Q2", "Summary of Text for Q3", "Summary of Text for Q3"]
+    assert [call.args[0] for call in mock_indexer.search_batch.call_args_list] == [["Q1", "Q2"], ["Q3"]]
+
+def test_cached_answers_expire(mock_indexer, mock_summarizer):
+    mock_indexer.index_version = "v1"
+    with patch('query.get_summarizer', return_value=mock_summarizer):
+        assistant = ResearchAssistant(mock_indexer, result_cache_ttl=60)
+        now = assistant.result_cache.clock()
+        assistant.result_cache.clock = lambda: now
+        assistant.answer_question("Q", top_k=2)
+        assistant.result_cache.clock = lambda: now + 61
+        assistant.answer_question("Q", top_k=2)
+        assert mock_indexer.search.call_count == 2
+        assert ResearchAssistant(mock_indexer, result_cache_size=0).result_cache is None
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from query_cache import LRUCache, answer_key, encode_queries, query_embedding_cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = LRUCache(10, ttl=60, clock=clock)
+    cache.put("a", {"answer": "x"})
+    clock.now += 59
+    assert cache.get("a") == {"answer": "x"}
+    clock.now += 1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_disk_backing_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    clock = Clock()
+    cache = LRUCache(10, ttl=60, path=path, table="answers", clock=clock)
+    cache.put("a", {"answer": "x", "evidence": [{"text": "t", "page": 2}]})
+    cache.put("old", {"answer": "y"})
+    cache.close()
+    clock.now += 30
+    vectors = query_embedding_cache(path=path)
+    vectors.put("q", np.array([1.0, 2.0], dtype=np.float32))
+    vectors.close()
+
+    reopened = LRUCache(10, ttl=60, path=path, table="answers", clock=clock)
+    assert reopened.get("a") == {"answer": "x", "evidence": [{"text": "t", "page": 2}]}
+    clock.now += 31
+    assert reopened.get("old") is None
+    assert query_embedding_cache(path=path).get("q").tolist() == [1.0, 2.0]
+
+def test_disk_backing_is_pruned_to_max_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr("query_cache.PRUNE_INTERVAL", 1)
+    clock = Clock()
+    path = str(tmp_path / "cache.sqlite")
+    cache = LRUCache(2, path=path, clock=clock)
+    for key in "abc":
+        clock.now += 1
+        cache.put(key, key)
+    cache.close()
+    reopened = LRUCache(2, path=path)
+    assert [reopened.get(key) for key in "abc"] == [None, "b", "c"]
+
+def test_encode_queries_dedupes_by_normalized_key():
+    class Model:
+        calls = []
+
+        def encode(self, texts, **kwargs):
+            self.calls.append(list(texts))
+            return np.array([[len(text), 1.0] for text in texts])
+
+    model, cache = Model(), LRUCache(10)
+    first = encode_queries(model, "m", ["What is AI?", "what  is AI?", "What is AI? "], cache)
+    assert model.calls == [["What is AI?", "what  is AI?"]]
+    assert first.dtype == np.float32 and first[0].tolist() == first[2].tolist()
+    second = encode_queries(model, "m", ["  What is AI?"], cache)
+    assert len(model.calls) == 1 and second[0].tolist() == first[0].tolist()
+    encode_queries(model, "other-model", ["What is AI?"], cache)
+    assert len(model.calls) == 2
+    uncached = encode_queries(model, "m", ["What is AI?", "what  is AI?", "What is AI? "])
+    assert model.calls[-1] == ["What is AI?", "what  is AI?", "What is AI? "] and uncached[:2].tolist() == first[:2].tolist()
+
+def test_answer_key_depends_on_settings():
+    settings = {"top_k": 5, "search": {"filter": {"source": "a.pdf", "pages": [1, 2]}}, "index_version": "v1"}
+    reordered = {"index_version": "v1", "search": {"filter": {"pages": [1, 2], "source": "a.pdf"}}, "top_k": 5}
+    assert answer_key("What is AI?", settings) == answer_key(" What  is AI?", reordered)
+    assert answer_key("What is AI?", settings) != answer_key("What is AI?", {**settings, "index_version": "v2"})
+
+def test_max_entries_must_be_positive():
+    with pytest.raises(ValueError):
+        LRUCache(0)
+    assert query_embedding_cache(max_entries=0) is None
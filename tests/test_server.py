@@ -0,0 +1,152 @@
+import asyncio
+import json
+from unittest.mock import Mock
+import pytest
+from server import QueryServer, RequestError
+
+
+def make_assistant():
+    assistant = Mock()
+    assistant.answer_questions.side_effect = lambda questions, top_k, batch_size, **kwargs: [
+        {"answer": f"Answer to {q}", "evidence": [], "top_k": top_k} for q in questions
+    ]
+    assistant.cache_stats.return_value = {"answers": {"hits": 0, "misses": 2}}
+    return assistant
+
+def test_concurrent_requests_are_micro_batched():
+    assistant = make_assistant()
+
+    async def run():
+        server = QueryServer(assistant, max_batch_size=3, max_wait_ms=50)
+        server.batcher.start()
+        try:
+            return await asyncio.gather(
+                *(server.handle_query({"question": f"Q{i}"}) for i in range(5)),
+                server.handle_query({"question": "Other", "top_k": 2}),
+            )
+        finally:
+            await server.batcher.stop()
+
+    results = asyncio.run(run())
+    assert [r["answer"] for r in results] == [f"Answer to Q{i}" for i in range(5)] + ["Answer to Other"]
+    assert results[-1]["top_k"] == 2
+    batch_sizes = [len(call.args[0]) for call in assistant.answer_questions.call_args_list]
+    assert sorted(batch_sizes) == [1, 2, 3]
+
+def test_http_query_and_stats(tmp_path):
+    socket_path = str(tmp_path / "server.sock")
+
+    async def request(raw):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(raw)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(body)
+
+    async def run():
+        server = QueryServer(make_assistant(), max_wait_ms=1)
+        task = asyncio.create_task(server.serve(socket_path=socket_path))
+        while not (tmp_path / "server.sock").exists():
+            await asyncio.sleep(0.01)
+        body = json.dumps({"question": "What is AI?"}).encode()
+        ok = await request(b"POST /query HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+        bad = await request(b"POST /query HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}")
+        server.assistant.answer_questions.side_effect = ValueError("search failed")
+        failed = await request(b"POST /query HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+        stats = await request(b"GET /stats HTTP/1.1\r\n\r\n")
+        task.cancel()
+        return ok, bad, failed, stats
+
+    ok, bad, failed, stats = asyncio.run(run())
+    assert ok == (200, {"answer": "Answer to What is AI?", "evidence": [], "top_k": 5})
+    assert bad[0] == 400
+    assert failed == (500, {"error": "search failed"})
+    assert stats[0] == 200
+    assert stats[1]["requests"] == 3
+    assert stats[1]["errors"] == 2
+    assert "p95_ms" in stats[1]["latency"]
+    assert stats[1]["caches"]["answers"]["misses"] == 2
+
+def test_truncated_and_negative_bodies_are_bad_requests(tmp_path):
+    socket_path = str(tmp_path / "server.sock")
+
+    async def request(raw):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(raw)
+        writer.write_eof()
+        response = await reader.read()
+        writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(body)["error"]
+
+    async def run():
+        server = QueryServer(make_assistant(), max_wait_ms=1)
+        task = asyncio.create_task(server.serve(socket_path=socket_path))
+        while not (tmp_path / "server.sock").exists():
+            await asyncio.sleep(0.01)
+        truncated = await request(b'POST /query HTTP/1.1\r\nContent-Length: 100\r\n\r\n{"question": "Q"}')
+        negative = await request(b"POST /query HTTP/1.1\r\nContent-Length: -5\r\n\r\n")
+        task.cancel()
+        return truncated, negative
+
+    truncated, negative = asyncio.run(run())
+    assert truncated == (400, "request body ended after 17 of 100 bytes")
+    assert negative == (400, "Content-Length must not be negative")
+
+def test_metrics_endpoint(tmp_path):
+    socket_path = str(tmp_path / "server.sock")
+
+    async def run():
+        server = QueryServer(make_assistant(), max_wait_ms=1)
+        task = asyncio.create_task(server.serve(socket_path=socket_path))
+        while not (tmp_path / "server.sock").exists():
+            await asyncio.sleep(0.01)
+        body = json.dumps({"question": "What is AI?"}).encode()
+        for raw in (b"POST /query HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body), b"GET /metrics HTTP/1.1\r\n\r\n"):
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        task.cancel()
+        return response
+
+    head, _, body = asyncio.run(run()).partition(b"\r\n\r\n")
+    assert b"Content-Type: text/plain; version=0.0.4" in head
+    text = body.decode()
+    assert "# TYPE research_assistant_server_requests gauge\nresearch_assistant_server_requests 1\n" in text
+    assert 'research_assistant_server_latency_ms{quantile="0.99"}' in text
+
+def test_filter_is_validated_and_passed_through():
+    assistant = make_assistant()
+
+    async def run():
+        server = QueryServer(assistant, max_batch_size=4, max_wait_ms=20)
+        server.batcher.start()
+        try:
+            try:
+                await server.handle_query({"question": "Q", "filter": {"pages": [5, 1]}})
+            except RequestError:
+                pass
+            else:
+                raise AssertionError("invalid filter accepted")
+            return await asyncio.gather(
+                server.handle_query({"question": "Q1", "filter": {"source": "a.pdf", "pages": [1, 3]}}),
+                server.handle_query({"question": "Q2", "filter": {"pages": [1, 3], "source": "a.pdf"}}),
+            )
+        finally:
+            await server.batcher.stop()
+
+    asyncio.run(run())
+    assert assistant.answer_questions.call_count == 1
+    call = assistant.answer_questions.call_args
+    assert call.args[0] == ["Q1", "Q2"]
+    assert call.kwargs["filter"] == {"source": "a.pdf", "pages": [1, 3]}
+
+@pytest.mark.parametrize('payload', [{"top_k": True}, {"top_k": 0}, {"top_k": 2.0}, {"nprobe": False}, {"ef_search": "8"}])
+def test_non_integer_search_settings_are_rejected(payload):
+    server = QueryServer(make_assistant())
+    with pytest.raises(RequestError):
+        asyncio.run(server.handle_query({"question": "Q", **payload}))
@@ -0,0 +1,135 @@
+import os
+import pytest
+from indexer import SemanticIndexer
+from ingest import document_source
+from sharding import ShardedIndex, is_sharded, open_index, shard_for, update_sharded_index, write_shards_manifest
+
+TEXTS = [f"Chunk number {i} about topic {i % 4} with {'extra ' * (i % 5)}words" for i in range(40)]
+
+
+@pytest.fixture
+def sharded_path(fake_embedder, tmp_path):
+    path = str(tmp_path / "sharded")
+    write_shards_manifest(path, 3, SemanticIndexer().model_name)
+    for shard_no in range(3):
+        texts = TEXTS[shard_no::3]
+        shard = SemanticIndexer()
+        shard.build_index(texts, [{"page": TEXTS.index(t)} for t in texts])
+        shard.save(os.path.join(path, f"shard-{shard_no:03d}"))
+    return path
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_sharded_search_matches_single_index(sharded_path, executor):
+    single = SemanticIndexer()
+    single.build_index(TEXTS, [{"page": i} for i in range(len(TEXTS))])
+    sharded = ShardedIndex.load(sharded_path, executor=executor)
+    queries = ["Chunk number 7", "topic 2 extra extra", "words"]
+    try:
+        for merged, everything in zip(sharded.search_batch(queries, top_k=5), single.search_batch(queries, top_k=40)):
+            assert [round(float(d), 4) for d, _, _ in merged] == [round(float(d), 4) for d, _, _ in everything[:5]]
+            distance_of = {text: float(d) for d, text, _ in everything}
+            assert all(distance_of[text] == pytest.approx(float(d)) for d, text, _ in merged)
+            assert all(metadata == {"page": TEXTS.index(text)} for _, text, metadata in merged)
+    finally:
+        sharded.close()
+
+def test_process_workers_reopen_saved_shards(sharded_path):
+    sharded = ShardedIndex.load(sharded_path, executor='process', max_workers=1)
+    try:
+        assert sharded.search(TEXTS[7], top_k=1)[0][1] == TEXTS[7]
+        shard = SemanticIndexer.load(sharded.shard_path(1), mmap=False)
+        shard.add_texts(["Chunk number 7 replacement"], [{"page": 7}])
+        shard.save(sharded.shard_path(1))
+        results = sharded.search("Chunk number 7 replacement", top_k=1)
+        assert results == [(pytest.approx(0.0), "Chunk number 7 replacement", {"page": 7})]
+        assert sharded.loaded_shards() == []
+    finally:
+        sharded.close()
+
+def test_shards_open_lazily(sharded_path):
+    sharded = open_index(sharded_path)
+    assert isinstance(sharded, ShardedIndex)
+    assert sharded.loaded_shards() == []
+    sharded.shard(1)
+    assert sharded.loaded_shards() == [1]
+    sharded.close()
+
+def test_update_sharded_index_routes_documents(fake_embedder, tmp_path, write_pdf):
+    pdfs = [write_pdf(tmp_path / f"doc{i}.pdf", [f"Document {i} page 1", f"Document {i} page 2"]) for i in range(4)]
+    path = str(tmp_path / "sharded")
+    results = update_sharded_index(path, pdfs, num_shards=2, cache_dir=None)
+    assert is_sharded(path)
+    assert sorted(p for result in results for p in result['new']) == sorted(pdfs)
+    sharded = ShardedIndex.load(path, mmap=False)
+    for pdf in pdfs:
+        shard = sharded.shard(shard_for(document_source(pdf), 2))
+        assert document_source(pdf) in shard.documents
+    assert sharded.search("Document 3 page 1 Document 3 page 2", top_k=1)[0][1] == "Document 3 page 1 Document 3 page 2"
+
+    again = update_sharded_index(path, pdfs, cache_dir=None)
+    assert sorted(p for result in again for p in result['unchanged']) == sorted(pdfs)
+    with pytest.raises(ValueError):
+        update_sharded_index(path, pdfs, num_shards=3)
+
+    assert sharded.remove_document(document_source(pdfs[3])) == 1
+    sharded.save()
+    reloaded = ShardedIndex.load(path)
+    assert document_source(pdfs[3]) not in reloaded.documents
+    assert all(not text.startswith("Document 3") for _, text, _ in reloaded.search("Document 3 page 1 Document 3 page 2", top_k=8))
+    sharded.close()
+    reloaded.close()
+
+def test_removing_a_document_rewrites_only_its_shard(fake_embedder, tmp_path, write_pdf):
+    from sharding import manifest_stamp
+    pdfs = [write_pdf(tmp_path / f"doc{i}.pdf", [f"Document {i} page 1"]) for i in range(6)]
+    path = str(tmp_path / "sharded")
+    update_sharded_index(path, pdfs, num_shards=3, cache_dir=None)
+    sharded = ShardedIndex.load(path, mmap=False)
+    source = document_source(pdfs[0])
+    shard_no = shard_for(source, 3)
+    assert sharded.has_document(source) and not sharded.has_document(document_source("other.pdf"))
+    assert sharded.loaded_shards() == sorted({shard_no, shard_for(document_source("other.pdf"), 3)})
+    assert set(sharded.documents) == {document_source(pdf) for pdf in pdfs}
+    stamps = [manifest_stamp(sharded.shard_path(i)) for i in range(3)]
+    sharded.remove_document(source)
+    sharded.save()
+    assert [manifest_stamp(sharded.shard_path(i)) != stamps[i] for i in range(3)] == [i == shard_no for i in range(3)]
+    assert not ShardedIndex.load(path).has_document(source)
+    sharded.close()
+
+def test_source_filter_searches_only_its_shard(fake_embedder, tmp_path):
+    path = str(tmp_path / "sharded")
+    write_shards_manifest(path, 3, SemanticIndexer().model_name)
+    sources = [document_source(f"doc{i}.pdf") for i in range(6)]
+    for shard_no in range(3):
+        chunks = [(text, {"source": sources[i % 6], "page": i}) for i, text in enumerate(TEXTS)
+                  if shard_for(sources[i % 6], 3) == shard_no]
+        if chunks:
+            shard = SemanticIndexer()
+            shard.build_index([text for text, _ in chunks], [metadata for _, metadata in chunks])
+            shard.save(os.path.join(path, f"shard-{shard_no:03d}"))
+    sharded = ShardedIndex.load(path)
+    try:
+        results = sharded.search("topic 1", top_k=3, filter={"source": "doc1.pdf", "pages": [0, 20]})
+        assert len(results) == 3
+        assert all(metadata["source"] == sources[1] and metadata["page"] <= 20 for _, _, metadata in results)
+        assert sharded.loaded_shards() == [shard_for(sources[1], 3)]
+    finally:
+        sharded.close()
+
+def test_index_version_tracks_shards(sharded_path):
+    sharded = ShardedIndex.load(sharded_path)
+    version = sharded.index_version
+    assert ShardedIndex.load(sharded_path).index_version == version
+    shard = sharded.shard(0)
+    assert sharded.index_version == version
+    shard.add_texts(["New chunk"], [{"page": 99}])
+    changed = sharded.index_version
+    assert changed != version
+    sharded.save()
+    assert sharded.index_version == changed
+    reloaded = ShardedIndex.load(sharded_path)
+    assert reloaded.index_version == changed
+    reloaded.shard(0)
+    assert reloaded.index_version == changed
+    sharded.close()
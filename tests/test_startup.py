@@ -0,0 +1,12 @@
+import pytest
+from startup_benchmark import SCENARIOS, run_scenario
+
+
+@pytest.mark.parametrize('name', sorted(SCENARIOS))
+def test_startup_paths_skip_heavy_imports(name):
+    _, imported = run_scenario(SCENARIOS[name])
+    assert imported == []
+
+def test_probe_detects_heavy_imports():
+    _, imported = run_scenario(['ann-report', '--index-path', 'does-not-exist'])
+    assert 'faiss' in imported